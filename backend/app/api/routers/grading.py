@@ -1,10 +1,18 @@
+import json
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from app.core.database import get_db
 from app.models.domain import SinavSorulari, OgrenciSonuclari
-from app.services.scoring import evaluate_answer
+from app.schemas.dtos import TopluPuanlamaRequest
+from app.services.scoring import evaluate_answer, evaluate_paper, prompt_cache_stats
+from app.services.live_grading import GradingContext
+from app.services.batch_grading import grade_class
+from app.services.grading_cache import get_grading_cache
 
 router = APIRouter()
 
@@ -112,3 +120,117 @@ def puanla_cevap(
     "max_puan": result.get('max_puan', 100),
     "yorum": result['yorum']
     }
+
+
+@router.post("/puanla-kagit")
+def puanla_kagit(
+    cevaplar: List[dict] = Body(..., embed=True),
+    sinav_id: str = Body(None, embed=True),
+    ogrenci_id: str = Body(None, embed=True),
+    answer_key_text: str = Body(None, embed=True),
+    rubric_text: str = Body(None, embed=True),
+    db: Session = Depends(get_db)
+):
+    """
+    Bir öğrencinin tüm kağıdını tek çağrıda puanlar.
+    cevaplar: [{"soru_no": 1, "ogrenci_cevabi": "...", "soru_metni": "..."}]
+    sinav_id verilirse ideal cevaplar veritabanından alınır; ogrenci_id de
+    verilirse sonuçlar kaydedilir. Bağlam bütçesini aşan kağıtlar soru soru
+    puanlanır.
+    """
+    if not cevaplar:
+        raise HTTPException(status_code=400, detail="En az bir cevap gerekli.")
+    if not sinav_id and not answer_key_text:
+        raise HTTPException(status_code=400, detail="sinav_id veya Cevap Anahtarı gerekli.")
+
+    sorular = {}
+    if sinav_id:
+        rows = db.query(SinavSorulari).filter(func.lower(SinavSorulari.sinav_id) == sinav_id.lower()).all()
+        sorular = {row.soru_no: row for row in rows}
+
+    questions = []
+    for index, cevap in enumerate(cevaplar):
+        try:
+            soru_no = int(cevap.get("soru_no", index + 1))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Geçersiz soru_no: {cevap.get('soru_no')}")
+        soru = sorular.get(soru_no)
+        if not soru and not answer_key_text:
+            raise HTTPException(status_code=404, detail=f"Soru bulunamadı. sinav_id='{sinav_id}', soru_no={soru_no}")
+        questions.append({
+            "soru_no": soru_no,
+            "ogrenci_cevabi": cevap.get("ogrenci_cevabi") or "",
+            "soru_metni": cevap.get("soru_metni") or (soru.soru_metni if soru else ""),
+            "ideal_cevap": soru.ideal_cevap if soru else "",
+            "anahtar_kelimeler": (soru.anahtar_kelimeler or "") if soru else ""
+        })
+
+    paper = evaluate_paper(questions, answer_key_text=answer_key_text, rubric_text=rubric_text)
+
+    if sinav_id and ogrenci_id:
+        for question, result in zip(questions, paper["results"]):
+            db.add(OgrenciSonuclari(
+                sinav_id=sinav_id,
+                ogrenci_id=ogrenci_id,
+                soru_no=question["soru_no"],
+                ogrenci_cevabi=question["ogrenci_cevabi"],
+                bert_skoru=result['bert_skoru'],
+                llm_skoru=result['llm_skoru'],
+                final_puan=result['final_puan'],
+                yorum=result['yorum']
+            ))
+        db.commit()
+
+    return {
+        "success": True,
+        "mode": paper["mode"],
+        "sonuclar": paper["results"],
+        "toplam_puan": round(sum(r['final_puan'] for r in paper["results"]), 2),
+        "stats": paper["stats"]
+    }
+
+
+@router.post("/puanla-toplu")
+async def puanla_toplu(request: TopluPuanlamaRequest):
+    """
+    Bir sınıfın tüm cevaplarını tek istekte puanlar.
+    Cevap anahtarı ve rubrik bir kez gönderilir; cevaplar eşzamanlı olarak
+    (BATCH_GRADING_CONCURRENCY) puanlanır ve her sonuç hazır olur olmaz
+    satır satır JSON (NDJSON) olarak döner. kaydet ve sinav_id verilirse
+    sonuçlar OgrenciSonuclari tablosuna parça parça toplu yazılır.
+    kumele verilirse her sorunun birbirine çok benzeyen cevapları kümelenir;
+    her kümeden yalnızca temsilci (ve rastgele kontrol edilen üyeler)
+    puanlanır, diğer üyeler temsilcinin puanını alır (kume_temsilcisi).
+    Son satır {"type": "summary", ...} özetidir.
+    """
+    if not request.ogrenciler:
+        raise HTTPException(status_code=400, detail="En az bir öğrenci gerekli.")
+    if not request.sinav_id and not request.answer_key_text:
+        raise HTTPException(status_code=400, detail="sinav_id veya Cevap Anahtarı gerekli.")
+
+    context = GradingContext(request.sinav_id, request.answer_key_text, request.rubric_text)
+    students = [student.model_dump() for student in request.ogrenciler]
+
+    async def events():
+        async for event in grade_class(context, students, save=request.kaydet, cluster=request.kumele):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@router.get("/puanlama/prompt-cache/stats")
+def puanlama_prompt_cache_stats():
+    """
+    Puanlama çağrılarının (süreç başlangıcından beri) önbellekten gelen ve
+    gelmeyen prompt token sayıları ile ortalama gecikmeleri.
+    """
+    return prompt_cache_stats.stats()
+
+
+@router.get("/puanlama/cache/stats")
+def puanlama_cache_stats():
+    """Puanlama sonuç önbelleğinin isabet/ıskalama sayıları ve boyutu."""
+    cache = get_grading_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -1,18 +1,24 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pdf2image import convert_from_bytes
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from PIL import Image
-import io
-import os
-import uuid
-import json
+from typing import List
+import asyncio
+import logging
 
+from app.services.ocr import process_image_ocr_async, encode_image_to_base64, local_ocr, accept_local_result
+from app.services.anonymizer_pool import get_anonymizer_pool
+from app.services.layout_template import get_layout_templates
+from app.services.pipeline import run_page_pipeline, count_document_pages, extract_pdf_text_pages, UnsupportedFileError
+from app.services.jobs import job_store, submit_student_upload
+from app.services.job_queue import dead_letter_jobs
+from app.services.batch import expand_upload, create_batch, batch_store
+from app.services.ocr_cache import get_ocr_cache
+from app.services.openai_client import rate_limiter_stats
+from app.services.live_grading import GradingContext
 from app.core.config import settings
-from app.services.ocr import process_image_ocr, anonymize_student_data_local
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Use settings for Poppler Path
-POPPLER_PATH = settings.POPPLER_PATH
+router = APIRouter()
 
 @router.post("/upload-generic")
 async def upload_generic_pdf(file: UploadFile = File(...)):
@@ -20,157 +26,219 @@ async def upload_generic_pdf(file: UploadFile = File(...)):
     Endpoint for uploading Answer Key or Rubric files.
     Performs OCR with a 'Full Text' focused prompt to get the global context.
     Returns the combined text from all pages.
+
+    Pages of digital PDFs are read from their text layer locally. Scanned
+    pages go through OCR_GENERIC_ENGINE: by default the local Tesseract
+    engine, with vision OCR only for pages it reads with low confidence.
     """
     try:
         contents = await file.read()
-        
-        # Determine if file is PDF or image
-        images = []
-        if file.filename.lower().endswith('.pdf'):
-            if POPPLER_PATH and os.path.exists(POPPLER_PATH):
-                images = convert_from_bytes(contents, poppler_path=POPPLER_PATH, dpi=300)
-            else:
-                images = convert_from_bytes(contents, dpi=300)
-        else:
-            try:
-                image = Image.open(io.BytesIO(contents))
-                images = [image]
-            except Exception as e:
-                raise HTTPException(status_code=400, detail="Desteklenmeyen dosya formatı.")
-        
-        extracted_text_parts = []
-        
+
+        # Text layer fast path: pages with text are never rendered
+        text_pages = await asyncio.to_thread(extract_pdf_text_pages, contents, file.filename)
+        text_layer = {i: text for i, text in enumerate(text_pages) if text is not None}
+
         # Prompt explicitly for full text extraction without JSON formatting
         generic_prompt = "Bu belgedeki tüm metni olduğu gibi, satır satır dışarı aktar. Başlıkları ve yapıyı korumaya çalış. JSON formatı kullanma, sadece saf metin ver."
 
-        for i, image in enumerate(images):
+        engine = settings.OCR_GENERIC_ENGINE
+        local_pages = set()
+        vision_pages = set()
+        failed_pages = set()
+
+        async def prepare_page(i: int, image: Image.Image) -> tuple:
+            # The local engine reads the full-resolution page; the vision
+            # payload is only encoded if the router may still need it
+            local = None
+            if engine != "vision":
+                try:
+                    local = await asyncio.to_thread(local_ocr, image)
+                except Exception as local_error:
+                    logger.warning(f"Page {i+1} local OCR error: {local_error}")
+            if engine == "local" or accept_local_result(local, engine):
+                return local, None
+            return local, await asyncio.to_thread(encode_image_to_base64, image)
+
+        async def finish_page(i: int, payload: tuple) -> str:
+            if i in text_layer:
+                return text_layer[i]
+            local, base64_image = payload
+            # No local result (engine missing or failed): do not retry it on the JPEG
+            page_engine = "vision" if local is None and engine == "auto" else engine
             try:
-                ocr_result = process_image_ocr(image, prompt=generic_prompt)
-                
+                ocr_result = await process_image_ocr_async(
+                    base64_image, prompt=generic_prompt, engine=page_engine, local_result=local
+                )
+                if 'engine' in ocr_result:
+                    local_pages.add(i)
+                else:
+                    vision_pages.add(i)
+
                 # We expect 'raw_text' or 'normalized_text'
-                text_content = ocr_result.get('raw_text') or ocr_result.get('normalized_text', '')
-                extracted_text_parts.append(text_content)
-                
+                return ocr_result.get('raw_text') or ocr_result.get('normalized_text', '')
+
             except Exception as ocr_error:
-                print(f"Page {i+1} error: {ocr_error}")
-                extracted_text_parts.append("")
-        
+                logger.warning(f"Page {i+1} error: {ocr_error}")
+                failed_pages.add(i)
+                return ""
+
+        try:
+            if text_pages and len(text_layer) == len(text_pages):
+                extracted_text_parts = [text_layer[i] for i in range(len(text_pages))]
+            else:
+                extracted_text_parts = await run_page_pipeline(
+                    contents, file.filename, prepare_page, finish_page,
+                    resume_page=lambda i: None, skip_pages=set(text_layer)
+                )
+        except UnsupportedFileError:
+            raise HTTPException(status_code=400, detail="Desteklenmeyen dosya formatı.")
+
         full_text = "\n\n".join(extracted_text_parts)
-        
+
         return {
             "success": True,
             "filename": file.filename,
-            "text": full_text
+            "text": full_text,
+            "text_layer_pages": len(text_layer),
+            "local_ocr_pages": len(local_pages),
+            "ocr_pages": len(vision_pages),
+            "failed_ocr_pages": len(failed_pages)
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dosya işlenirken hata: {str(e)}")
 
 
-@router.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
+def _grading_context(sinav_id: str, answer_key_text: str, rubric_text: str):
+    """GradingContext for an upload that should be graded while it is transcribed, or None."""
+    context = GradingContext(sinav_id, answer_key_text, rubric_text)
+    if context.is_configured:
+        return context
+    if rubric_text:
+        raise HTTPException(status_code=400, detail="Puanlama için sinav_id veya cevap anahtarı gerekli.")
+    return None
+
+
+@router.post("/upload", status_code=202)
+async def upload_pdf(
+    file: UploadFile = File(...),
+    sinav_id: str = Form(None),
+    answer_key_text: str = Form(None),
+    rubric_text: str = Form(None)
+):
     """
-    Endpoint to upload a PDF or image file, perform OCR using Gemini Vision,
-    normalize text, and return extracted text.
+    Endpoint to upload a PDF or image file for OCR using Gemini Vision.
+
+    The file is accepted right away and processed in the background
+    (rasterize -> anonymize -> OCR). The response carries the job id;
+    poll /upload/jobs/{id} for per-page progress and the final pages.
+
+    With sinav_id and/or answer_key_text (plus optional rubric_text), every
+    question is also graded as soon as its transcription is streamed in;
+    the grades are reported per page and in the result's 'grading' summary.
     """
     try:
+        grading = _grading_context(sinav_id, answer_key_text, rubric_text)
         contents = await file.read()
-        
-        # Generate a unique ID for this request
-        request_id = str(uuid.uuid4())
-        
-        # Determine if file is PDF or image
-        images = []
-        if file.filename.lower().endswith('.pdf'):
-            # Convert PDF to images with higher DPI for better OCR
-            if POPPLER_PATH and os.path.exists(POPPLER_PATH):
-                images = convert_from_bytes(contents, poppler_path=POPPLER_PATH, dpi=300)
-            else:
-                images = convert_from_bytes(contents, dpi=300)
+
+        # Reject unreadable files before queueing any work
+        try:
+            page_count = await asyncio.to_thread(count_document_pages, contents, file.filename)
+        except UnsupportedFileError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        job, created = job_store.create(file.filename, contents, grading=grading)
+        if created:
+            job.page_count = page_count
+            await submit_student_upload(job, contents)
         else:
-            # Direct image file
-            try:
-                image = Image.open(io.BytesIO(contents))
-                images = [image]
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Desteklenmeyen dosya formatı. Lütfen PDF veya görsel dosyası yükleyin."
-                )
-        
-        all_student_data = {}
-        
-        for i, image in enumerate(images):
-            # Apply local anonymization (Redact Name/Number)
-            # This happens BEFORE saving and BEFORE Gemini OCR
-            image, page_student_data = anonymize_student_data_local(image)
-            images[i] = image # Update list with redacted image
-            
-            # Merge found data
-            if page_student_data:
-                all_student_data.update(page_student_data)
-             
-            # Additional save to explicit 'anonymized_uploads' folder as requested
-            try:
-                # Use settings or relative path (assuming cwd is backend root)
-                anon_dir = os.path.join(settings.BASE_DIR, "anonymized_uploads")
-                os.makedirs(anon_dir, exist_ok=True)
-                anon_filename = f"anon_{request_id}_page_{i+1}.png"
-                image.save(os.path.join(anon_dir, anon_filename), "PNG")
-            except Exception as save_err:
-                print(f"Warning: Could not save backup anonymized image: {save_err}")
-            
-        # Save extracted student data
-        if all_student_data:
-            try:
-                results_dir = os.path.join(settings.BASE_DIR, "results")
-                os.makedirs(results_dir, exist_ok=True)
-                student_data_path = os.path.join(results_dir, f"{request_id}_student.json")
-                with open(student_data_path, "w", encoding="utf-8") as f:
-                    json.dump(all_student_data, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"Warning: Could not save student data: {e}")
-            
-        extracted_data = []
-        
-        for i, image in enumerate(images):
-            try:
-                # Perform OCR and normalization using our utility module
-                ocr_result = process_image_ocr(image, debug_dir=None)
-                
-                extracted_data.append({
-                    "page": i + 1,
-                    "text": ocr_result['normalized_text'],
-                    "raw_text": ocr_result['raw_text'],
-                    "normalized_text": ocr_result['normalized_text'],
-                    "structured_data": ocr_result.get('structured_data', []),  # Pass structured questions
-                    "processing_steps": ocr_result.get('processing_steps', [])
-                })
-                
-            except Exception as ocr_error:
-                extracted_data.append({
-                    "page": i + 1,
-                    "text": "",
-                    "raw_text": "",
-                    "normalized_text": "",
-                    "error": str(ocr_error)
-                })
-        
-        response_data = {
-            "id": request_id,
+            # Duplicate upload: report the existing job as the status
+            # endpoint would, result included once it has completed
+            return {**job.to_status(), "status_url": f"/upload/jobs/{job.id}"}
+
+        return {
+            "id": job.id,
+            "status": job.status,
             "filename": file.filename,
-            "page_count": len(images),
-            "pages": extracted_data
+            "page_count": page_count,
+            "status_url": f"/upload/jobs/{job.id}"
         }
-        
-        # Save results to file
-        results_dir = os.path.join(settings.BASE_DIR, "results")
-        os.makedirs(results_dir, exist_ok=True)
-        with open(os.path.join(results_dir, f"{response_data['id']}.json"), "w", encoding="utf-8") as f:
-            json.dump(response_data, f, ensure_ascii=False, indent=2)
-            
-        return response_data
-        
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Dosya işlenirken bir hata oluştu: {str(e)}"
+        )
+
+
+@router.get("/upload/jobs/{job_id}")
+def upload_job_status(job_id: str):
+    """
+    Progress of an upload job: per-page stage and processing_steps (with
+    timings). Once completed, also contains the final 'pages' payload.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="İş bulunamadı")
+    return job.to_status()
+
+
+@router.get("/upload/dead-letter")
+def upload_dead_letter():
+    """
+    Upload jobs that failed UPLOAD_MAX_ATTEMPTS times (or could not be
+    resumed after a restart), with their last error. Their finished page
+    checkpoints are kept.
+    """
+    return {"jobs": dead_letter_jobs()}
+
+
+@router.post("/upload-batch", status_code=202)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    pages_per_student: int = Form(None),
+    sinav_id: str = Form(None),
+    answer_key_text: str = Form(None),
+    rubric_text: str = Form(None)
+):
+    """
+    Uploads a whole class at once: several files and/or ZIP archives, one
+    paper per student. With pages_per_student, PDFs are treated as a single
+    scanned class set and split into consecutive page ranges of that size.
+
+    Every student becomes a normal upload job (same progress, results and
+    _student.json as /upload); the overall number of jobs and OCR requests
+    running at once is capped by UPLOAD_MAX_ACTIVE_JOBS and
+    OCR_GLOBAL_MAX_CONCURRENCY. Poll /upload-batch/{batch_id} for the
+    aggregate manifest. Grading options are the same as for /upload.
+    """
+    grading = _grading_context(sinav_id, answer_key_text, rubric_text)
+    if pages_per_student is not None and pages_per_student < 1:
+        raise HTTPException(status_code=400, detail="pages_per_student en az 1 olmalıdır.")
+
+    try:
+        papers = []
+        for file in files:
+            contents = await file.read()
+            try:
+                papers.extend(await asyncio.to_thread(expand_upload, file.filename, contents))
+            except UnsupportedFileError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        if not papers:
+            raise HTTPException(status_code=400, detail="Yüklemede işlenebilir dosya bulunamadı.")
+
+        try:
+            batch = await create_batch(papers, pages_per_student, grading=grading)
+        except UnsupportedFileError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return dict(batch.to_status(), status_url=f"/upload-batch/{batch.id}")
+
     except HTTPException:
         raise
     except Exception as e:
@@ -178,3 +246,36 @@ async def upload_pdf(file: UploadFile = File(...)):
             status_code=500,
             detail=f"Dosya işlenirken bir hata oluştu: {str(e)}"
         )
+
+
+@router.get("/upload-batch/{batch_id}")
+def upload_batch_status(batch_id: str):
+    """Aggregate progress of a batch upload with one row per student job."""
+    batch = batch_store.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Toplu yükleme bulunamadı")
+    return batch.to_status()
+
+
+@router.get("/ocr-cache/stats")
+def ocr_cache_stats():
+    """Hit/miss counts and size of the OCR result cache."""
+    cache = get_ocr_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/openai/stats")
+def openai_stats():
+    """Limits learned or configured per model, limiter waits and 429 pauses."""
+    return {"rate_limiters": rate_limiter_stats()}
+
+
+@router.get("/anonymizer/stats")
+def anonymizer_stats():
+    """Pool size and queue depth of the anonymization workers, plus layout template reuse."""
+    stats = get_anonymizer_pool().stats()
+    templates = get_layout_templates()
+    stats["layout_templates"] = templates.stats() if templates is not None else None
+    return stats
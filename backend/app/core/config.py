@@ -15,6 +15,135 @@ class Settings:
     SYSTEM_POPPLER_PATH_1 = r'C:\Program Files\poppler\Library\bin'
     SYSTEM_POPPLER_PATH_2 = r'C:\Program Files\poppler\bin'
 
+    # OCR Concurrency
+    # Maximum number of vision OCR requests in flight for one upload
+    OCR_MAX_CONCURRENCY: int = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+    # Maximum number of vision OCR requests in flight across all uploads
+    OCR_GLOBAL_MAX_CONCURRENCY: int = int(os.getenv("OCR_GLOBAL_MAX_CONCURRENCY", "8"))
+
+    # OCR Result Cache
+    # Content-addressed cache in front of the vision OCR call (LRU, size-bounded)
+    OCR_CACHE_ENABLED: bool = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+    OCR_CACHE_PATH: str = os.getenv("OCR_CACHE_PATH", os.path.join(BASE_DIR, "cache", "ocr_cache.db"))
+    OCR_CACHE_MAX_MB: int = int(os.getenv("OCR_CACHE_MAX_MB", "256"))
+
+    # Multi-Page Packing
+    # Send several pages of the same paper in one vision request (opt-in)
+    VISION_PACK_PAGES: bool = os.getenv("VISION_PACK_PAGES", "false").lower() == "true"
+    VISION_PACK_MAX_PAGES: int = int(os.getenv("VISION_PACK_MAX_PAGES", "4"))
+    # Image tokens per packed request (a 2 MP page is ~1100 tokens at high detail)
+    VISION_PACK_TOKEN_BUDGET: int = int(os.getenv("VISION_PACK_TOKEN_BUDGET", "4500"))
+    # Send a partial group after this long without a new page
+    VISION_PACK_WAIT_MS: int = int(os.getenv("VISION_PACK_WAIT_MS", "3000"))
+
+    # Shared OpenAI Client
+    # Pooled HTTP connections shared by OCR and scoring calls
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", "120"))
+    # Requests / tokens per minute per model; 0 = learn from x-ratelimit-* headers
+    OPENAI_RPM_LIMIT: int = int(os.getenv("OPENAI_RPM_LIMIT", "0"))
+    OPENAI_TPM_LIMIT: int = int(os.getenv("OPENAI_TPM_LIMIT", "0"))
+
+    # Live Grading
+    # Maximum number of grading calls in flight across all uploads
+    GRADING_MAX_CONCURRENCY: int = int(os.getenv("GRADING_MAX_CONCURRENCY", "4"))
+    # Persistent cache of grading results (identical answers graded once per question)
+    GRADING_CACHE_ENABLED: bool = os.getenv("GRADING_CACHE_ENABLED", "true").lower() == "true"
+    GRADING_CACHE_PATH: str = os.getenv("GRADING_CACHE_PATH", os.path.join(BASE_DIR, "cache", "grading_cache.db"))
+    GRADING_CACHE_MAX_MB: int = int(os.getenv("GRADING_CACHE_MAX_MB", "64"))
+    # Tiered grading cascade: empty and clear-cut answers are graded locally
+    # (SBERT similarity to the ideal answer + keyword coverage), the rest by the
+    # LLM. Tune the thresholds with benchmarks/bench_grading_cascade.py
+    GRADING_CASCADE_ENABLED: bool = os.getenv("GRADING_CASCADE_ENABLED", "false").lower() == "true"
+    GRADING_CASCADE_LOW_SIMILARITY: float = float(os.getenv("GRADING_CASCADE_LOW_SIMILARITY", "0.2"))
+    GRADING_CASCADE_LOW_KEYWORDS: float = float(os.getenv("GRADING_CASCADE_LOW_KEYWORDS", "0.0"))
+    GRADING_CASCADE_HIGH_SIMILARITY: float = float(os.getenv("GRADING_CASCADE_HIGH_SIMILARITY", "0.93"))
+    GRADING_CASCADE_HIGH_KEYWORDS: float = float(os.getenv("GRADING_CASCADE_HIGH_KEYWORDS", "1.0"))
+    # Semantic answer clustering for batch grading (kumele): answers at least this
+    # cosine-similar to a cluster's representative get its grade; members per
+    # cluster graded on their own to measure the drift
+    ANSWER_CLUSTERING_THRESHOLD: float = float(os.getenv("ANSWER_CLUSTERING_THRESHOLD", "0.9"))
+    ANSWER_CLUSTERING_SPOT_CHECKS: int = int(os.getenv("ANSWER_CLUSTERING_SPOT_CHECKS", "1"))
+    # Class-level batch grading (/api/puanla-toplu): answers graded at once,
+    # and result rows written per transaction
+    BATCH_GRADING_CONCURRENCY: int = int(os.getenv("BATCH_GRADING_CONCURRENCY", "16"))
+    BATCH_GRADING_CHUNK_SIZE: int = int(os.getenv("BATCH_GRADING_CHUNK_SIZE", "50"))
+    # "question": one grading call per question, "paper": all questions in one call.
+    # Student uploads are transcribed page by page, so there "paper" is one call per page
+    GRADING_MODE: str = os.getenv("GRADING_MODE", "question")
+    # Estimated prompt + output tokens above which a paper is graded per question
+    PAPER_GRADING_TOKEN_BUDGET: int = int(os.getenv("PAPER_GRADING_TOKEN_BUDGET", "60000"))
+    # Output token limit of the single paper call (gpt-4o-mini allows 16384)
+    PAPER_GRADING_MAX_OUTPUT_TOKENS: int = int(os.getenv("PAPER_GRADING_MAX_OUTPUT_TOKENS", "16000"))
+
+    # Local OCR Engines
+    # Local engine for printed documents ("tesseract" or "none")
+    OCR_LOCAL_ENGINE: str = os.getenv("OCR_LOCAL_ENGINE", "tesseract")
+    TESSERACT_LANG: str = os.getenv("TESSERACT_LANG", "tur+eng")
+    # Path of the tesseract binary if it is not on PATH
+    TESSERACT_CMD: str = os.getenv("TESSERACT_CMD", "")
+    # Pages below this local confidence (0..1) fall back to vision OCR
+    OCR_LOCAL_MIN_CONFIDENCE: float = float(os.getenv("OCR_LOCAL_MIN_CONFIDENCE", "0.80"))
+    # Engine of /upload-generic: "vision", "local" or "auto" (local, vision fallback)
+    OCR_GENERIC_ENGINE: str = os.getenv("OCR_GENERIC_ENGINE", "auto")
+
+    # Vision Image Encoding
+    # Pixel/byte budget for page images sent to the vision model. The model
+    # downsamples large images anyway (short side ~768px in high detail),
+    # so full 300 DPI pages only cost upload time.
+    VISION_MAX_PIXELS: int = int(os.getenv("VISION_MAX_PIXELS", "2000000"))
+    VISION_MAX_BYTES: int = int(os.getenv("VISION_MAX_BYTES", "400000"))
+    VISION_GRAYSCALE: bool = os.getenv("VISION_GRAYSCALE", "true").lower() == "true"
+    VISION_JPEG_QUALITY: int = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+    VISION_MIN_JPEG_QUALITY: int = int(os.getenv("VISION_MIN_JPEG_QUALITY", "50"))
+    VISION_TRIM_MARGINS: bool = os.getenv("VISION_TRIM_MARGINS", "true").lower() == "true"
+
+    # Anonymization
+    # Scale applied to the header band before EasyOCR (1.0 = full resolution)
+    ANON_HEADER_SCALE: float = float(os.getenv("ANON_HEADER_SCALE", "1.0"))
+    # Number of EasyOCR worker processes (0 = run in a thread of the API process)
+    ANON_POOL_SIZE: int = int(os.getenv("ANON_POOL_SIZE", "2"))
+    # Header bands per batched EasyOCR detection call (1 = no batching)
+    ANON_BATCH_SIZE: int = int(os.getenv("ANON_BATCH_SIZE", "4"))
+    # How long (ms) a detection request waits for others to fill its batch
+    ANON_BATCH_WAIT_MS: int = int(os.getenv("ANON_BATCH_WAIT_MS", "30"))
+    # Reuse learned header layouts (label positions) across identical exam forms
+    ANON_LAYOUT_TEMPLATES: bool = os.getenv("ANON_LAYOUT_TEMPLATES", "true").lower() == "true"
+    # Pages with the same detected layout needed before a template is used
+    ANON_TEMPLATE_MIN_PAGES: int = int(os.getenv("ANON_TEMPLATE_MIN_PAGES", "2"))
+    # Minimum normalized correlation of every label patch for the template to fit
+    ANON_TEMPLATE_MATCH_THRESHOLD: float = float(os.getenv("ANON_TEMPLATE_MATCH_THRESHOLD", "0.7"))
+    # How far (pixels) a scanned page may be shifted against the template
+    ANON_TEMPLATE_SEARCH_PX: int = int(os.getenv("ANON_TEMPLATE_SEARCH_PX", "60"))
+
+    # Upload Jobs
+    # How long finished upload jobs stay available for status polling
+    UPLOAD_JOB_TTL_SECONDS: int = int(os.getenv("UPLOAD_JOB_TTL_SECONDS", "3600"))
+    # Read digital PDF pages in /upload-generic from their text layer instead of vision OCR
+    PDF_TEXT_LAYER_ENABLED: bool = os.getenv("PDF_TEXT_LAYER_ENABLED", "true").lower() == "true"
+    # Minimum non-whitespace characters for a page's text layer to be used
+    PDF_TEXT_LAYER_MIN_CHARS: int = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "40"))
+    # Blank Page Skipping
+    # Skip anonymization and OCR for blank / near-blank student pages
+    BLANK_PAGE_SKIP: bool = os.getenv("BLANK_PAGE_SKIP", "true").lower() == "true"
+    # Ink pixel share (of the page, without margins) below which a page may be near-blank
+    BLANK_MAX_INK_RATIO: float = float(os.getenv("BLANK_MAX_INK_RATIO", "0.0005"))
+    # A single mark this large (px on the ~100 DPI thumbnail) keeps the page
+    BLANK_MAX_COMPONENT_PX: int = int(os.getenv("BLANK_MAX_COMPONENT_PX", "40"))
+    # Marks smaller than this are scanner noise
+    BLANK_MIN_BLOB_PX: int = int(os.getenv("BLANK_MIN_BLOB_PX", "4"))
+
+    # Parallel pdftoppm processes rendering PDF pages ahead of the pipeline
+    RENDER_WORKERS: int = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # DPI of the page body (vision OCR, anonymized backup PNG)
+    RENDER_BODY_DPI: int = int(os.getenv("RENDER_BODY_DPI", "200"))
+    # DPI of the separately rendered header band (EasyOCR anonymization)
+    RENDER_HEADER_DPI: int = int(os.getenv("RENDER_HEADER_DPI", "300"))
+    # Maximum number of upload jobs running the pipeline at the same time
+    UPLOAD_MAX_ACTIVE_JOBS: int = int(os.getenv("UPLOAD_MAX_ACTIVE_JOBS", "4"))
+    # Attempts (including restarts) before an upload job is dead-lettered
+    UPLOAD_MAX_ATTEMPTS: int = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "3"))
+
     @property
     def POPPLER_PATH(self):
         if os.path.exists(self.LOCAL_POPPLER_PATH):
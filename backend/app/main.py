@@ -5,6 +5,9 @@ import os
 
 from app.core.database import init_db
 from app.core.config import settings
+from app.services.anonymizer_pool import start_anonymizer_pool, shutdown_anonymizer_pool
+from app.services.jobs import resume_upload_jobs
+from app.services.batch import resume_batches
 from app.api.routers import questions, results, grading, upload, reports
 
 # Load environment variables
@@ -24,6 +27,17 @@ app.add_middleware(
 @app.on_event("startup")
 def startup_event():
     init_db()
+    start_anonymizer_pool()
+
+# Restart upload jobs interrupted by a crash or redeploy
+@app.on_event("startup")
+async def resume_jobs_event():
+    resume_upload_jobs()
+    resume_batches()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    shutdown_anonymizer_pool()
 
 @app.get("/")
 async def root():
@@ -3,7 +3,7 @@ Database Models
 SQLAlchemy ORM models for exam system
 """
 
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -36,3 +36,34 @@ class OgrenciSonuclari(Base):
     final_puan = Column(Float, nullable=True)  # Final calculated score
     yorum = Column(Text, nullable=True)  # Gemini feedback/comment
     created_at = Column(DateTime, server_default=func.now())
+
+
+class YuklemeIsleri(Base):
+    """Yükleme İşleri Tablosu - Durable Upload Job Queue"""
+    __tablename__ = "yukleme_isleri"
+
+    id = Column(String(36), primary_key=True)  # Upload job id (uuid)
+    dosya_adi = Column(String(255), nullable=False)  # Original filename
+    kaynak_yolu = Column(Text, nullable=True)  # Persisted copy of the upload (or shared class PDF)
+    sayfa_araligi = Column(String(20), nullable=True)  # "first-last" for split class PDFs
+    sayfa_sayisi = Column(Integer, nullable=True)  # Page count
+    batch_id = Column(String(36), nullable=True, index=True)
+    durum = Column(String(20), nullable=False, index=True, default="queued")  # queued | running | completed | dead
+    deneme_sayisi = Column(Integer, nullable=False, default=0)  # Attempts started so far
+    hata = Column(Text, nullable=True)  # Last error
+    degerlendirme = Column(Text, nullable=True)  # Live grading context (JSON), if the upload is graded
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class SayfaKontrolNoktalari(Base):
+    """Sayfa Kontrol Noktaları Tablosu - Per-page Stage Checkpoints"""
+    __tablename__ = "sayfa_kontrol_noktalari"
+    __table_args__ = (UniqueConstraint("is_id", "sayfa_no", "asama"),)
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    is_id = Column(String(36), ForeignKey("yukleme_isleri.id"), nullable=False, index=True)
+    sayfa_no = Column(Integer, nullable=False)  # 1-based page number
+    asama = Column(String(20), nullable=False)  # anonymize | ocr | grade
+    sonuc = Column(Text, nullable=False)  # Stage result (JSON)
+    created_at = Column(DateTime, server_default=func.now())
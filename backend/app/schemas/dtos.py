@@ -72,6 +72,29 @@ class PuanlamaResponse(BaseModel):
     yorum: str
 
 
+# Toplu (Sınıf) Puanlama Schemas
+class TopluCevap(BaseModel):
+    soru_no: int
+    ogrenci_cevabi: Optional[str] = ""
+    soru_metni: Optional[str] = None
+
+
+class TopluOgrenci(BaseModel):
+    ogrenci_id: str
+    cevaplar: List[TopluCevap]
+
+
+class TopluPuanlamaRequest(BaseModel):
+    sinav_id: Optional[str] = None
+    answer_key_text: Optional[str] = None
+    rubric_text: Optional[str] = None
+    ogrenciler: List[TopluOgrenci]
+    # Sonuçları OgrenciSonuclari tablosuna yaz (sinav_id gerekir)
+    kaydet: bool = True
+    # Benzer cevapları kümele, her kümeden bir temsilciyi puanla
+    kumele: bool = False
+
+
 # Raporlama Schemas
 class ReportItem(BaseModel):
     soru_no: int
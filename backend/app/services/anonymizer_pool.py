@@ -0,0 +1,325 @@
+"""
+Anonymizer Worker Pool
+Runs EasyOCR header detection in a pool of worker processes so that
+anonymization never blocks the API event loop. Each worker loads the
+EasyOCR model once. Only the header band of a page is handed over, through
+shared memory, and workers send back just the redaction boxes and the
+extracted name/number.
+
+Once a layout template fits a page (see layout_template), workers are only
+asked to recognize the value zones, or are skipped entirely.
+
+Detection requests arriving within ANON_BATCH_WAIT_MS of each other (from
+any upload) are gathered into batches of up to ANON_BATCH_SIZE header bands
+and run through EasyOCR's batched inference in one worker call; each result
+is handed back to the page that asked for it.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.services.layout_template import get_layout_templates
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def _init_worker():
+    """Pool initializer: load the EasyOCR model once per worker process."""
+    from app.services import ocr
+    ocr.get_reader()
+
+
+def _detect_band(band: np.ndarray, img_w: int, header_limit: int, scale: float):
+    """Full detection: (redaction_boxes, extracted_data, layout), or None without EasyOCR."""
+    from app.services import ocr
+
+    if ocr.get_reader() is None:
+        return None
+    results = ocr.read_header_band(band, scale)
+    return ocr.detect_student_fields(results, img_w, header_limit, with_layout=True)
+
+
+def _detect_bands(bands: np.ndarray, metas: list, scale: float):
+    """Batched _detect_band; metas holds (img_w, header_limit) per band."""
+    from app.services import ocr
+
+    if ocr.get_reader() is None:
+        return None
+    batched = ocr.read_header_bands(bands, scale)
+    return [
+        ocr.detect_student_fields(results, img_w, header_limit, with_layout=True)
+        for results, (img_w, header_limit) in zip(batched, metas)
+    ]
+
+
+def _recognize_band(band: np.ndarray, boxes: list):
+    """Recognition of known value boxes only, or None without EasyOCR."""
+    from app.services import ocr
+
+    if ocr.get_reader() is None:
+        return None
+    return ocr.recognize_value_boxes(band, boxes)
+
+
+def _run_in_worker(fn, shm_name: str, shape: tuple, *args):
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # does not take ownership; the parent unlinks the block when done
+    shm = shared_memory.SharedMemory(name=shm_name)
+    band = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        return fn(band, *args)
+    finally:
+        del band
+        shm.close()
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+class AnonymizerPool:
+    """
+    Process pool wrapper that tracks queue depth.
+
+    pending = pages submitted but not finished (waiting + being processed).
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_ms = 0.0
+        self.batches = 0
+        self.batched_pages = 0
+        self._lock = threading.Lock()
+        # Detection requests waiting to be batched (event loop thread only)
+        self._batch = []
+        self._batch_timer = None
+        self._batch_tasks = set()
+        self._executor = None
+        if size > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "pool_size": self.size,
+                "mode": "process" if self._executor else "thread",
+                "pending": self.submitted - finished,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_ms": round(self.total_ms / finished, 1) if finished else 0.0,
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_pages / self.batches, 2) if self.batches else 0.0
+            }
+
+    async def detect(self, header_band: np.ndarray, img_w: int, header_limit: int):
+        """
+        Runs header detection for one page.
+        Returns (redaction_boxes, extracted_data, layout), or None if EasyOCR is unavailable.
+        """
+        if settings.ANON_BATCH_SIZE <= 1:
+            return await self._run(_detect_band, header_band, img_w, header_limit, settings.ANON_HEADER_SCALE)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((header_band, (img_w, header_limit), future))
+        if len(self._batch) >= settings.ANON_BATCH_SIZE:
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = loop.call_later(settings.ANON_BATCH_WAIT_MS / 1000, self._flush_batch)
+        return await future
+
+    def _flush_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        items, self._batch = self._batch, []
+        if items:
+            task = asyncio.create_task(self._detect_batch(items))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _detect_batch(self, items: list):
+        from app.services import ocr
+
+        try:
+            bands = await asyncio.to_thread(ocr.stack_header_bands, [band for band, _, _ in items])
+            results = await self._run(
+                _detect_bands, bands, [meta for _, meta, _ in items], settings.ANON_HEADER_SCALE,
+                pages=len(items)
+            )
+        except Exception as e:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.batched_pages += len(items)
+        for i, (_, _, future) in enumerate(items):
+            if not future.done():
+                future.set_result(results[i] if results is not None else None)
+
+    async def recognize(self, header_band: np.ndarray, boxes: list):
+        """
+        Reads the text in known boxes of the header band (no detection).
+        Returns one string per box, or None if EasyOCR is unavailable.
+        """
+        return await self._run(_recognize_band, header_band, boxes)
+
+    async def _run(self, fn, header_band: np.ndarray, *args, pages: int = 1):
+        with self._lock:
+            self.submitted += pages
+        started = time.perf_counter()
+
+        try:
+            if self._executor is None:
+                result = await asyncio.to_thread(fn, header_band, *args)
+            else:
+                result = await self._run_in_process(fn, header_band, *args)
+        except Exception:
+            with self._lock:
+                self.failed += pages
+            raise
+
+        with self._lock:
+            self.completed += pages
+            self.total_ms += (time.perf_counter() - started) * 1000
+        return result
+
+    async def _run_in_process(self, fn, header_band, *args):
+        shm = shared_memory.SharedMemory(create=True, size=header_band.nbytes)
+        try:
+            shared = np.ndarray(header_band.shape, dtype=np.uint8, buffer=shm.buf)
+            shared[:] = header_band
+            del shared
+
+            future = self._executor.submit(_run_in_worker, fn, shm.name, header_band.shape, *args)
+            return await asyncio.wrap_future(future)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_anonymizer_pool() -> AnonymizerPool:
+    """Returns the process-wide anonymizer pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AnonymizerPool(settings.ANON_POOL_SIZE)
+            logger.info(f"Anonymizer pool started ({_pool.stats()['mode']}, size={settings.ANON_POOL_SIZE}).")
+    return _pool
+
+
+def _noop():
+    return None
+
+
+def start_anonymizer_pool():
+    """
+    Starts the pool at application startup so the EasyOCR model is loaded
+    before the first upload (in every worker, or in-process in thread mode).
+    """
+    from app.services import ocr
+
+    pool = get_anonymizer_pool()
+    if pool._executor is None:
+        ocr.get_reader()
+    else:
+        for _ in range(pool.size):
+            pool._executor.submit(_noop)
+
+
+def shutdown_anonymizer_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+async def anonymize_page(image: Image.Image, need_values: bool = True) -> tuple[Image.Image, dict]:
+    """
+    Async counterpart of ocr.anonymize_student_data_local used by the upload
+    pipeline: detection runs in the worker pool, redaction runs here.
+
+    If a learned layout template fits the page, its label/value zones are
+    redacted directly; EasyOCR only recognizes the values, and only when
+    need_values is set (the caller does not know the name/number yet).
+
+    Detection works on the page's high-DPI header render when the pipeline
+    attached one; the boxes are scaled back to the page before redaction.
+
+    Unlike anonymize_student_data_local, a detection or template error is
+    raised instead of passing the page through unredacted: the page would
+    otherwise be saved and sent to OpenAI with the student's name on it.
+
+    Returns:
+        (redacted_image, extracted_data_dict)
+    """
+    from app.services import ocr
+
+    try:
+        header_band, header_limit, scale, page_size = ocr.page_header_band(image)
+        templates = get_layout_templates()
+        pool = get_anonymizer_pool()
+
+        match = None
+        if templates is not None:
+            match = await asyncio.to_thread(templates.match, header_band, page_size)
+
+        if match is not None:
+            template, shift = match
+            redaction_boxes = template.redaction_boxes(shift)
+            extracted_data = {}
+            if need_values:
+                texts = await pool.recognize(header_band, template.value_boxes(shift))
+                extracted_data = template.extract_values(texts or [])
+        else:
+            detection = await pool.detect(header_band, page_size[0], header_limit)
+            if detection is None:
+                logger.warning("EasyOCR reader not available. Skipping anonymization.")
+                return image, {}
+
+            redaction_boxes, extracted_data, layout = detection
+            if templates is not None:
+                await asyncio.to_thread(templates.learn, header_band, page_size, layout)
+
+        # Boxes are drawn on the rendered page itself; no full-page copy
+        redaction_boxes = ocr.scale_boxes(redaction_boxes, 1 / scale)
+        redacted = await asyncio.to_thread(ocr.apply_redactions, image, redaction_boxes)
+        return redacted, extracted_data
+
+    except Exception as e:
+        logger.error(f"EasyOCR anonymization failed: {e}")
+        raise
@@ -0,0 +1,101 @@
+"""
+Semantic Answer Clustering
+Groups near-paraphrase answers to the same question so that one
+representative per cluster is graded by the LLM and its grade is propagated
+to the other members (see batch_grading.grade_class).
+
+All answers to a question are embedded in one batch with the similarity
+module's sentence-transformer. Clustering is greedy leader clustering: the
+distinct answers are visited from most to least frequent and each joins the
+first leader it is at least ANSWER_CLUSTERING_THRESHOLD cosine-similar to,
+so every member is close to its representative itself (no chaining through
+other members). Answers that are equal after grading_cache.normalize_answer
+share a cluster without being compared; empty answers form their own.
+"""
+
+import logging
+import random
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.grading_cache import normalize_answer
+from app.services.similarity import get_batch_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def cluster_answers(answers: list, threshold: float = None) -> list:
+    """
+    Clusters of indices into answers. The first index of a cluster is its
+    representative: the first occurrence of the cluster's most frequent
+    answer.
+    """
+    threshold = settings.ANSWER_CLUSTERING_THRESHOLD if threshold is None else threshold
+    groups = {}  # normalized answer -> indices
+    for index, answer in enumerate(answers):
+        groups.setdefault(normalize_answer(answer), []).append(index)
+
+    clusters = []
+    if "" in groups:
+        clusters.append(groups.pop(""))
+    texts = sorted(groups, key=lambda text: (-len(groups[text]), groups[text][0]))
+    if not texts:
+        return clusters
+
+    try:
+        embeddings = get_batch_embeddings([answers[groups[text][0]] for text in texts])
+    except Exception as e:
+        # No model: only identical (normalized) answers are grouped
+        logger.error(f"Answer embeddings failed, clustering identical answers only: {e}")
+        return clusters + [groups[text] for text in texts]
+    leader_rows = []
+    leader_clusters = []
+    for row, text in enumerate(texts):
+        if leader_rows:
+            similarities = embeddings[leader_rows] @ embeddings[row]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                leader_clusters[best].extend(groups[text])
+                continue
+        leader_rows.append(row)
+        leader_clusters.append(list(groups[text]))
+
+    clusters.extend(leader_clusters)
+    logger.info(f"Clustered {len(answers)} answers into {len(clusters)} clusters (threshold {threshold})")
+    return clusters
+
+
+def spot_check_members(members: list, count: int = None) -> list:
+    """
+    Up to count members of a cluster, never the representative (members[0]),
+    to be graded on their own as a check of the propagated grade.
+    """
+    count = settings.ANSWER_CLUSTERING_SPOT_CHECKS if count is None else count
+    candidates = members[1:]
+    # Fixed seed: reruns on the same class check the same members
+    return random.Random(0).sample(candidates, min(max(0, count), len(candidates)))
+
+
+def clustering_report(answers: int, clusters: int, spot_checks: list) -> dict:
+    """
+    LLM calls saved by clustering and the score drift on spot-checked members.
+    spot_checks: (representative grade, member grade) pairs; the drift is
+    |member final_puan - propagated final_puan|, also as a share of max_puan.
+    """
+    drifts = [
+        (abs(member['final_puan'] - representative['final_puan']), representative.get('max_puan') or 100.0)
+        for representative, member in spot_checks
+        if 'error' not in representative and 'error' not in member
+    ]
+    llm_calls = clusters + len(spot_checks)
+    return {
+        "answers": answers,
+        "clusters": clusters,
+        "spot_checked": len(spot_checks),
+        "llm_calls": llm_calls,
+        "calls_saved": answers - llm_calls,
+        "mean_abs_drift": round(sum(d for d, _ in drifts) / len(drifts), 2) if drifts else None,
+        "max_abs_drift": round(max(d for d, _ in drifts), 2) if drifts else None,
+        "mean_drift_ratio": round(sum(d / m for d, m in drifts) / len(drifts), 4) if drifts else None
+    }
@@ -0,0 +1,261 @@
+"""
+Batch Uploads
+Turns a class upload (a ZIP of papers, many files, or one scanned class PDF)
+into one upload job per student and tracks them under a single batch id.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+
+from app.core.config import settings
+from app.services import job_queue
+from app.services.jobs import job_store, submit_student_upload
+from app.services.pipeline import UnsupportedFileError, count_document_pages
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff')
+
+
+def expand_upload(filename: str, contents: bytes) -> list[tuple[str, bytes]]:
+    """
+    Returns the (filename, contents) papers inside one uploaded file.
+    ZIP archives are unpacked (folders and macOS metadata are skipped);
+    any other file is returned as a single paper.
+    """
+    if not filename.lower().endswith('.zip'):
+        return [(filename, contents)]
+
+    papers = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                    continue
+                if not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    logger.info(f"Skipping unsupported file in archive: {name}")
+                    continue
+                papers.append((os.path.basename(name), archive.read(info)))
+    except zipfile.BadZipFile:
+        raise UnsupportedFileError(f"ZIP arşivi okunamadı: {filename}")
+
+    return papers
+
+
+class UploadBatch:
+    """A group of student upload jobs created by one batch request."""
+
+    def __init__(self, batch_id: str):
+        self.id = batch_id
+        self.entries = []  # manifest rows, one per student job
+        self.work_dir = None  # saved class PDFs, removed when the batch finishes
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_status(self) -> dict:
+        jobs = []
+        counts = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0}
+        # The durable queue decides when a job is finished: in memory a job
+        # is also 'failed' between an attempt and its retry
+        durable = job_queue.job_states([entry['job_id'] for entry in self.entries])
+        for entry in self.entries:
+            job = job_store.get(entry['job_id'])
+            state = durable.get(entry['job_id'])
+            if state == 'dead':
+                status = 'failed'
+            elif state == 'completed':
+                status = 'completed'
+            elif state in ('queued', 'running'):
+                status = job.status if job is not None and job.status != 'failed' else 'queued'
+            else:
+                status = job.status if job is not None else 'expired'
+            counts[status] = counts.get(status, 0) + 1
+            row = dict(entry, status=status)
+            if job is not None:
+                row['page_count'] = job.page_count
+                row['pages_done'] = sum(1 for p in job.pages.values() if p['stage'] in ('done', 'failed', 'skipped'))
+                if job.error:
+                    row['error'] = job.error
+            jobs.append(row)
+
+        finished = counts.get('completed', 0) + counts.get('failed', 0) + counts.get('expired', 0)
+        return {
+            "batch_id": self.id,
+            "status": 'completed' if finished == len(self.entries) else 'running',
+            "student_count": len(self.entries),
+            "counts": counts,
+            "jobs": jobs,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+class BatchStore:
+    """In-process registry of batch uploads."""
+
+    def __init__(self):
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def add(self, batch: UploadBatch):
+        with self._lock:
+            self._prune()
+            self._batches[batch.id] = batch
+
+    def get(self, batch_id: str):
+        with self._lock:
+            return self._batches.get(batch_id)
+
+    def _prune(self):
+        cutoff = time.time() - settings.UPLOAD_JOB_TTL_SECONDS
+        expired = [
+            batch_id for batch_id, batch in self._batches.items()
+            if batch.finished_at is not None and batch.finished_at < cutoff
+        ]
+        for batch_id in expired:
+            del self._batches[batch_id]
+
+
+batch_store = BatchStore()
+
+
+def _split_ranges(page_count: int, pages_per_student: int) -> list[tuple[int, int]]:
+    return [
+        (first, min(first + pages_per_student - 1, page_count))
+        for first in range(1, page_count + 1, pages_per_student)
+    ]
+
+
+def _save_class_pdf(batch: UploadBatch, index: int, filename: str, contents: bytes) -> str:
+    if batch.work_dir is None:
+        batch.work_dir = _batch_work_dir(batch.id)
+        os.makedirs(batch.work_dir, exist_ok=True)
+    pdf_path = os.path.join(batch.work_dir, f"{index}_{os.path.basename(filename)}")
+    with open(pdf_path, "wb") as f:
+        f.write(contents)
+    return pdf_path
+
+
+async def create_batch(papers: list[tuple[str, bytes]], pages_per_student: int = None, grading=None) -> UploadBatch:
+    """
+    Creates one upload job per student and starts them in the background.
+
+    Each paper is one student unless pages_per_student is given, in which
+    case a PDF is treated as a scanned class set and split into consecutive
+    page ranges of that size. Split PDFs are written to disk once and every
+    student job renders its own range from that copy. grading (a
+    GradingContext) grades every job's questions while it is transcribed.
+
+    Raises UnsupportedFileError if a paper cannot be read.
+    """
+    batch = UploadBatch(str(uuid.uuid4()))
+    pending = []
+
+    for filename, contents in papers:
+        if pages_per_student and filename.lower().endswith('.pdf'):
+            pdf_path = await asyncio.to_thread(_save_class_pdf, batch, len(pending), filename, contents)
+            page_count = await asyncio.to_thread(count_document_pages, contents, filename, pdf_path)
+            for page_range in _split_ranges(page_count, pages_per_student):
+                job, created = job_store.create(filename, contents, page_range=page_range, pdf_path=pdf_path, grading=grading)
+                pending.append((job, created, b"", filename, page_range, page_range[1] - page_range[0] + 1))
+        else:
+            page_count = await asyncio.to_thread(count_document_pages, contents, filename)
+            job, created = job_store.create(filename, contents, grading=grading)
+            pending.append((job, created, contents, filename, None, page_count))
+
+    seen = set()
+    for job, created, contents, filename, page_range, page_count in pending:
+        # Identical papers dedupe to one job, which is listed once
+        if job.id in seen:
+            continue
+        seen.add(job.id)
+        if created:
+            # A job reused from an earlier batch stays in that batch
+            job.batch_id = batch.id
+            job.page_count = page_count
+            await submit_student_upload(job, contents)
+        batch.entries.append({
+            "job_id": job.id,
+            "filename": filename,
+            "page_range": list(page_range) if page_range else None,
+            "status_url": f"/upload/jobs/{job.id}"
+        })
+
+    batch_store.add(batch)
+    job_store.spawn(_finalize_batch(batch))
+    return batch
+
+
+def _batch_work_dir(batch_id: str) -> str:
+    return os.path.join(settings.BASE_DIR, "batch_uploads", batch_id)
+
+
+async def _finalize_batch(batch: UploadBatch):
+    """
+    Waits until every student job is completed or dead-lettered in the
+    durable queue, then writes the batch manifest and removes the saved
+    class PDFs.
+    """
+    job_ids = [entry['job_id'] for entry in batch.entries]
+    while True:
+        states = await asyncio.to_thread(job_queue.job_states, job_ids)
+        if all(states.get(job_id) not in ('queued', 'running') for job_id in job_ids):
+            break
+        await asyncio.sleep(1)
+
+    status = await asyncio.to_thread(batch.to_status)
+    batch.finished_at = time.time()
+    status['finished_at'] = batch.finished_at
+
+    try:
+        results_dir = os.path.join(settings.BASE_DIR, "results")
+        os.makedirs(results_dir, exist_ok=True)
+        with open(os.path.join(results_dir, f"batch_{batch.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.warning(f"Could not save batch manifest: {e}")
+
+    if batch.work_dir:
+        shutil.rmtree(batch.work_dir, ignore_errors=True)
+
+
+def resume_batches() -> int:
+    """
+    Re-registers the batches whose jobs were resumed from the durable queue
+    (see jobs.resume_upload_jobs) and the ones whose saved class PDFs were
+    left behind by a restart, and finalizes them when their jobs are done.
+    Must be called from the running event loop, after resume_upload_jobs.
+    """
+    batch_ids = job_queue.unfinished_batches()
+    batch_root = os.path.join(settings.BASE_DIR, "batch_uploads")
+    if os.path.isdir(batch_root):
+        batch_ids.update(os.listdir(batch_root))
+
+    for batch_id in batch_ids:
+        batch = UploadBatch(batch_id)
+        batch.entries = [
+            {
+                "job_id": row['id'],
+                "filename": row['filename'],
+                "page_range": row['page_range'],
+                "status_url": f"/upload/jobs/{row['id']}"
+            }
+            for row in job_queue.batch_jobs(batch_id)
+        ]
+        if os.path.isdir(_batch_work_dir(batch_id)):
+            batch.work_dir = _batch_work_dir(batch_id)
+        batch_store.add(batch)
+        job_store.spawn(_finalize_batch(batch))
+
+    if batch_ids:
+        logger.info(f"Resumed {len(batch_ids)} unfinished batch upload(s).")
+    return len(batch_ids)
@@ -0,0 +1,224 @@
+"""
+Class-Level Batch Grading
+Grades N students x M answers of one exam in a single request. The answer
+key, rubric and the exam's questions are loaded once, the grading calls run
+on a dedicated pool of BATCH_GRADING_CONCURRENCY threads (the default
+asyncio pool is too small to keep that many LLM round trips in flight) and
+every result is yielded as soon as it completes. OgrenciSonuclari rows are
+written in bulk, one transaction per BATCH_GRADING_CHUNK_SIZE rows.
+
+With cluster set, the answers to each question are first grouped by
+answer_clustering: one representative per cluster (plus spot-checked
+members) is graded and the other members receive its grade.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.domain import OgrenciSonuclari
+from app.services.answer_clustering import cluster_answers, clustering_report, spot_check_members
+from app.services.live_grading import GradingContext, question_input
+from app.services.scoring import evaluate_answer, evaluate_paper
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.BATCH_GRADING_CONCURRENCY),
+                thread_name_prefix="batch-grading"
+            )
+        return _executor
+
+
+def _grade_answer(context: GradingContext, question: dict) -> list:
+    try:
+        result = evaluate_answer(answer_key_text=context.answer_key_text, rubric_text=context.rubric_text, **question)
+        return [{"soru_no": question['soru_no'], **result}]
+    except Exception as e:
+        logger.error(f"Grading question {question['soru_no']} failed: {e}")
+        return [{"soru_no": question['soru_no'], "error": str(e)}]
+
+
+def _grade_paper(context: GradingContext, questions: list) -> list:
+    try:
+        return evaluate_paper(questions, answer_key_text=context.answer_key_text, rubric_text=context.rubric_text)['results']
+    except Exception as e:
+        logger.error(f"Grading paper failed: {e}")
+        return [{"soru_no": question['soru_no'], "error": str(e)} for question in questions]
+
+
+def save_results(sinav_id: str, rows: list) -> int:
+    """Writes (ogrenci_id, ogrenci_cevabi, grade) rows in one transaction."""
+    db = SessionLocal()
+    try:
+        db.bulk_save_objects([
+            OgrenciSonuclari(
+                sinav_id=sinav_id,
+                ogrenci_id=ogrenci_id,
+                soru_no=grade['soru_no'],
+                ogrenci_cevabi=ogrenci_cevabi,
+                bert_skoru=grade['bert_skoru'],
+                llm_skoru=grade['llm_skoru'],
+                final_puan=grade['final_puan'],
+                yorum=grade['yorum']
+            )
+            for ogrenci_id, ogrenci_cevabi, grade in rows
+        ])
+        db.commit()
+        return len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _propagated(grade: dict, representative_id: str) -> dict:
+    """A cluster representative's grade as given to another member."""
+    result = {k: v for k, v in grade.items() if k not in ('usage', 'cached')}
+    result['kume_temsilcisi'] = representative_id
+    return result
+
+
+async def grade_class(context: GradingContext, students: list, save: bool = True, cluster: bool = False):
+    """
+    Async generator of grading events for a class:
+      {"type": "result", "ogrenci_id", "soru_no", ...evaluate_answer fields or "error"}
+      {"type": "saved", "rows"}      after each committed chunk
+      {"type": "summary", ...}       last
+    students: [{"ogrenci_id", "cevaplar": [{"soru_no", "ogrenci_cevabi", "soru_metni"}]}]
+    Results are saved only when save is set and the context has a sinav_id.
+    With cluster, answers are graded per question cluster (paper mode does
+    not apply); propagated results carry kume_temsilcisi, the representative's
+    ogrenci_id, and the summary a "clustering" report.
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    save = save and bool(context.sinav_id)
+    chunk_size = max(1, settings.BATCH_GRADING_CHUNK_SIZE)
+    await asyncio.to_thread(context.load_questions)
+
+    async def run(tag, grade_fn, *args):
+        return tag, await loop.run_in_executor(executor, grade_fn, context, *args)
+
+    answers = {}  # (ogrenci_id, soru_no) -> student's answer text
+    tasks = []
+    invalid = []
+    by_question = {}  # soru_no -> [(ogrenci_id, question)], when clustering
+    for student in students:
+        ogrenci_id = student['ogrenci_id']
+        questions = []
+        for index, cevap in enumerate(student['cevaplar']):
+            question = question_input(context, cevap, index)
+            if 'error' in question:
+                invalid.append((ogrenci_id, question))
+                continue
+            answers[(ogrenci_id, question['soru_no'])] = question['ogrenci_cevabi']
+            questions.append(question)
+
+        if cluster:
+            for question in questions:
+                by_question.setdefault(question['soru_no'], []).append((ogrenci_id, question))
+        elif settings.GRADING_MODE == "paper" and len(questions) > 1:
+            tasks.append(asyncio.ensure_future(run(ogrenci_id, _grade_paper, questions)))
+        else:
+            for question in questions:
+                tasks.append(asyncio.ensure_future(run(ogrenci_id, _grade_answer, question)))
+
+    # Clustering: one task for each representative, which grades the cluster,
+    # and one per spot-checked member
+    clusters = []
+    for entries in by_question.values():
+        indices_list = await asyncio.to_thread(cluster_answers, [question['ogrenci_cevabi'] for _, question in entries])
+        for indices in indices_list:
+            members = [entries[i] for i in indices]
+            checked = spot_check_members(members)
+            cluster_no = len(clusters)
+            clusters.append({
+                "representative": members[0][0],
+                "propagate_to": [member[0] for member in members[1:] if member not in checked],
+                "grade": None,
+                "checks": []
+            })
+            tasks.append(asyncio.ensure_future(run(("cluster", cluster_no), _grade_answer, members[0][1])))
+            for ogrenci_id, question in checked:
+                tasks.append(asyncio.ensure_future(run(("check", cluster_no, ogrenci_id), _grade_answer, question)))
+
+    def results_of(tag, grades) -> list:
+        """(ogrenci_id, grade) pairs for a finished task."""
+        if not isinstance(tag, tuple):
+            return [(tag, grade) for grade in grades]
+        entry = clusters[tag[1]]
+        if tag[0] == "check":
+            entry["checks"].append(grades[0])
+            return [(tag[2], grades[0])]
+        entry["grade"] = grades[0]
+        representative = {**grades[0], 'kume_temsilcisi': entry["representative"]}
+        return [(entry["representative"], representative)] + [
+            (ogrenci_id, _propagated(grades[0], entry["representative"])) for ogrenci_id in entry["propagate_to"]
+        ]
+
+    counts = {"answers": len(answers) + len(invalid), "graded": 0, "cache_hits": 0, "local_graded": 0, "errors": len(invalid), "saved_rows": 0}
+    pending_rows = []
+
+    async def flush():
+        rows = pending_rows[:]
+        del pending_rows[:]
+        counts["saved_rows"] += await asyncio.to_thread(save_results, context.sinav_id, rows)
+        return {"type": "saved", "rows": len(rows)}
+
+    try:
+        for ogrenci_id, grade in invalid:
+            yield {"type": "result", "ogrenci_id": ogrenci_id, **grade}
+
+        for next_done in asyncio.as_completed(tasks):
+            tag, grades = await next_done
+            for ogrenci_id, grade in results_of(tag, grades):
+                if 'error' in grade:
+                    counts["errors"] += 1
+                else:
+                    counts["graded"] += 1
+                    counts["cache_hits"] += 1 if grade.get('cached') else 0
+                    counts["local_graded"] += 1 if grade.get('kademe') == "yerel" else 0
+                    if save:
+                        pending_rows.append((ogrenci_id, answers.get((ogrenci_id, grade['soru_no'])), grade))
+                yield {"type": "result", "ogrenci_id": ogrenci_id, **grade}
+            if len(pending_rows) >= chunk_size:
+                yield await flush()
+
+        if pending_rows:
+            yield await flush()
+    finally:
+        # Client went away: drop what has not started yet
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Class graded: {len(students)} students, {counts['answers']} answers in {elapsed:.1f}s")
+    summary = {
+        "type": "summary",
+        "students": len(students),
+        **counts,
+        "elapsed_s": round(elapsed, 2),
+        "answers_per_minute": round(counts["answers"] / elapsed * 60, 1) if elapsed > 0 else None
+    }
+    if cluster:
+        summary["clustering"] = clustering_report(
+            sum(len(entries) for entries in by_question.values()),
+            len(clusters),
+            [(entry["grade"], check) for entry in clusters for check in entry["checks"]]
+        )
+    yield summary
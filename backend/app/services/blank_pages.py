@@ -0,0 +1,68 @@
+"""
+Blank Page Detection
+Cheap ink-density check run on every rendered page before anonymization.
+Blank back sides and empty continuation pages are skipped instead of going
+through EasyOCR and a vision call that would only return an empty list.
+
+The page is measured on a fixed-width thumbnail, so the thresholds do not
+depend on the render DPI. Ink is anything clearly darker than the paper;
+specks below BLANK_MIN_BLOB_PX are scanner noise. A page is near-blank only
+if its ink ratio is tiny AND no mark is larger than BLANK_MAX_COMPONENT_PX,
+so a page carrying a single short handwritten answer is never skipped.
+"""
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+
+# Thumbnail width used for the measurement (~100 DPI for an A4 page)
+ANALYSIS_WIDTH = 850
+# Border ignored on every side (scanner shadows, punch holes, staples)
+MARGIN_RATIO = 0.04
+# Darker than the paper by at least this much counts as ink
+INK_CONTRAST = 60
+
+
+def measure_ink(image: Image.Image) -> dict:
+    """Returns the ink statistics of a page: ink_ratio, largest_mark (px) and marks."""
+    gray = image if image.mode == "L" else image.convert("L")
+    width, height = gray.size
+    factor = max(1, round(width / ANALYSIS_WIDTH))
+    small = np.asarray(gray.reduce(factor) if factor > 1 else gray)
+
+    h, w = small.shape
+    my, mx = int(h * MARGIN_RATIO), int(w * MARGIN_RATIO)
+    inner = small[my:h - my, mx:w - mx]
+    if inner.size == 0:
+        return {"ink_ratio": 0.0, "largest_mark": 0, "marks": 0}
+
+    paper = int(np.percentile(inner, 90))
+    mask = (inner < paper - INK_CONTRAST).astype(np.uint8)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    areas = stats[1:count, cv2.CC_STAT_AREA]
+    marks = areas[areas >= settings.BLANK_MIN_BLOB_PX]
+    return {
+        "ink_ratio": round(float(marks.sum()) / inner.size, 6),
+        "largest_mark": int(marks.max()) if marks.size else 0,
+        "marks": int(marks.size)
+    }
+
+
+def blank_page_reason(image: Image.Image):
+    """
+    Returns None for pages with content, otherwise a dict describing why the
+    page is skipped: {'reason': 'blank' | 'near_blank', 'detail', ...stats}.
+    """
+    stats = measure_ink(image)
+    if stats["marks"] == 0:
+        return {"reason": "blank", "detail": "Sayfada mürekkep bulunamadı", **stats}
+    if stats["ink_ratio"] < settings.BLANK_MAX_INK_RATIO and stats["largest_mark"] < settings.BLANK_MAX_COMPONENT_PX:
+        return {
+            "reason": "near_blank",
+            "detail": f"Yalnızca küçük lekeler var (mürekkep oranı %{stats['ink_ratio'] * 100:.3f})",
+            **stats
+        }
+    return None
@@ -0,0 +1,81 @@
+"""
+Grading Result Cache
+Persistent cache in front of the LLM grading call. Blank answers,
+"bilmiyorum" and identical memorized definitions are graded once per
+question instead of once per student.
+
+The key fingerprints everything the grade depends on: question number and
+text, ideal answer, keywords, answer key, rubric, model, the prompt
+template (see scoring.grading_prompt_version) and the normalized student
+answer. Changing any of them produces a new key, so stale grades are never
+served; they simply age out through the LRU eviction of OCRCache.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+
+from app.core.config import settings
+from app.services.ocr_cache import OCRCache
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+# Turkish dotted/dotless i: "I".lower() would give "i" instead of "ı"
+_TURKISH_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+
+
+def turkish_casefold(text: str) -> str:
+    return text.translate(_TURKISH_UPPER).lower()
+
+
+def normalize_answer(text: str) -> str:
+    """
+    Student answer as used in the cache key: NFC-normalized, Turkish-aware
+    lowercase, whitespace collapsed, and surrounding whitespace and
+    end-of-sentence punctuation removed ("Bilmiyorum. " == "bilmiyorum").
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    text = _WHITESPACE.sub(" ", turkish_casefold(text)).strip()
+    return text.rstrip(" .!…")
+
+
+def make_grading_key(model: str, prompt_version: str, soru_no: int, soru_metni: str, ideal_cevap: str,
+                     anahtar_kelimeler: str, answer_key_text: str, rubric_text: str, ogrenci_cevabi: str) -> str:
+    """sha256 over the grading inputs (length-prefixed, as in ocr_cache.make_cache_key)."""
+    digest = hashlib.sha256()
+    parts = (model, prompt_version, str(soru_no), soru_metni or "", ideal_cevap or "", anahtar_kelimeler or "",
+             answer_key_text or "", rubric_text or "", normalize_answer(ogrenci_cevabi))
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class GradingCache(OCRCache):
+    """Key -> evaluate_answer result store (same LRU/size policy as the OCR cache)."""
+
+    TABLE = "grading_cache"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_grading_cache():
+    """Returns the process-wide grading cache, or None when caching is disabled."""
+    global _cache
+    if not settings.GRADING_CACHE_ENABLED:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = GradingCache(settings.GRADING_CACHE_PATH, settings.GRADING_CACHE_MAX_MB * 1024 * 1024)
+            except Exception as e:
+                logger.error(f"Grading cache could not be opened, continuing without cache: {e}")
+                return None
+    return _cache
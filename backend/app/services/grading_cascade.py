@@ -0,0 +1,139 @@
+"""
+Tiered Grading Cascade
+Cheap local pre-score in front of the LLM (GRADING_CASCADE_ENABLED). Empty
+answers ("", "bilmiyorum", "-") and answers that are clearly off-topic or
+clearly a restatement of the ideal answer are settled locally from the SBERT
+similarity to ideal_cevap and the keyword coverage; only the ambiguous rest
+goes to analyze_with_openai. Every local grade carries a confidence value:
+how far past its threshold the answer is.
+
+The thresholds come from settings and are meant to be tuned on a labelled
+set with benchmarks/bench_grading_cascade.py.
+
+The exam tables store no points per question; the LLM reads them from the
+rubric. Answers are therefore only settled locally once an LLM grade of the
+same question has reported its max_puan; until then every answer, blank
+ones included, goes to the LLM so totals never mix in a made-up maximum.
+"""
+
+import logging
+import threading
+
+from app.core.config import settings
+from app.services.grading_cache import make_grading_key, normalize_answer
+
+logger = logging.getLogger(__name__)
+
+# Normalized answers that mean "no answer"
+NO_ANSWERS = {"", "bilmiyorum", "bilmiyom", "bilmiyorum hocam", "fikrim yok", "cevap yok", "yok", "boş", "bos", "-", "?", "x"}
+
+
+def default_thresholds() -> dict:
+    return {
+        "low_similarity": settings.GRADING_CASCADE_LOW_SIMILARITY,
+        "low_keywords": settings.GRADING_CASCADE_LOW_KEYWORDS,
+        "high_similarity": settings.GRADING_CASCADE_HIGH_SIMILARITY,
+        "high_keywords": settings.GRADING_CASCADE_HIGH_KEYWORDS
+    }
+
+
+def local_signals(ideal_cevap: str, ogrenci_cevabi: str, anahtar_kelimeler: str = "") -> dict:
+    """
+    Local features of an answer: bos (no answer), benzerlik (SBERT similarity
+    to ideal_cevap, None without one) and anahtar_kelime (keyword coverage,
+    None without keywords).
+    """
+    from app.services.similarity import calculate_keyword_score, get_batch_embeddings
+
+    normalized = normalize_answer(ogrenci_cevabi)
+    bos = normalized in NO_ANSWERS or not any(ch.isalnum() for ch in normalized)
+    benzerlik = None
+    if ideal_cevap and not bos:
+        # Not calculate_bert_score: its 0.0 on a model error would read as off-topic
+        try:
+            ideal, answer = get_batch_embeddings([ideal_cevap, ogrenci_cevabi])
+            benzerlik = max(0.0, min(1.0, float(ideal @ answer)))
+        except Exception as e:
+            logger.error(f"Local similarity failed, answer goes to the LLM: {e}")
+    return {
+        "bos": bos,
+        "benzerlik": benzerlik,
+        "anahtar_kelime": calculate_keyword_score(anahtar_kelimeler, ogrenci_cevabi) if anahtar_kelimeler and not bos else None
+    }
+
+
+def local_decision(signals: dict, thresholds: dict = None):
+    """
+    (score ratio, confidence) for a clear-cut answer: 0.0 for an empty or
+    off-topic answer, 1.0 for a full-mark one. (None, 0.0) sends the answer
+    to the LLM.
+    """
+    t = thresholds or default_thresholds()
+    if signals["bos"]:
+        return 0.0, 1.0
+
+    similarity = signals["benzerlik"]
+    keywords = signals["anahtar_kelime"]
+    if similarity is None:
+        return None, 0.0
+
+    if similarity <= t["low_similarity"] and (keywords is None or keywords <= t["low_keywords"]):
+        margin = (t["low_similarity"] - similarity) / max(t["low_similarity"], 1e-6)
+        return 0.0, round(0.5 + 0.5 * min(1.0, margin), 2)
+    if similarity >= t["high_similarity"] and (keywords is None or keywords >= t["high_keywords"]):
+        margin = (similarity - t["high_similarity"]) / max(1.0 - t["high_similarity"], 1e-6)
+        return 1.0, round(0.5 + 0.5 * min(1.0, margin), 2)
+    return None, 0.0
+
+
+# Question fingerprint -> max_puan reported by the LLM
+_max_points = {}
+_max_points_lock = threading.Lock()
+
+
+def _question_key(question: dict, answer_key_text: str = None, rubric_text: str = None) -> str:
+    return make_grading_key(
+        "max_puan", "", question.get('soru_no', 1), question.get('soru_metni', ''), question.get('ideal_cevap', ''),
+        "", answer_key_text, rubric_text, ""
+    )
+
+
+def record_max_points(question: dict, max_puan: float, answer_key_text: str = None, rubric_text: str = None):
+    """Remembers the max_puan of a successful LLM grade of the question."""
+    with _max_points_lock:
+        _max_points[_question_key(question, answer_key_text, rubric_text)] = max_puan
+
+
+def settle_locally(question: dict, answer_key_text: str = None, rubric_text: str = None):
+    """
+    evaluate_answer-shaped result (kademe 'yerel', guven) when the local
+    tier settles the answer, otherwise None.
+    """
+    signals = local_signals(question.get('ideal_cevap', ''), question.get('ogrenci_cevabi', ''), question.get('anahtar_kelimeler', ''))
+    ratio, confidence = local_decision(signals)
+    if ratio is None:
+        return None
+
+    with _max_points_lock:
+        max_puan = _max_points.get(_question_key(question, answer_key_text, rubric_text))
+    if max_puan is None:
+        return None
+
+    similarity = signals["benzerlik"]
+    if signals["bos"]:
+        yorum = "Cevap boş veya cevapsız; otomatik olarak 0 puan verildi."
+    elif ratio == 0:
+        yorum = f"Cevap ideal cevapla ilgisiz görünüyor (benzerlik %{similarity * 100:.0f}); otomatik olarak 0 puan verildi."
+    else:
+        yorum = f"Cevap ideal cevapla büyük ölçüde örtüşüyor (benzerlik %{similarity * 100:.0f}); tam puan verildi."
+
+    final_puan = round(ratio * max_puan, 2)
+    return {
+        'bert_skoru': round(similarity or 0.0, 4),
+        'llm_skoru': final_puan,
+        'final_puan': final_puan,
+        'max_puan': max_puan,
+        'yorum': yorum,
+        'kademe': "yerel",
+        'guven': confidence
+    }
@@ -0,0 +1,132 @@
+"""
+Vision Image Encoding
+Prepares page images for the vision model: trims blank margins, converts to
+grayscale and picks resolution / JPEG quality to fit a pixel and byte budget.
+"""
+
+import io
+import logging
+import math
+
+from PIL import Image
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def trim_margins(image: Image.Image, threshold: int = 240, padding: int = 24) -> Image.Image:
+    """
+    Crops the blank border around the page content.
+
+    Pixels darker than `threshold` count as content. The bounding box is
+    searched on a 1/4 scale thumbnail and mapped back, then padded so the
+    crop never cuts into handwriting.
+    """
+    gray = image if image.mode == "L" else image.convert("L")
+    scale = 4
+    small = gray.reduce(scale) if min(gray.size) > scale * 16 else gray
+    if small is gray:
+        scale = 1
+
+    mask = small.point(lambda p: 255 if p < threshold else 0)
+    bbox = mask.getbbox()
+    if bbox is None:
+        # Nothing but background; keep the page as-is
+        return image
+
+    width, height = image.size
+    left = max(0, bbox[0] * scale - padding)
+    top = max(0, bbox[1] * scale - padding)
+    right = min(width, bbox[2] * scale + padding)
+    bottom = min(height, bbox[3] * scale + padding)
+
+    if (left, top, right, bottom) == (0, 0, width, height):
+        return image
+    return image.crop((left, top, right, bottom))
+
+
+def fit_to_pixel_budget(image: Image.Image, max_pixels: int) -> Image.Image:
+    """Downscales the image (keeping aspect ratio) so width*height <= max_pixels."""
+    width, height = image.size
+    if not max_pixels or width * height <= max_pixels:
+        return image
+
+    ratio = math.sqrt(max_pixels / float(width * height))
+    new_size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+    return image.resize(new_size, Image.LANCZOS, reducing_gap=2.0)
+
+
+def encode_for_vision(
+    image: Image.Image,
+    max_pixels: int = None,
+    max_bytes: int = None,
+    grayscale: bool = None,
+    quality: int = None,
+    min_quality: int = None,
+    trim: bool = None
+) -> bytes:
+    """
+    Encodes a page as JPEG bytes for a vision request.
+
+    Steps: grayscale -> trim margins -> fit pixel budget -> lower the JPEG
+    quality in steps until the byte budget is met. If even `min_quality`
+    does not fit, the image is scaled down further. Unset arguments fall
+    back to the VISION_* settings.
+    """
+    max_pixels = settings.VISION_MAX_PIXELS if max_pixels is None else max_pixels
+    max_bytes = settings.VISION_MAX_BYTES if max_bytes is None else max_bytes
+    grayscale = settings.VISION_GRAYSCALE if grayscale is None else grayscale
+    quality = settings.VISION_JPEG_QUALITY if quality is None else quality
+    min_quality = settings.VISION_MIN_JPEG_QUALITY if min_quality is None else min_quality
+    trim = settings.VISION_TRIM_MARGINS if trim is None else trim
+
+    # Convert first so trimming and cropping work on the (smaller) grayscale
+    # page; an image already in the target mode is used as-is, not copied
+    mode = "L" if grayscale else "RGB"
+    if image.mode != mode:
+        image = image.convert(mode)
+    if trim:
+        image = trim_margins(image)
+    image = fit_to_pixel_budget(image, max_pixels)
+
+    while True:
+        q = quality
+        while True:
+            buffered = io.BytesIO()
+            image.save(buffered, format="JPEG", quality=q, optimize=True)
+            data = buffered.getvalue()
+            if not max_bytes or len(data) <= max_bytes or q <= min_quality:
+                break
+            q = max(min_quality, q - 10)
+
+        if not max_bytes or len(data) <= max_bytes or min(image.size) < 256:
+            logger.debug(f"Vision payload: {image.size[0]}x{image.size[1]}, q={q}, {len(data)} bytes")
+            return data
+
+        # Still over budget at the lowest quality: shrink and try again
+        width, height = image.size
+        image = image.resize((int(width * 0.85), int(height * 0.85)), Image.LANCZOS)
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """
+    Prompt tokens the vision model charges for an image at high detail:
+    fit into 2048x2048, shortest side down to 768, then 170 tokens per
+    512px tile plus 85 base tokens.
+    """
+    if max(width, height) > 2048:
+        ratio = 2048 / max(width, height)
+        width, height = width * ratio, height * ratio
+    if min(width, height) > 768:
+        ratio = 768 / min(width, height)
+        width, height = width * ratio, height * ratio
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def payload_image_tokens(base64_image: str) -> int:
+    """estimate_image_tokens for an encoded vision payload (only the JPEG header is read)."""
+    import base64
+
+    with Image.open(io.BytesIO(base64.b64decode(base64_image))) as image:
+        return estimate_image_tokens(*image.size)
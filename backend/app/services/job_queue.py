@@ -0,0 +1,224 @@
+"""
+Durable Upload Queue
+Persists upload jobs and per-page stage checkpoints (anonymize, OCR, grade)
+in the SQLite database, so work that already finished - and was already paid
+for - survives a crash or redeploy. Jobs left unfinished are resumed at
+startup; jobs that keep failing are moved to a dead-letter list.
+"""
+
+import json
+import logging
+import os
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.domain import YuklemeIsleri, SayfaKontrolNoktalari
+
+logger = logging.getLogger(__name__)
+
+STAGE_ANONYMIZE = "anonymize"
+STAGE_OCR = "ocr"
+STAGE_GRADE = "grade"
+
+
+def _queue_dir() -> str:
+    return os.path.join(settings.BASE_DIR, "upload_queue")
+
+
+def enqueue_job(job, contents: bytes):
+    """
+    Records a new upload job. Unless the job renders from a PDF that is
+    already on disk, the upload itself is written next to the queue so the
+    job can be restarted without the original request.
+    """
+    source_path = job.pdf_path
+    if source_path is None:
+        os.makedirs(_queue_dir(), exist_ok=True)
+        source_path = os.path.join(_queue_dir(), f"{job.id}{os.path.splitext(job.filename)[1].lower()}")
+        with open(source_path, "wb") as f:
+            f.write(contents)
+
+    db = SessionLocal()
+    try:
+        db.add(YuklemeIsleri(
+            id=job.id,
+            dosya_adi=job.filename,
+            kaynak_yolu=source_path,
+            sayfa_araligi=f"{job.page_range[0]}-{job.page_range[1]}" if job.page_range else None,
+            sayfa_sayisi=job.page_count,
+            batch_id=job.batch_id,
+            degerlendirme=json.dumps(job.grading.to_dict(), ensure_ascii=False) if job.grading else None,
+            durum="queued"
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def mark_started(job_id: str) -> int:
+    """Flags a job as running and returns the number of attempts so far."""
+    db = SessionLocal()
+    try:
+        row = db.get(YuklemeIsleri, job_id)
+        if row is None:
+            return 0
+        row.durum = "running"
+        row.deneme_sayisi += 1
+        db.commit()
+        return row.deneme_sayisi
+    finally:
+        db.close()
+
+
+def mark_finished(job_id: str, error: str = None) -> str:
+    """
+    Records the outcome of an attempt and returns the new queue status:
+    'completed', 'queued' (will be retried) or 'dead' (gave up).
+    """
+    db = SessionLocal()
+    try:
+        row = db.get(YuklemeIsleri, job_id)
+        if row is None:
+            return "completed" if error is None else "dead"
+
+        if error is None:
+            row.durum = "completed"
+            row.hata = None
+            # Checkpoints only serve retries and restarts of unfinished jobs
+            db.query(SayfaKontrolNoktalari).filter_by(is_id=job_id).delete()
+            # The final JSON is in results/; the queued copy is no longer needed
+            if row.kaynak_yolu and os.path.dirname(row.kaynak_yolu) == _queue_dir():
+                try:
+                    os.remove(row.kaynak_yolu)
+                except OSError:
+                    pass
+        else:
+            row.hata = error
+            row.durum = "dead" if row.deneme_sayisi >= settings.UPLOAD_MAX_ATTEMPTS else "queued"
+
+        db.commit()
+        return row.durum
+    finally:
+        db.close()
+
+
+def save_checkpoint(job_id: str, page_index: int, stage: str, result):
+    """Stores the result of one stage of one page (0-based page index)."""
+    db = SessionLocal()
+    try:
+        row = db.query(SayfaKontrolNoktalari).filter_by(
+            is_id=job_id, sayfa_no=page_index + 1, asama=stage
+        ).first()
+        payload = json.dumps(result, ensure_ascii=False)
+        if row is None:
+            db.add(SayfaKontrolNoktalari(is_id=job_id, sayfa_no=page_index + 1, asama=stage, sonuc=payload))
+        else:
+            row.sonuc = payload
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_checkpoints(job_id: str) -> dict:
+    """Returns {stage: {page_index: result}} for everything a job already finished."""
+    db = SessionLocal()
+    try:
+        checkpoints = {}
+        for row in db.query(SayfaKontrolNoktalari).filter_by(is_id=job_id).all():
+            checkpoints.setdefault(row.asama, {})[row.sayfa_no - 1] = json.loads(row.sonuc)
+        return checkpoints
+    finally:
+        db.close()
+
+
+def pending_jobs() -> list:
+    """
+    Jobs that were queued or running when the process stopped. Jobs whose
+    attempts are used up (e.g. they crashed the process every time) are
+    moved to the dead-letter list instead of being returned.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(YuklemeIsleri).filter(
+            YuklemeIsleri.durum.in_(["queued", "running"])
+        ).order_by(YuklemeIsleri.created_at).all()
+
+        pending = []
+        for row in rows:
+            if row.deneme_sayisi >= settings.UPLOAD_MAX_ATTEMPTS:
+                row.durum = "dead"
+                row.hata = row.hata or "İşlem tamamlanamadan sunucu durdu"
+            elif not row.kaynak_yolu or not os.path.exists(row.kaynak_yolu):
+                row.durum = "dead"
+                row.hata = "Yüklenen dosya bulunamadı"
+            else:
+                pending.append(row)
+        db.commit()
+
+        for row in pending:
+            db.refresh(row)
+            db.expunge(row)
+        return pending
+    finally:
+        db.close()
+
+
+def job_states(job_ids: list) -> dict:
+    """Durable status ('queued', 'running', 'completed', 'dead') of each known job."""
+    db = SessionLocal()
+    try:
+        rows = db.query(YuklemeIsleri.id, YuklemeIsleri.durum).filter(YuklemeIsleri.id.in_(list(job_ids))).all()
+        return {job_id: durum for job_id, durum in rows}
+    finally:
+        db.close()
+
+
+def unfinished_batches() -> set:
+    """Ids of the batches that still have queued or running jobs."""
+    db = SessionLocal()
+    try:
+        rows = db.query(YuklemeIsleri.batch_id).filter(
+            YuklemeIsleri.batch_id.isnot(None), YuklemeIsleri.durum.in_(["queued", "running"])
+        ).distinct().all()
+        return {batch_id for (batch_id,) in rows}
+    finally:
+        db.close()
+
+
+def batch_jobs(batch_id: str) -> list[dict]:
+    """The jobs of a batch, in the order they were queued."""
+    db = SessionLocal()
+    try:
+        rows = db.query(YuklemeIsleri).filter_by(batch_id=batch_id).order_by(YuklemeIsleri.created_at).all()
+        return [
+            {
+                "id": row.id,
+                "filename": row.dosya_adi,
+                "page_range": [int(p) for p in row.sayfa_araligi.split('-')] if row.sayfa_araligi else None
+            }
+            for row in rows
+        ]
+    finally:
+        db.close()
+
+
+def dead_letter_jobs() -> list[dict]:
+    db = SessionLocal()
+    try:
+        rows = db.query(YuklemeIsleri).filter_by(durum="dead").order_by(YuklemeIsleri.updated_at.desc()).all()
+        return [
+            {
+                "id": row.id,
+                "filename": row.dosya_adi,
+                "page_range": row.sayfa_araligi,
+                "batch_id": row.batch_id,
+                "attempts": row.deneme_sayisi,
+                "error": row.hata,
+                "checkpoints": db.query(SayfaKontrolNoktalari).filter_by(is_id=row.id).count(),
+                "created_at": row.created_at,
+                "updated_at": row.updated_at
+            }
+            for row in rows
+        ]
+    finally:
+        db.close()
@@ -0,0 +1,525 @@
+"""
+Upload Jobs
+Background execution of the student upload pipeline
+(rasterize -> anonymize -> OCR) with per-page progress reporting.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from PIL import Image
+
+from app.core.config import settings
+from app.services import job_queue
+from app.services.anonymizer_pool import anonymize_page
+from app.services.blank_pages import blank_page_reason
+from app.services.page_packing import PagePacker
+from app.services.live_grading import GradingContext, PageGrader, grading_summary
+from app.services.ocr import encode_image_to_base64, header_band_bounds, process_image_ocr_async, start_step, finish_step
+from app.services.pipeline import run_page_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class UploadJob:
+    """State of one uploaded paper while it moves through the pipeline."""
+
+    def __init__(self, job_id: str, filename: str, content_hash: str, page_range: tuple = None, pdf_path: str = None):
+        self.id = job_id
+        self.filename = filename
+        self.content_hash = content_hash
+        self.page_range = page_range  # (first, last) pages of a shared class PDF
+        self.pdf_path = pdf_path      # PDF already on disk (batch uploads)
+        self.batch_id = None
+        self.grading = None     # GradingContext: grade questions while transcribing
+        self.first_graded_at = None
+        self.status = 'queued'  # queued | running | retrying | completed | failed (dead-lettered)
+        self.page_count = None
+        self.pages = {}  # page index -> progress entry
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def page(self, index: int) -> dict:
+        """Returns (creating if needed) the progress entry of a page."""
+        if index not in self.pages:
+            self.pages[index] = {'page': index + 1, 'stage': 'queued', 'processing_steps': []}
+        return self.pages[index]
+
+    def to_status(self) -> dict:
+        pages = [self.pages[i] for i in sorted(self.pages)]
+        status = {
+            "id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "page_count": self.page_count,
+            "pages_done": sum(1 for p in pages if p['stage'] in ('done', 'failed', 'skipped')),
+            "progress": pages,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if self.status == 'completed':
+            # Same payload the synchronous /upload used to return
+            status.update(self.result)
+            status["status"] = self.status
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+class JobStore:
+    """In-process registry of upload jobs."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def create(self, filename: str, contents: bytes, page_range: tuple = None, pdf_path: str = None,
+               grading: GradingContext = None) -> tuple[UploadJob, bool]:
+        """
+        Registers a job for an upload and returns (job, created).
+
+        Re-uploading the same file with the same grading context while the
+        first upload is still running (or after it completed) returns the
+        existing job instead of starting the work again; failed jobs are
+        retried. A different sinav_id, answer key or rubric is a new job.
+        """
+        content_hash = self._content_hash(contents, page_range, grading)
+
+        with self._lock:
+            self._prune()
+            for job in self._jobs.values():
+                if job.content_hash == content_hash and job.filename == filename and job.status != 'failed':
+                    return job, False
+
+            job = UploadJob(str(uuid.uuid4()), filename, content_hash, page_range=page_range, pdf_path=pdf_path)
+            job.grading = grading
+            self._jobs[job.id] = job
+            return job, True
+
+    def restore(self, job_id: str, filename: str, contents: bytes, page_range: tuple = None, pdf_path: str = None,
+                grading: GradingContext = None) -> UploadJob:
+        """Re-registers a job from the durable queue under its original id."""
+        job = UploadJob(job_id, filename, self._content_hash(contents, page_range, grading), page_range=page_range, pdf_path=pdf_path)
+        job.grading = grading
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    @staticmethod
+    def _content_hash(contents: bytes, page_range: tuple = None, grading: GradingContext = None) -> str:
+        """Dedupe key: the upload, its page range and the grading context it is graded against."""
+        digest = hashlib.sha256(contents)
+        if page_range:
+            digest.update(f"{page_range[0]}-{page_range[1]}".encode())
+        if grading is not None:
+            digest.update(json.dumps(grading.to_dict(), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Runs a job coroutine in the background, keeping a reference to it."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _prune(self):
+        cutoff = time.time() - settings.UPLOAD_JOB_TTL_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+job_store = JobStore()
+
+# Seconds to wait before retrying a failed job (multiplied by the attempt number)
+JOB_RETRY_DELAY = 5
+
+# Process-wide cap on jobs running the pipeline at the same time, so a class
+# batch cannot hold more pages in memory than UPLOAD_MAX_ACTIVE_JOBS uploads
+_active_jobs = None
+
+
+def _get_active_jobs_semaphore() -> asyncio.Semaphore:
+    global _active_jobs
+    if _active_jobs is None:
+        _active_jobs = asyncio.Semaphore(settings.UPLOAD_MAX_ACTIVE_JOBS)
+    return _active_jobs
+
+
+async def ocr_student_page(i: int, base64_image: str, packer: PagePacker = None, on_item=None) -> dict:
+    """
+    Runs vision OCR for one already anonymized and encoded page, on its own
+    or packed together with other pages of the paper. on_item receives the
+    questions of a streamed transcription as they complete.
+    """
+    try:
+        # Perform OCR and normalization using our utility module
+        if packer is not None:
+            ocr_result = await packer.submit(i, base64_image)
+        else:
+            ocr_result = await process_image_ocr_async(base64_image, on_item=on_item)
+
+        page_result = {
+            "page": i + 1,
+            "text": ocr_result['normalized_text'],
+            "raw_text": ocr_result['raw_text'],
+            "normalized_text": ocr_result['normalized_text'],
+            "structured_data": ocr_result.get('structured_data', []),  # Pass structured questions
+            "processing_steps": ocr_result.get('processing_steps', [])
+        }
+        if 'continuation_of' in ocr_result:
+            page_result['continuation_of'] = ocr_result['continuation_of']
+        return page_result
+
+    except Exception as ocr_error:
+        return {
+            "page": i + 1,
+            "text": "",
+            "raw_text": "",
+            "normalized_text": "",
+            "error": str(ocr_error)
+        }
+
+
+def blank_page_result(i: int, blank: dict, processing_steps: list) -> dict:
+    """Page result for a page skipped as blank; same shape as an OCR'd page."""
+    return {
+        "page": i + 1,
+        "text": "",
+        "raw_text": "",
+        "normalized_text": "",
+        "structured_data": [],
+        "skipped": True,
+        "skip_reason": blank['reason'],
+        "skip_detail": blank['detail'],
+        "processing_steps": processing_steps
+    }
+
+
+async def submit_student_upload(job: UploadJob, contents: bytes):
+    """Records a new job in the durable queue and starts it in the background."""
+    await asyncio.to_thread(job_queue.enqueue_job, job, contents)
+    job_store.spawn(run_student_upload(job, contents))
+
+
+async def run_student_upload(job: UploadJob, contents: bytes):
+    """
+    Runs the full student upload pipeline for a job and stores the final
+    response payload (and the result/_student.json files) when done.
+
+    An attempt fails on an error of the whole job or of any page. Failed
+    attempts are retried (resuming from the page checkpoints, so only the
+    failed pages are redone) with the job in 'retrying' until
+    UPLOAD_MAX_ATTEMPTS is reached; the job is then dead-lettered and only
+    then reported as 'failed'.
+    """
+    while True:
+        async with _get_active_jobs_semaphore():
+            attempt = await asyncio.to_thread(job_queue.mark_started, job.id)
+            await _run_student_upload(job, contents)
+
+        queue_status = await asyncio.to_thread(job_queue.mark_finished, job.id, job.error)
+        if queue_status != 'queued':
+            job.status = 'completed' if queue_status == 'completed' else 'failed'
+            job.finished_at = time.time()
+            break
+
+        logger.warning(f"Upload job {job.id} failed (attempt {attempt}), retrying: {job.error}")
+        job.status = 'retrying'
+        await asyncio.sleep(JOB_RETRY_DELAY * attempt)
+
+
+def _load_and_encode(path: str) -> str:
+    with Image.open(path) as image:
+        return encode_image_to_base64(image)
+
+
+async def _run_student_upload(job: UploadJob, contents: bytes):
+    """
+    One attempt of the pipeline. Leaves job.result set and, if the attempt
+    failed, job.error; run_student_upload decides the job's status.
+    """
+    job.status = 'running'
+    job.error = None
+    job.result = None
+    job.pages = {}
+    job.started_at = time.time()
+    job.first_graded_at = None
+
+    request_id = job.id
+    all_student_data = {}
+    anon_dir = os.path.join(settings.BASE_DIR, "anonymized_uploads")
+
+    # Pages finished by an earlier attempt (or before a restart) are not redone
+    checkpoints = await asyncio.to_thread(job_queue.load_checkpoints, job.id)
+    ocr_done = checkpoints.get(job_queue.STAGE_OCR, {})
+    anonymized = {
+        i: cp for i, cp in checkpoints.get(job_queue.STAGE_ANONYMIZE, {}).items()
+        if os.path.exists(cp['path'])
+    }
+    for i in sorted(anonymized):
+        all_student_data.update(anonymized[i]['student_data'])
+
+    # Questions are graded while the rest of the page is still transcribed
+    grading = job.grading if job.grading is not None and job.grading.is_configured else None
+    graded = checkpoints.get(job_queue.STAGE_GRADE, {})
+    if grading is not None:
+        await asyncio.to_thread(grading.load_questions)
+
+    def on_graded(grade: dict):
+        if job.first_graded_at is None:
+            job.first_graded_at = time.time()
+
+    async def grade_page(i: int, page_result: dict, grader: PageGrader):
+        page = job.page(i)
+        page['stage'] = 'grade'
+        step = start_step(page['processing_steps'], 'Puanlama', 'Sorular okunurken puanlanıyor')
+        grades = await grader.finish(page_result.get('structured_data'))
+        finish_step(step, questions=len(grades))
+        page_result['grades'] = grades
+        if grader.usage:
+            page_result['grading_usage'] = grader.usage
+        page_result['processing_steps'] = page['processing_steps']
+        await asyncio.to_thread(job_queue.save_checkpoint, job.id, i, job_queue.STAGE_GRADE, grades)
+
+    # Several pages of the paper per vision request (VISION_PACK_PAGES)
+    packer = None
+    if settings.VISION_PACK_PAGES and job.page_count and job.page_count > 1:
+        packer = PagePacker(job.page_count)
+
+    async def resume_page(i: int):
+        page = job.page(i)
+        step = start_step(page['processing_steps'], 'Kontrol Noktası', 'Önceki çalışmanın sonucu kullanılıyor')
+        if i in ocr_done:
+            finish_step(step, stage=job_queue.STAGE_OCR)
+            return None
+
+        base64_image = await asyncio.to_thread(_load_and_encode, anonymized[i]['path'])
+        finish_step(step, stage=job_queue.STAGE_ANONYMIZE)
+        page['stage'] = 'ocr_queued'
+        return base64_image
+
+    def on_render(i: int, render_ms: float):
+        steps = job.page(i)['processing_steps']
+        step = start_step(steps, 'Sayfa Oluşturma', 'PDF sayfası görüntüye dönüştürülüyor')
+        step['started_at'] -= render_ms / 1000
+        finish_step(step)
+
+    def save_and_encode(i: int, image: Image.Image) -> tuple[str, str]:
+        # Additional save to explicit 'anonymized_uploads' folder as requested
+        anon_path = None
+        try:
+            os.makedirs(anon_dir, exist_ok=True)
+            anon_filename = f"anon_{request_id}_page_{i+1}.png"
+            image.save(os.path.join(anon_dir, anon_filename), "PNG")
+            anon_path = os.path.join(anon_dir, anon_filename)
+        except Exception as save_err:
+            logger.warning(f"Could not save backup anonymized image: {save_err}")
+
+        # Only the encoded payload is kept while the page waits for OCR
+        base64_image = encode_image_to_base64(image)
+        image.close()
+        return base64_image, anon_path
+
+    async def prepare_page(i: int, image: Image.Image):
+        page = job.page(i)
+
+        # Blank back sides / empty continuation pages skip anonymization and OCR
+        if settings.BLANK_PAGE_SKIP:
+            check = start_step(page['processing_steps'], 'Boş Sayfa Kontrolü', 'Sayfadaki mürekkep yoğunluğu ölçülüyor')
+            blank = await asyncio.to_thread(blank_page_reason, image)
+            if blank:
+                finish_step(check, status='skipped', **blank)
+                return {'blank': blank}
+            finish_step(check)
+
+        page['stage'] = 'anonymize'
+        step = start_step(page['processing_steps'], 'Anonimleştirme', 'Ad, soyad ve numara alanları yerelde karartılıyor')
+
+        # Apply local anonymization (Redact Name/Number)
+        # This happens BEFORE saving and BEFORE Gemini OCR, in the
+        # anonymizer worker pool so the event loop stays free
+        # Once the name and number are known, later pages that fit the layout
+        # template are redacted without running EasyOCR at all
+        need_values = not {'name', 'number'} <= all_student_data.keys()
+        try:
+            image, page_student_data = await anonymize_page(image, need_values=need_values)
+        except Exception as e:
+            # Never saved or sent unredacted; the job attempt fails and is retried
+            page['stage'] = 'failed'
+            finish_step(step, status='failed', error=str(e))
+            raise
+
+        # Merge found data
+        if page_student_data:
+            all_student_data.update(page_student_data)
+
+        base64_image, anon_path = await asyncio.to_thread(save_and_encode, i, image)
+        if anon_path:
+            # The saved PNG is the checkpoint; OCR can restart from it
+            await asyncio.to_thread(
+                job_queue.save_checkpoint, job.id, i, job_queue.STAGE_ANONYMIZE,
+                {'path': anon_path, 'student_data': page_student_data}
+            )
+        finish_step(step)
+        page['stage'] = 'ocr_queued'
+        return base64_image
+
+    async def finish_page(i: int, base64_image) -> dict:
+        page = job.page(i)
+        if packer is not None and (i in ocr_done or isinstance(base64_image, dict)):
+            packer.skip(i)
+        if i in ocr_done:
+            page_result = ocr_done[i]
+            steps = page_result.get('processing_steps', []) + page['processing_steps']
+            for n, step in enumerate(steps, start=1):
+                step['step'] = n
+            page_result['processing_steps'] = page['processing_steps'] = steps
+            if grading is not None and not page_result.get('skipped'):
+                if i in graded:
+                    page_result['grades'] = graded[i]
+                else:
+                    await grade_page(i, page_result, PageGrader(grading, on_graded))
+            page['stage'] = 'skipped' if page_result.get('skipped') else 'done'
+            return page_result
+
+        if isinstance(base64_image, dict):
+            page_result = blank_page_result(i, base64_image['blank'], page['processing_steps'])
+            await asyncio.to_thread(job_queue.save_checkpoint, job.id, i, job_queue.STAGE_OCR, page_result)
+            page['stage'] = 'skipped'
+            return page_result
+
+        page['stage'] = 'ocr'
+        steps = page['processing_steps']
+        placeholder = start_step(steps, 'Google Gemini API', 'Görsel işleniyor ve sorular ayrıştırılıyor')
+
+        grader = PageGrader(grading, on_graded) if grading is not None else None
+        try:
+            page_result = await ocr_student_page(i, base64_image, packer, on_item=grader.on_item if grader else None)
+        except BaseException:
+            if grader is not None:
+                grader.cancel()
+            raise
+
+        # Replace the placeholder with the OCR module's own step entries
+        steps.remove(placeholder)
+        for step in page_result.get('processing_steps', []):
+            step['step'] = len(steps) + 1
+            steps.append(step)
+        if 'error' in page_result:
+            finish_step(placeholder, status='failed', error=page_result['error'])
+            placeholder['step'] = len(steps) + 1
+            steps.append(placeholder)
+
+        page_result['processing_steps'] = steps
+        if 'error' not in page_result:
+            await asyncio.to_thread(job_queue.save_checkpoint, job.id, i, job_queue.STAGE_OCR, page_result)
+            if grader is not None:
+                await grade_page(i, page_result, grader)
+        elif grader is not None:
+            grader.cancel()
+        page['stage'] = 'failed' if 'error' in page_result else 'done'
+        return page_result
+
+    try:
+        # Pages are rendered, anonymized and OCR'd one at a time, with at most
+        # OCR_MAX_CONCURRENCY pages in flight; results keep page order
+        extracted_data = await run_page_pipeline(
+            contents, job.filename, prepare_page, finish_page, on_render=on_render,
+            page_range=job.page_range, pdf_path=job.pdf_path,
+            resume_page=resume_page, skip_pages=set(ocr_done) | set(anonymized),
+            # Only the header band is rendered at the anonymizer's DPI
+            header_dpi=settings.RENDER_HEADER_DPI, header_bottom=lambda height: header_band_bounds(height)[1]
+        )
+
+        if packer is not None and packer.requests:
+            stats = packer.stats()
+            logger.info(f"Upload job {job.id}: {stats['pages']} page(s) transcribed in {stats['requests']} vision request(s) (page packing).")
+
+        # Save extracted student data
+        if all_student_data:
+            try:
+                results_dir = os.path.join(settings.BASE_DIR, "results")
+                os.makedirs(results_dir, exist_ok=True)
+                student_data_path = os.path.join(results_dir, f"{request_id}_student.json")
+                with open(student_data_path, "w", encoding="utf-8") as f:
+                    json.dump(all_student_data, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                logger.warning(f"Could not save student data: {e}")
+
+        response_data = {
+            "id": request_id,
+            "filename": job.filename,
+            "page_count": len(extracted_data),
+            "pages": extracted_data,
+            "skipped_pages": [
+                {"page": p['page'], "reason": p['skip_reason'], "detail": p['skip_detail']}
+                for p in extracted_data if p.get('skipped')
+            ]
+        }
+        if grading is not None:
+            response_data["grading"] = grading_summary(extracted_data, job.started_at, job.first_graded_at)
+
+        # Save results to file
+        results_dir = os.path.join(settings.BASE_DIR, "results")
+        os.makedirs(results_dir, exist_ok=True)
+        with open(os.path.join(results_dir, f"{response_data['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(response_data, f, ensure_ascii=False, indent=2)
+
+        job.result = response_data
+
+        # Pages whose OCR failed fail the attempt, so they are retried
+        failed_pages = [p for p in extracted_data if 'error' in p]
+        if failed_pages:
+            details = "; ".join(f"Sayfa {p['page']}: {p['error']}" for p in failed_pages[:3])
+            job.error = f"{len(failed_pages)} sayfa işlenemedi ({details})"
+
+    except Exception as e:
+        logger.error(f"Upload job {job.id} failed: {e}")
+        job.error = f"Dosya işlenirken bir hata oluştu: {str(e)}"
+
+
+def resume_upload_jobs() -> int:
+    """
+    Restarts the jobs that were still queued or running when the process
+    stopped. Finished pages are picked up from their checkpoints.
+    Must be called from the running event loop (application startup).
+    """
+    resumed = 0
+    for row in job_queue.pending_jobs():
+        page_range = tuple(int(p) for p in row.sayfa_araligi.split('-')) if row.sayfa_araligi else None
+        with open(row.kaynak_yolu, "rb") as f:
+            contents = f.read()
+
+        is_pdf = row.dosya_adi.lower().endswith('.pdf')
+        job = job_store.restore(
+            row.id, row.dosya_adi, contents, page_range=page_range,
+            pdf_path=row.kaynak_yolu if is_pdf else None,
+            grading=GradingContext.from_dict(json.loads(row.degerlendirme)) if row.degerlendirme else None
+        )
+        job.batch_id = row.batch_id
+        job.page_count = row.sayfa_sayisi
+        job_store.spawn(run_student_upload(job, b"" if is_pdf else contents))
+        resumed += 1
+
+    if resumed:
+        logger.info(f"Resumed {resumed} unfinished upload job(s) from the durable queue.")
+    return resumed
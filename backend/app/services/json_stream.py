@@ -0,0 +1,84 @@
+"""
+Incremental JSON Array Parser
+Emits the objects of a JSON array while the array is still being streamed,
+e.g. the question list of a vision transcription: each
+{soru_no, soru_metni, ogrenci_cevabi} object is available as soon as its
+closing brace arrives, long before the whole response is complete.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JSONArrayStream:
+    """
+    Feed text chunks with feed(); each call returns the top-level objects
+    of the array completed by that chunk, in order.
+
+    Anything before the opening '[' (e.g. a ```json fence) is ignored.
+    Objects that are not valid JSON on their own are skipped here; the
+    caller still parses the full text at the end.
+    """
+
+    def __init__(self):
+        self.emitted = 0
+        self._buffer = []
+        self._started = False
+        self._done = False
+        self._depth = 0       # nesting depth inside the top-level array
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> list:
+        items = []
+        for char in chunk:
+            if self._done:
+                break
+            if not self._started:
+                if char == '[':
+                    self._started = True
+                continue
+
+            if self._depth > 0:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # Closing bracket of the top-level array
+                    self._done = True
+                    continue
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._complete("".join(self._buffer))
+                    self._buffer = []
+                    if item is not None:
+                        items.append(item)
+        return items
+
+    def _complete(self, text: str):
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            logger.debug(f"Streamed array element is not valid JSON: {text[:80]}")
+            return None
+        if not isinstance(item, dict):
+            return None
+        self.emitted += 1
+        return item
@@ -0,0 +1,233 @@
+"""
+Layout Templates
+Every paper of an exam carries the same printed header, so the positions of
+the 'Adı / Soyadı / Numara' labels only need to be discovered once. After
+full EasyOCR detection has found the same label layout on
+ANON_TEMPLATE_MIN_PAGES pages, later pages are aligned to that template with
+a cheap patch match and redacted directly. EasyOCR then only recognizes the
+value zones (no text detection), and only while the student's name/number
+is still unknown. A page only confirms a template when detection found the
+same labels in the same places, and only templates with both the name and
+the number label replace detection. Every other page, including one the
+template does not fit, goes through full detection.
+"""
+
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Extra pixels around a label kept in its match patch
+PATCH_MARGIN = 6
+# How far (px) a detected box may lie from the aligned template box
+BOX_TOLERANCE = PATCH_MARGIN * 4
+# Labels a template must redact before it may replace detection
+REQUIRED_FIELDS = {'name_label', 'num_label'}
+
+
+def _to_gray(band: np.ndarray) -> np.ndarray:
+    return band if band.ndim == 2 else cv2.cvtColor(band, cv2.COLOR_RGB2GRAY)
+
+
+def _clip(box: tuple, width: int, height: int) -> tuple:
+    x0, y0, x1, y1 = box
+    return (max(0, int(x0)), max(0, int(y0)), min(width - 1, int(x1)), min(height - 1, int(y1)))
+
+
+class LayoutTemplate:
+    """
+    Label layout learned from one page.
+
+    fields: [{'type': 'name_label' | 'num_label', 'label': box, 'value': box}]
+    with boxes as (x_min, y_min, x_max, y_max) in page coordinates.
+    """
+
+    def __init__(self, page_size: tuple, fields: list, band_gray: np.ndarray):
+        self.page_size = page_size
+        self.fields = fields
+        self.confirmations = 1
+        self.uses = 0
+
+        height, width = band_gray.shape
+        self.patches = []
+        for field in fields:
+            x0, y0, x1, y1 = _clip(field['label'], width, height)
+            self.patches.append(((x0, y0), band_gray[y0:y1 + 1, x0:x1 + 1].copy()))
+
+    def locate(self, band_gray: np.ndarray):
+        """
+        Aligns the template to a page.
+        Returns the (dx, dy) shift of the page, or None if any label is not
+        where the template expects it (within ANON_TEMPLATE_SEARCH_PX).
+        """
+        height, width = band_gray.shape
+        search = settings.ANON_TEMPLATE_SEARCH_PX
+        shifts = []
+
+        for (x0, y0), patch in self.patches:
+            ph, pw = patch.shape
+            wx0, wy0 = max(0, x0 - search), max(0, y0 - search)
+            wx1, wy1 = min(width, x0 + pw + search), min(height, y0 + ph + search)
+            window = band_gray[wy0:wy1, wx0:wx1]
+            if window.shape[0] < ph or window.shape[1] < pw:
+                return None
+
+            scores = cv2.matchTemplate(window, patch, cv2.TM_CCOEFF_NORMED)
+            _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+            if not np.isfinite(best) or best < settings.ANON_TEMPLATE_MATCH_THRESHOLD:
+                return None
+            shifts.append((wx0 + bx - x0, wy0 + by - y0))
+
+        # All labels have to move together; otherwise it is another layout
+        dxs = [s[0] for s in shifts]
+        dys = [s[1] for s in shifts]
+        if max(dxs) - min(dxs) > PATCH_MARGIN * 2 or max(dys) - min(dys) > PATCH_MARGIN * 2:
+            return None
+        return int(np.median(dxs)), int(np.median(dys))
+
+    @property
+    def complete(self) -> bool:
+        """True if the template redacts every expected label (name and number)."""
+        return REQUIRED_FIELDS <= {field['type'] for field in self.fields}
+
+    def _fits(self, template_field: dict, field: dict, shift: tuple) -> bool:
+        """
+        Label boxes within BOX_TOLERANCE on every side; value zones only
+        horizontally, their height follows the handwriting.
+        """
+        width, height = self.page_size
+        label = zip(self._shifted(template_field['label'], shift), _clip(field['label'], width, height))
+        value = zip(self._shifted(template_field['value'], shift), _clip(field['value'], width, height))
+        value_x = [pair for i, pair in enumerate(value) if i in (0, 2)]
+        return all(abs(a - b) <= BOX_TOLERANCE for a, b in [*label, *value_x])
+
+    def same_layout(self, layout: list, shift: tuple) -> bool:
+        """True if a detected layout has the template's field types in the template's places."""
+        if sorted(field['type'] for field in layout) != sorted(field['type'] for field in self.fields):
+            return False
+
+        unused = list(self.fields)
+        for field in layout:
+            match = next((t for t in unused if t['type'] == field['type'] and self._fits(t, field, shift)), None)
+            if match is None:
+                return False
+            unused.remove(match)
+        return True
+
+    def _shifted(self, box: tuple, shift: tuple) -> tuple:
+        width, height = self.page_size
+        dx, dy = shift
+        return _clip((box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy), width, height)
+
+    def redaction_boxes(self, shift: tuple) -> list:
+        boxes = []
+        for field in self.fields:
+            boxes.append(self._shifted(field['label'], shift))
+            boxes.append(self._shifted(field['value'], shift))
+        return boxes
+
+    def value_boxes(self, shift: tuple) -> list:
+        return [self._shifted(field['value'], shift) for field in self.fields]
+
+    def extract_values(self, texts: list) -> dict:
+        """Maps the recognized value texts back to name/number, first non-empty wins."""
+        extracted_data = {}
+        for field, text in zip(self.fields, texts):
+            key = 'number' if field['type'] == 'num_label' else 'name'
+            value = (text or '').replace(':', '').strip()
+            if value and key not in extracted_data:
+                extracted_data[key] = value
+        return extracted_data
+
+
+class LayoutTemplateStore:
+    """Learned templates of the current process, most recently used first."""
+
+    def __init__(self, max_templates: int = 8):
+        self.max_templates = max_templates
+        self._templates = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, band: np.ndarray, page_size: tuple):
+        """Returns (template, shift) for the first confirmed template that fits the page, or None."""
+        band_gray = _to_gray(band)
+        with self._lock:
+            candidates = [
+                t for t in self._templates
+                if t.page_size == page_size and t.complete and t.confirmations >= settings.ANON_TEMPLATE_MIN_PAGES
+            ]
+
+        for template in candidates:
+            shift = template.locate(band_gray)
+            if shift is not None:
+                with self._lock:
+                    template.uses += 1
+                    self.hits += 1
+                    self._templates.remove(template)
+                    self._templates.insert(0, template)
+                return template, shift
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def learn(self, band: np.ndarray, page_size: tuple, layout: list):
+        """
+        Feeds the label layout found by full detection on a page. A layout
+        that aligns with an existing template and has the same fields in the
+        same places confirms it; otherwise it becomes a new candidate
+        template. Layouts missing the name or the number label are not
+        learned: a template built from them would leave that label unredacted.
+        """
+        if not layout or not REQUIRED_FIELDS <= {field['type'] for field in layout}:
+            return
+        band_gray = _to_gray(band)
+
+        with self._lock:
+            candidates = [t for t in self._templates if t.page_size == page_size]
+        for template in candidates:
+            shift = template.locate(band_gray)
+            if shift is not None and template.same_layout(layout, shift):
+                with self._lock:
+                    template.confirmations += 1
+                    if template.confirmations == settings.ANON_TEMPLATE_MIN_PAGES:
+                        logger.info(f"Layout template confirmed ({len(template.fields)} label(s), {page_size[0]}x{page_size[1]}).")
+                return
+
+        template = LayoutTemplate(page_size, layout, band_gray)
+        with self._lock:
+            self._templates.insert(0, template)
+            del self._templates[self.max_templates:]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "templates": len(self._templates),
+                "confirmed": sum(1 for t in self._templates if t.confirmations >= settings.ANON_TEMPLATE_MIN_PAGES),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_layout_templates():
+    """Returns the process-wide template store, or None if templates are disabled."""
+    global _store
+    if not settings.ANON_LAYOUT_TEMPLATES:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = LayoutTemplateStore()
+    return _store
@@ -0,0 +1,219 @@
+"""
+Live Grading
+Grades the questions of a student upload while the paper is still being
+transcribed. The vision transcription is streamed (see json_stream), and
+every question goes to scoring.evaluate_answer as soon as its JSON object is
+complete, so grading overlaps OCR instead of waiting for the whole page.
+"""
+
+import asyncio
+import logging
+
+from sqlalchemy import func
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.domain import SinavSorulari
+from app.services.scoring import evaluate_answer, evaluate_paper
+
+logger = logging.getLogger(__name__)
+
+
+class GradingContext:
+    """
+    What a paper is graded against: the exam's questions in the database
+    (sinav_id) and/or an answer key and rubric text.
+    """
+
+    def __init__(self, sinav_id: str = None, answer_key_text: str = None, rubric_text: str = None):
+        self.sinav_id = sinav_id or None
+        self.answer_key_text = answer_key_text or None
+        self.rubric_text = rubric_text or None
+        self.questions = {}  # soru_no -> SinavSorulari fields
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.sinav_id or self.answer_key_text)
+
+    def to_dict(self) -> dict:
+        return {"sinav_id": self.sinav_id, "answer_key_text": self.answer_key_text, "rubric_text": self.rubric_text}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data) if data else None
+
+    def load_questions(self):
+        """Loads the exam's questions (ideal answers, keywords) once per job."""
+        if not self.sinav_id:
+            return
+        db = SessionLocal()
+        try:
+            rows = db.query(SinavSorulari).filter(func.lower(SinavSorulari.sinav_id) == self.sinav_id.lower()).all()
+            self.questions = {
+                row.soru_no: {
+                    "soru_metni": row.soru_metni,
+                    "ideal_cevap": row.ideal_cevap,
+                    "anahtar_kelimeler": row.anahtar_kelimeler or ""
+                }
+                for row in rows
+            }
+        finally:
+            db.close()
+
+
+_grading_semaphore = None
+
+
+def _get_grading_semaphore() -> asyncio.Semaphore:
+    """Process-wide cap on grading calls in flight across all uploads."""
+    global _grading_semaphore
+    if _grading_semaphore is None:
+        _grading_semaphore = asyncio.Semaphore(settings.GRADING_MAX_CONCURRENCY)
+    return _grading_semaphore
+
+
+def question_number(item: dict, index: int) -> int:
+    try:
+        return int(item.get('soru_no', index + 1))
+    except (TypeError, ValueError):
+        return index + 1
+
+
+def question_input(context: GradingContext, item: dict, index: int) -> dict:
+    """What scoring needs for one transcribed question, or an error entry."""
+    soru_no = question_number(item, index)
+    question = context.questions.get(soru_no, {})
+    ideal_cevap = question.get("ideal_cevap", "")
+    if not ideal_cevap and not context.answer_key_text:
+        return {"soru_no": soru_no, "error": f"Soru {soru_no} için ideal cevap veya cevap anahtarı yok"}
+    return {
+        "soru_no": soru_no,
+        "ideal_cevap": ideal_cevap,
+        "ogrenci_cevabi": item.get('ogrenci_cevabi') or "",
+        "soru_metni": item.get('soru_metni') or question.get("soru_metni", ""),
+        "anahtar_kelimeler": question.get("anahtar_kelimeler", "")
+    }
+
+
+async def grade_question(context: GradingContext, item: dict, index: int) -> dict:
+    """Grades one transcribed question; errors are reported in the entry, not raised."""
+    question = question_input(context, item, index)
+    if 'error' in question:
+        return question
+    soru_no = question['soru_no']
+
+    try:
+        async with _get_grading_semaphore():
+            result = await asyncio.to_thread(
+                evaluate_answer,
+                answer_key_text=context.answer_key_text,
+                rubric_text=context.rubric_text,
+                **question
+            )
+        return {"soru_no": soru_no, **result}
+    except Exception as e:
+        logger.error(f"Grading question {soru_no} failed: {e}")
+        return {"soru_no": soru_no, "error": str(e)}
+
+
+async def grade_paper(context: GradingContext, items: list) -> tuple[list, dict]:
+    """
+    Grades all questions of a page with one scoring call (GRADING_MODE=paper).
+    Returns (grades, usage): evaluate_paper reports the token usage of the
+    paper call and its per-question fallbacks once for the whole page, not
+    per grade; usage is None when nothing was sent.
+    """
+    questions, grades = [], {}
+    usage = None
+    for index, item in enumerate(items):
+        question = question_input(context, item, index)
+        if 'error' in question:
+            grades[index] = question
+        else:
+            questions.append((index, question))
+    if questions:
+        try:
+            async with _get_grading_semaphore():
+                paper = await asyncio.to_thread(
+                    evaluate_paper,
+                    [question for _, question in questions],
+                    answer_key_text=context.answer_key_text,
+                    rubric_text=context.rubric_text
+                )
+            for (index, _), result in zip(questions, paper['results']):
+                grades[index] = result
+            stats = paper['stats']
+            usage = {key: stats[key] for key in ('prompt_tokens', 'cached_tokens', 'completion_tokens')}
+        except Exception as e:
+            logger.error(f"Grading paper failed: {e}")
+            for index, question in questions:
+                grades[index] = {"soru_no": question['soru_no'], "error": str(e)}
+    return [grades[index] for index in sorted(grades)], usage
+
+
+class PageGrader:
+    """
+    Grades the questions of one page. on_item() is the streaming callback of
+    the OCR call; finish() grades whatever did not arrive through it (cache
+    hits, packed pages) and returns the grades in question order.
+
+    With GRADING_MODE=paper nothing is graded while streaming: finish()
+    grades the whole page in a single call instead and keeps that call's
+    token usage in self.usage. Uploads are transcribed page by page, so
+    "paper" means one call per page here, not one per student paper as in
+    batch_grading.
+    """
+
+    def __init__(self, context: GradingContext, on_graded=None):
+        self.context = context
+        self.on_graded = on_graded
+        self.paper_mode = settings.GRADING_MODE == "paper"
+        self.usage = None
+        self._tasks = {}
+
+    def on_item(self, index: int, item: dict):
+        if self.paper_mode:
+            return
+        if index not in self._tasks:
+            self._tasks[index] = asyncio.create_task(self._grade(index, item))
+
+    async def _grade(self, index: int, item: dict) -> dict:
+        grade = await grade_question(self.context, item, index)
+        if self.on_graded is not None:
+            self.on_graded(grade)
+        return grade
+
+    async def finish(self, items: list) -> list:
+        if self.paper_mode:
+            grades, self.usage = await grade_paper(self.context, [item for item in items or [] if isinstance(item, dict)])
+            if self.on_graded is not None:
+                for grade in grades:
+                    self.on_graded(grade)
+            return grades
+
+        for index, item in enumerate(items or []):
+            if isinstance(item, dict):
+                self.on_item(index, item)
+        return [await self._tasks[index] for index in sorted(self._tasks)]
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+
+def grading_summary(pages: list, started_at: float, first_graded_at: float) -> dict:
+    """Totals reported with the upload result."""
+    grades = [g for page in pages for g in page.get('grades', [])]
+    # Per-question calls carry their usage; paper calls report it per page
+    usages = [g['usage'] for g in grades if g.get('usage')]
+    usages += [page['grading_usage'] for page in pages if page.get('grading_usage')]
+    return {
+        "questions": len(grades),
+        "cache_hits": sum(1 for g in grades if g.get('cached')),
+        "local_graded": sum(1 for g in grades if g.get('kademe') == "yerel"),
+        "prompt_tokens": sum(u.get('prompt_tokens', 0) for u in usages),
+        "cached_prompt_tokens": sum(u.get('cached_tokens', 0) for u in usages),
+        "graded": sum(1 for g in grades if 'error' not in g),
+        "total": round(sum(g.get('final_puan', 0.0) for g in grades if 'error' not in g), 2),
+        "time_to_first_grade_ms": round((first_graded_at - started_at) * 1000, 1) if first_graded_at else None
+    }
@@ -1,15 +1,23 @@
-from PIL import Image
+from PIL import Image, ImageDraw
 import os
 import logging
 import base64
 import io
 import json
+import math
+import time
 import cv2
 import easyocr
 import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from app.core.config import settings
+from app.services.image_encoding import encode_for_vision
+from app.services.ocr_cache import get_ocr_cache, make_cache_key
+from app.services.ocr_engines import EngineResult, get_local_engine
+from app.services.json_stream import JSONArrayStream
+from app.services.openai_client import create_chat_completion, create_chat_completion_async, retry_delay
+
 # Determine current directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -20,107 +28,234 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv(os.path.join(current_dir, '..', '..', '.env'))
 
-# Configure OpenAI client
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    logger.error("OPENAI_API_KEY not found in environment variables!")
+def encode_image_to_base64(image: Image.Image) -> str:
+    """
+    Converts a PIL Image to a base64 JPEG string sized for the vision model
+    (see image_encoding.encode_for_vision for the budget rules).
+    """
+    return base64.b64encode(encode_for_vision(image)).decode('utf-8')
+
+DEFAULT_OCR_PROMPT = (
+    "Bu görseldeki sınav kağıdını incele ve tüm soruları ayrı ayrı tespit et. "
+    "Her bir soru için şu bilgileri JSON formatında çıkar:\n"
+    "1. 'soru_no': Soru numarası (yoksa 1'den başlayarak ver)\n"
+    "2. 'soru_metni': Sorunun metni (sadece soru kısmı, cevap değil)\n"
+    "3. 'ogrenci_cevabi': Öğrencinin el yazısıyla verdiği cevap metni\n\n"
+    "Kurallar:\n"
+    "- Sadece JSON listesi döndür: [{'soru_no': 1, 'soru_metni': '...', 'ogrenci_cevabi': '...'}, ...]\n"
+    "- Markdown (```json ... ```) kullanma, sadece saf JSON ver.\n"
+    "- Türkçe karakterlere dikkat et.\n"
+    "- Cevap yoksa boş string ver."
+)
 
-def get_openai_client():
-    """Returns the configured OpenAI client."""
-    return OpenAI(api_key=api_key)
+OCR_MODEL = "gpt-4o"
+OCR_MAX_RETRIES = 3
+OCR_BASE_DELAY = 5
+
+
+def build_packed_ocr_prompt(page_count: int) -> str:
+    """Prompt for several pages of one paper sent in a single vision request."""
+    return (
+        f"Bu istekte aynı öğrenciye ait sınav kağıdının {page_count} sayfası sırayla verildi "
+        f"(1. görsel = 1. sayfa). Tüm soruları ayrı ayrı tespit et. "
+        "Her bir soru için şu bilgileri JSON formatında çıkar:\n"
+        "1. 'soru_no': Soru numarası (yoksa 1'den başlayarak ver)\n"
+        "2. 'soru_metni': Sorunun metni (sadece soru kısmı, cevap değil)\n"
+        "3. 'ogrenci_cevabi': Öğrencinin el yazısıyla verdiği cevap metni\n"
+        "4. 'sayfa': Sorunun başladığı sayfa (1'den başlayarak görsel sırası)\n"
+        "5. 'devam_sayfalari': Cevap sonraki sayfalarda devam ediyorsa o sayfaların numaraları, yoksa []\n\n"
+        "Kurallar:\n"
+        "- Sonraki sayfada devam eden bir cevabı tek bir kayıtta birleştir; devam kısmı için ayrı kayıt açma.\n"
+        "- Sadece JSON listesi döndür: [{'soru_no': 1, 'soru_metni': '...', 'ogrenci_cevabi': '...', 'sayfa': 1, 'devam_sayfalari': []}, ...]\n"
+        "- Markdown (```json ... ```) kullanma, sadece saf JSON ver.\n"
+        "- Türkçe karakterlere dikkat et.\n"
+        "- Cevap yoksa boş string ver."
+    )
 
-def encode_image_to_base64(image: Image.Image) -> str:
-    """Converts a PIL Image to a base64 string."""
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
-def extract_text_from_image(image: Image.Image, prompt: str = None) -> str:
+def _build_vision_messages(base64_image, prompt_text: str) -> list:
     """
-    Extract text from a PIL Image using OpenAI GPT-4o (Vision).
+    Builds the chat messages for a vision request. base64_image may also be
+    a list of payloads (several pages in one request, in order).
+    """
+    images = base64_image if isinstance(base64_image, list) else [base64_image]
+    return [
+        {
+            "role": "user",
+            "content": [{"type": "text", "text": prompt_text}] + [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{payload}"
+                    }
+                }
+                for payload in images
+            ]
+        }
+    ]
+
+
+def _parse_ocr_output(text: str):
+    """Parses the model output as a JSON list, falling back to raw text."""
+    cleaned_text = text.strip()
+    if cleaned_text.startswith('```json'):
+        cleaned_text = cleaned_text[7:-3].strip()
+    elif cleaned_text.startswith('```'):
+        cleaned_text = cleaned_text[3:-3].strip()
+
+    try:
+        structured_data = json.loads(cleaned_text)
+        logger.info("OpenAI GPT-4o returned valid structured JSON")
+        return structured_data
+    except json.JSONDecodeError:
+        logger.warning("OpenAI GPT-4o did not return valid JSON, falling back to raw text")
+        return text.strip()
+
+
+def _get_retry_delay(error: Exception, attempt: int):
+    """
+    Returns the number of seconds to wait before retrying an OCR request,
+    or None if the error is not retryable or the retry budget is spent.
+    Rate limits pause the shared OCR_MODEL limiter instead (see openai_client).
+    """
+    return retry_delay(error, attempt, OCR_MAX_RETRIES, OCR_BASE_DELAY, model=OCR_MODEL)
+
+
+class _StreamedItems:
+    """
+    Forwards the questions of a streamed transcription to on_item(index,
+    question) as they complete. Questions already forwarded by an earlier,
+    failed attempt are not forwarded again.
+    """
+
+    def __init__(self, on_item):
+        self.on_item = on_item
+        self.forwarded = 0
+
+    def feed(self, parser: JSONArrayStream, delta: str):
+        if not delta:
+            return
+        items = parser.feed(delta)
+        # One chunk can close several objects: number them from the first
+        base = parser.emitted - len(items)
+        for offset, item in enumerate(items):
+            index = base + offset
+            if index >= self.forwarded:
+                self.forwarded = index + 1
+                self.on_item(index, item)
+
+
+def _delta_text(chunk) -> str:
+    return chunk.choices[0].delta.content if chunk.choices else None
+
+
+def extract_text_from_image(image, prompt: str = None, on_item=None) -> str:
     """
-    import time
-    import random
+    Extract text from a PIL Image using OpenAI GPT-4o (Vision).
+    `image` may also be an already base64-encoded JPEG payload.
 
-    max_retries = 3
-    base_delay = 5
+    With on_item, the completion is streamed and on_item(index, question)
+    is called for every question of the JSON list as soon as it is complete.
+    """
+    prompt_text = prompt if prompt is not None else DEFAULT_OCR_PROMPT
+    base64_image = encode_image_to_base64(image) if isinstance(image, Image.Image) else image
+    streamed = _StreamedItems(on_item) if on_item is not None else None
 
-    for attempt in range(max_retries + 1):
+    for attempt in range(OCR_MAX_RETRIES + 1):
         try:
-            client = get_openai_client()
-            base64_image = encode_image_to_base64(image)
-            
-            if prompt is None:
-                prompt_text = (
-                    "Bu görseldeki sınav kağıdını incele ve tüm soruları ayrı ayrı tespit et. "
-                    "Her bir soru için şu bilgileri JSON formatında çıkar:\n"
-                    "1. 'soru_no': Soru numarası (yoksa 1'den başlayarak ver)\n"
-                    "2. 'soru_metni': Sorunun metni (sadece soru kısmı, cevap değil)\n"
-                    "3. 'ogrenci_cevabi': Öğrencinin el yazısıyla verdiği cevap metni\n\n"
-                    "Kurallar:\n"
-                    "- Sadece JSON listesi döndür: [{'soru_no': 1, 'soru_metni': '...', 'ogrenci_cevabi': '...'}, ...]\n"
-                    "- Markdown (```json ... ```) kullanma, sadece saf JSON ver.\n"
-                    "- Türkçe karakterlere dikkat et.\n"
-                    "- Cevap yoksa boş string ver."
+            if streamed is not None:
+                stream = create_chat_completion(
+                    model=OCR_MODEL,
+                    messages=_build_vision_messages(base64_image, prompt_text),
+                    max_tokens=4000,
+                    stream=True
                 )
-            else:
-                prompt_text = prompt
-
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt_text},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
+                parser = JSONArrayStream()
+                parts = []
+                for chunk in stream:
+                    delta = _delta_text(chunk)
+                    if delta:
+                        parts.append(delta)
+                        streamed.feed(parser, delta)
+                return _parse_ocr_output("".join(parts))
+
+            response = create_chat_completion(
+                model=OCR_MODEL,
+                messages=_build_vision_messages(base64_image, prompt_text),
                 max_tokens=4000
             )
-            
-            text = response.choices[0].message.content
-            
-            # Try to parse JSON output
-            cleaned_text = text.strip()
-            if cleaned_text.startswith('```json'):
-                cleaned_text = cleaned_text[7:-3].strip()
-            elif cleaned_text.startswith('```'):
-                cleaned_text = cleaned_text[3:-3].strip()
-                
-            try:
-                structured_data = json.loads(cleaned_text)
-                logger.info("OpenAI GPT-4o returned valid structured JSON")
-                return structured_data
-            except json.JSONDecodeError:
-                logger.warning("OpenAI GPT-4o did not return valid JSON, falling back to raw text")
-                return text.strip()
-            
+
+            return _parse_ocr_output(response.choices[0].message.content)
+
         except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "rate limit" in error_msg.lower():
-                if attempt < max_retries:
-                    wait_time = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                    logger.warning(f"Rate limit hit during OCR. Retrying in {wait_time:.2f}s... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-            elif "500" in error_msg or "internal" in error_msg.lower():
-                if attempt < max_retries:
-                    wait_time = 20
-                    logger.warning(f"Internal Server Error (500) during OCR. Retrying in {wait_time}s... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-            
+            wait_time = _get_retry_delay(e, attempt)
+            if wait_time is not None:
+                time.sleep(wait_time)
+                continue
+
             # If it's not a retryable error or max retries reached
             logger.error(f"OpenAI OCR failed: {e}")
             raise Exception(f"OpenAI GPT-4o ile metin okunamadı (Hata: {str(e)})")
 
+
+async def extract_text_from_image_async(image, prompt: str = None, on_item=None):
+    """
+    Async variant of extract_text_from_image.
+    Same prompt, parsing and 500/429 retry behaviour, but waits without
+    blocking the event loop so several pages can be transcribed at once.
+
+    `image` may be a PIL Image or an already base64-encoded JPEG payload,
+    which lets the upload pipeline release the full page before OCR starts.
+    A list of payloads sends several pages in one request.
+    on_item streams the completion, as in extract_text_from_image.
+    """
+    import asyncio
+
+    prompt_text = prompt if prompt is not None else DEFAULT_OCR_PROMPT
+    if isinstance(image, Image.Image):
+        # Encode off the event loop; a 300 DPI page takes a noticeable moment
+        base64_image = await asyncio.to_thread(encode_image_to_base64, image)
+    else:
+        base64_image = image
+    # Room for the transcription of every page (model output limit 16k)
+    max_tokens = min(16000, 4000 * len(base64_image)) if isinstance(base64_image, list) else 4000
+    streamed = _StreamedItems(on_item) if on_item is not None else None
+
+    for attempt in range(OCR_MAX_RETRIES + 1):
+        try:
+            if streamed is not None:
+                stream = await create_chat_completion_async(
+                    model=OCR_MODEL,
+                    messages=_build_vision_messages(base64_image, prompt_text),
+                    max_tokens=max_tokens,
+                    stream=True
+                )
+                parser = JSONArrayStream()
+                parts = []
+                async for chunk in stream:
+                    delta = _delta_text(chunk)
+                    if delta:
+                        parts.append(delta)
+                        streamed.feed(parser, delta)
+                return _parse_ocr_output("".join(parts))
+
+            response = await create_chat_completion_async(
+                model=OCR_MODEL,
+                messages=_build_vision_messages(base64_image, prompt_text),
+                max_tokens=max_tokens
+            )
+
+            return _parse_ocr_output(response.choices[0].message.content)
+
+        except Exception as e:
+            wait_time = _get_retry_delay(e, attempt)
+            if wait_time is not None:
+                await asyncio.sleep(wait_time)
+                continue
+
+            logger.error(f"OpenAI OCR failed: {e}")
+            raise Exception(f"OpenAI GPT-4o ile metin okunamadı (Hata: {str(e)})")
+
 def normalize_text(text: str) -> str:
     """
     Normalize text - kept for backward compatibility if raw text is returned.
@@ -137,228 +272,709 @@ def normalize_text(text: str) -> str:
     
     return text
 
-def process_image_ocr(image: Image.Image, debug_dir: str = None, prompt: str = None) -> dict:
+def start_step(processing_steps: list, name: str, description: str) -> dict:
+    """Appends a new in-progress entry to processing_steps and returns it."""
+    step = {
+        'step': len(processing_steps) + 1,
+        'name': name,
+        'description': description,
+        'status': 'in_progress',
+        'started_at': time.time()
+    }
+    processing_steps.append(step)
+    return step
+
+
+def finish_step(step: dict, status: str = 'completed', **extra) -> dict:
+    """Marks a processing step as finished and records how long it took."""
+    step['status'] = status
+    step['duration_ms'] = round((time.time() - step['started_at']) * 1000, 1)
+    step.update(extra)
+    return step
+
+
+def _start_ocr_steps(processing_steps: list = None) -> list:
+    """Initial processing_steps structure reported for a page."""
+    processing_steps = processing_steps if processing_steps is not None else []
+    start_step(processing_steps, 'Google Gemini API', 'Görsel işleniyor ve sorular ayrıştırılıyor')
+    return processing_steps
+
+
+def _build_ocr_result(result, processing_steps: list) -> dict:
+    """Wraps the raw OCR output into the response dict used by the routers."""
+    finish_step(processing_steps[-1], result='Veri başarıyla alındı')
+
+    # Check if result is structured list
+    if isinstance(result, list):
+        return {
+            'structured_data': result,  # New field for structured questions
+            'raw_text': str(result),    # Kept for compatibility
+            'normalized_text': str(result),
+            'processing_steps': processing_steps
+        }
+    else:
+        # Fallback for plain text
+        normalized_text = normalize_text(result)
+        return {
+            'raw_text': result,
+            'normalized_text': normalized_text,
+            'processing_steps': processing_steps
+        }
+
+
+def _fail_ocr_steps(processing_steps: list, error: Exception):
+    if processing_steps:
+        finish_step(processing_steps[-1], status='failed', error=str(error))
+
+
+def _ocr_cache_lookup(base64_image: str, prompt: str):
+    """Returns (cache, key, cached_result) for a page payload and prompt."""
+    cache = get_ocr_cache()
+    if cache is None:
+        return None, None, None
+
+    prompt_text = prompt if prompt is not None else DEFAULT_OCR_PROMPT
+    key = make_cache_key(base64_image.encode('ascii'), prompt_text, OCR_MODEL)
+    return cache, key, cache.get(key)
+
+
+def _ocr_cache_store(cache, key, result, prompt: str):
+    if cache is None:
+        return
+    # With the default prompt only a parsed question list is a usable result;
+    # raw-text fallbacks are retried on the next upload instead of cached
+    if prompt is None and not isinstance(result, list):
+        return
+    try:
+        cache.put(key, result)
+    except Exception as e:
+        logger.warning(f"Could not store OCR result in cache: {e}")
+
+
+def _mark_cached(processing_steps: list) -> list:
+    processing_steps[-1]['cached'] = True
+    return processing_steps
+
+
+# OCR engine routing:
+#   "vision" - GPT-4o only (handwritten papers, structured JSON output)
+#   "local"  - local engine only (offline; plain text)
+#   "auto"   - local engine, GPT-4o when its confidence is below
+#              OCR_LOCAL_MIN_CONFIDENCE or no local engine is available
+OCR_ENGINES = ("vision", "local", "auto")
+
+
+def local_ocr(image):
+    """
+    Runs the configured local OCR engine on a page, given as a PIL Image or
+    a base64-encoded JPEG. Returns an EngineResult, or None if no local
+    engine is available.
+    """
+    engine = get_local_engine()
+    if engine is None:
+        return None
+    if not isinstance(image, Image.Image):
+        image = Image.open(io.BytesIO(base64.b64decode(image)))
+    return engine.transcribe(image)
+
+
+def accept_local_result(local: EngineResult, engine: str = "auto") -> bool:
+    """True if the router keeps a local result instead of calling the vision model."""
+    if local is None:
+        return False
+    return engine == "local" or local.confidence >= settings.OCR_LOCAL_MIN_CONFIDENCE
+
+
+def _safe_local_ocr(image, engine: str):
+    # In "auto" mode a failing local engine only means the vision model is used
+    try:
+        return local_ocr(image)
+    except Exception as e:
+        if engine == "local":
+            raise
+        logger.warning(f"Local OCR failed, falling back to vision OCR: {e}")
+        return None
+
+
+def _finish_local_step(processing_steps: list, local: EngineResult, engine: str):
+    """
+    Records the local OCR stage. Returns the OCR result if the local text
+    is kept, or None if the page goes on to the vision model.
+    """
+    step = start_step(processing_steps, 'Yerel OCR', 'Basılı metin yerel olarak okunuyor')
+    if local is None:
+        if engine == "local":
+            raise Exception("Yerel OCR motoru kullanılamıyor")
+        finish_step(step, status='skipped', result='Yerel OCR motoru yok')
+        return None
+
+    if not accept_local_result(local, engine):
+        finish_step(step, status='skipped', engine=local.engine, confidence=local.confidence,
+                    result='Güven düşük, görsel OCR kullanılıyor')
+        return None
+
+    finish_step(step, engine=local.engine, confidence=local.confidence, result='Metin yerel olarak okundu')
+    return {
+        'raw_text': local.text,
+        'normalized_text': normalize_text(local.text),
+        'engine': local.engine,
+        'confidence': local.confidence,
+        'processing_steps': processing_steps
+    }
+
+
+def process_image_ocr(image, debug_dir: str = None, prompt: str = None, engine: str = "vision",
+                      local_result: EngineResult = None) -> dict:
     """
     Complete OCR processing pipeline using Gemini.
     Can return either structured JSON (list) or raw text compatibility object.
+    Results are served from the OCR cache when the same page was seen before.
+
+    With engine="local" or "auto" the page is first read by the local OCR
+    engine (see OCR_ENGINES); local_result skips that run if the caller
+    already has it.
     """
     processing_steps = []
     
     try:
+        if engine != "vision":
+            local = local_result if local_result is not None else _safe_local_ocr(image, engine)
+            result = _finish_local_step(processing_steps, local, engine)
+            if result is not None:
+                return result
+
         # Step 1: Send to Google Gemini
-        processing_steps.append({
-            'step': 1,
-            'name': 'Google Gemini API',
-            'description': 'Görsel işleniyor ve sorular ayrıştırılıyor',
-            'status': 'in_progress'
-        })
-        
-        result = extract_text_from_image(image, prompt=prompt)
-        
-        processing_steps[0]['status'] = 'completed'
-        processing_steps[0]['result'] = 'Veri başarıyla alındı'
+        processing_steps = _start_ocr_steps(processing_steps)
+        base64_image = encode_image_to_base64(image) if isinstance(image, Image.Image) else image
+
+        cache, key, result = _ocr_cache_lookup(base64_image, prompt)
+        if result is not None:
+            return _build_ocr_result(result, _mark_cached(processing_steps))
+
+        result = extract_text_from_image(base64_image, prompt=prompt)
+        _ocr_cache_store(cache, key, result, prompt)
+        return _build_ocr_result(result, processing_steps)
         
-        # Check if result is structured list
-        if isinstance(result, list):
-            return {
-                'structured_data': result,  # New field for structured questions
-                'raw_text': str(result),    # Kept for compatibility
-                'normalized_text': str(result),
-                'processing_steps': processing_steps
-            }
+    except Exception as e:
+        _fail_ocr_steps(processing_steps, e)
+        raise Exception(f"OCR İşlemi Başarısız: {str(e)}")
+
+
+_ocr_semaphore = None
+
+def _get_ocr_semaphore():
+    """Process-wide cap on vision requests in flight across all uploads."""
+    import asyncio
+
+    global _ocr_semaphore
+    if _ocr_semaphore is None:
+        _ocr_semaphore = asyncio.Semaphore(settings.OCR_GLOBAL_MAX_CONCURRENCY)
+    return _ocr_semaphore
+
+
+async def process_image_ocr_async(image, prompt: str = None, engine: str = "vision",
+                                  local_result: EngineResult = None, on_item=None) -> dict:
+    """
+    Async variant of process_image_ocr, used when several pages are
+    transcribed concurrently. The local engine runs in a worker thread.
+
+    on_item(index, question) receives each question of a streamed vision
+    transcription as soon as it is complete (not called for cache hits or
+    local results; the caller takes those from the returned result).
+    """
+    import asyncio
+
+    processing_steps = []
+
+    try:
+        if engine != "vision":
+            local = local_result if local_result is not None else await asyncio.to_thread(_safe_local_ocr, image, engine)
+            result = _finish_local_step(processing_steps, local, engine)
+            if result is not None:
+                return result
+
+        processing_steps = _start_ocr_steps(processing_steps)
+        if isinstance(image, Image.Image):
+            base64_image = await asyncio.to_thread(encode_image_to_base64, image)
         else:
-            # Fallback for plain text
-            normalized_text = normalize_text(result)
-            return {
-                'raw_text': result,
-                'normalized_text': normalized_text,
-                'processing_steps': processing_steps
-            }
-        
+            base64_image = image
+
+        cache, key, result = _ocr_cache_lookup(base64_image, prompt)
+        if result is not None:
+            return _build_ocr_result(result, _mark_cached(processing_steps))
+
+        async with _get_ocr_semaphore():
+            result = await extract_text_from_image_async(base64_image, prompt=prompt, on_item=on_item)
+        _ocr_cache_store(cache, key, result, prompt)
+        return _build_ocr_result(result, processing_steps)
+
     except Exception as e:
-        if processing_steps:
-            processing_steps[-1]['status'] = 'failed'
-            processing_steps[-1]['error'] = str(e)
-            
+        _fail_ocr_steps(processing_steps, e)
         raise Exception(f"OCR İşlemi Başarısız: {str(e)}")
 
 
-# Initialize EasyOCR reader once (global) to avoid loading model on every request
+def _split_packed_output(output, page_count: int):
+    """
+    Splits the question list of a packed request back per page, using each
+    question's 'sayfa'. Returns [[question, ...] per page], or None if the
+    output cannot be attributed to pages reliably.
+    """
+    if not isinstance(output, list):
+        return None
+
+    pages = [[] for _ in range(page_count)]
+    for item in output:
+        if not isinstance(item, dict):
+            return None
+        item = dict(item)
+        try:
+            page = int(item.pop('sayfa'))
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not 1 <= page <= page_count:
+            return None
+
+        continued = []
+        for later in item.pop('devam_sayfalari', None) or []:
+            try:
+                later = int(later)
+            except (TypeError, ValueError):
+                continue
+            if page < later <= page_count:
+                continued.append(later)
+        item['devam_sayfalari'] = sorted(set(continued))
+        pages[page - 1].append(item)
+    return pages
+
+
+async def process_pages_ocr_async(base64_images: list, page_numbers: list) -> list[dict]:
+    """
+    Transcribes several pages of the same paper in one vision request.
+
+    The question list is split back per page. A question whose answer
+    continues onto later pages stays on the page where it starts, with the
+    full answer and 'devam_sayfalari' = the (absolute) continuation page
+    numbers; a page holding nothing but such a continuation gets an empty
+    list and 'continuation_of' = the page the question started on.
+
+    If the output cannot be split reliably, every page is transcribed on its
+    own instead. Returns one result per page, like process_image_ocr_async.
+    """
+    import asyncio
+
+    if len(base64_images) == 1:
+        return [await process_image_ocr_async(base64_images[0])]
+
+    prompt = build_packed_ocr_prompt(len(base64_images))
+    cache = get_ocr_cache()
+    # Base64 never contains a newline, so the joined payload is unambiguous
+    key = make_cache_key("\n".join(base64_images).encode('ascii'), prompt, OCR_MODEL) if cache else None
+    output = cache.get(key) if cache else None
+    cached = output is not None
+
+    started = time.time()
+    if output is None:
+        async with _get_ocr_semaphore():
+            output = await extract_text_from_image_async(base64_images, prompt=prompt)
+
+    pages = _split_packed_output(output, len(base64_images))
+    if pages is None:
+        logger.warning(f"Packed OCR output for pages {page_numbers} could not be split per page; transcribing them one by one")
+        return list(await asyncio.gather(*(process_image_ocr_async(payload) for payload in base64_images)))
+    if not cached:
+        _ocr_cache_store(cache, key, output, None)
+
+    continuation_of = {}
+    for index, items in enumerate(pages):
+        for item in items:
+            item['devam_sayfalari'] = [page_numbers[p - 1] for p in item['devam_sayfalari']]
+            for later in item['devam_sayfalari']:
+                continuation_of.setdefault(later, page_numbers[index])
+
+    results = []
+    for index, items in enumerate(pages):
+        processing_steps = _start_ocr_steps()
+        # The request is shared; its duration is reported on every page
+        processing_steps[-1]['started_at'] = started
+        if cached:
+            _mark_cached(processing_steps)
+        processing_steps[-1]['packed_pages'] = page_numbers
+        result = _build_ocr_result(items, processing_steps)
+        if not items and page_numbers[index] in continuation_of:
+            result['continuation_of'] = continuation_of[page_numbers[index]]
+        results.append(result)
+    return results
+
+
+# EasyOCR reader is loaded once per process (global) to avoid loading the
+# model on every request. It is created on first use so that processes which
+# never anonymize (or the anonymizer pool's parent) do not pay for it.
 # We use Turkish and English
-try:
-    # Use GPU if available (auto-detect)
-    reader = easyocr.Reader(['tr', 'en'], gpu=True) 
-    logger.info("EasyOCR model loaded successfully (GPU enabled if available).")
-except Exception as e:
-    logger.error(f"Failed to load EasyOCR: {e}")
-    reader = None
+reader = None
+_reader_load_attempted = False
+
+def get_reader():
+    """Returns the process-wide EasyOCR reader, loading it on first call."""
+    global reader, _reader_load_attempted
+    if reader is None and not _reader_load_attempted:
+        _reader_load_attempted = True
+        try:
+            # Use GPU if available (auto-detect)
+            reader = easyocr.Reader(['tr', 'en'], gpu=True) 
+            logger.info("EasyOCR model loaded successfully (GPU enabled if available).")
+        except Exception as e:
+            logger.error(f"Failed to load EasyOCR: {e}")
+            reader = None
+    return reader
 
-def anonymize_student_data_local(image: Image.Image) -> tuple[Image.Image, dict]:
+
+def header_band_bounds(img_h: int) -> tuple[int, int]:
     """
-    Detects 'Adı', 'Soyadı', 'Numara' fields using EasyOCR,
-    extracts the text next to them (value), and then redacts that area.
-    
+    Returns (header_limit, band_bottom) for a page of the given height.
+
+    DEFINITION: Only look at top 35% of the page to be safe (increased from 25%).
+    The band handed to EasyOCR extends a little below header_limit so values
+    written on the same line as a label near the limit are not cut.
+    """
+    header_limit = int(img_h * 0.35)
+    band_bottom = min(img_h, header_limit + int(img_h * 0.03))
+    return header_limit, band_bottom
+
+
+def read_header_band(band: np.ndarray, scale: float = 1.0) -> list:
+    """
+    Runs EasyOCR on the header band (top of the page, RGB array).
+
+    With scale < 1 the band is downscaled before detection. Boxes are mapped
+    back to full-page coordinates, so callers can redact on the original
+    page directly.
+    """
+    if scale and scale != 1.0:
+        band = cv2.resize(band, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    results = get_reader().readtext(band)
+
+    if scale and scale != 1.0:
+        results = [
+            ([[x / scale, y / scale] for (x, y) in bbox], text, prob)
+            for (bbox, text, prob) in results
+        ]
+    return results
+
+
+def stack_header_bands(bands: list) -> np.ndarray:
+    """
+    Stacks header bands of several pages into one (N, H, W, 3) array for
+    batched EasyOCR. Smaller bands are padded with white at the bottom and
+    right, so box coordinates stay valid for every page.
+    """
+    height = max(band.shape[0] for band in bands)
+    width = max(band.shape[1] for band in bands)
+    stacked = np.full((len(bands), height, width, 3), 255, dtype=np.uint8)
+    for i, band in enumerate(bands):
+        stacked[i, :band.shape[0], :band.shape[1]] = band
+    return stacked
+
+
+def read_header_bands(bands: np.ndarray, scale: float = 1.0) -> list:
+    """
+    Batched read_header_band: runs EasyOCR detection and recognition for a
+    stack of header bands (see stack_header_bands) in one pass.
+    Returns one result list per band, in page coordinates.
+    """
+    if len(bands) == 1:
+        return [read_header_band(bands[0], scale)]
+
+    if scale and scale != 1.0:
+        bands = np.stack([
+            cv2.resize(band, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            for band in bands
+        ])
+
+    batched = get_reader().readtext_batched(bands, batch_size=len(bands))
+
+    if scale and scale != 1.0:
+        batched = [
+            [([[x / scale, y / scale] for (x, y) in bbox], text, prob) for (bbox, text, prob) in results]
+            for results in batched
+        ]
+    return batched
+
+
+def header_band_array(image: Image.Image) -> tuple[np.ndarray, int]:
+    """
+    Returns (RGB array of the header band, header_limit) for a page.
+    Only the band is copied out of the page, never the full image.
+    """
+    img_w, img_h = image.size
+    header_limit, band_bottom = header_band_bounds(img_h)
+    band = image.crop((0, 0, img_w, band_bottom))
+    if band.mode != "RGB":
+        band = band.convert("RGB")
+    return np.asarray(band), header_limit
+
+
+def page_header_band(image: Image.Image) -> tuple[np.ndarray, int, float, tuple]:
+    """
+    Header band of a rendered page for EasyOCR.
+
+    Uses the separate high-DPI header render attached by the upload
+    pipeline (image.info['header_band']) when present, else crops the page.
+
     Returns:
-        (redacted_image, extracted_data_dict)
+        (RGB band array, header_limit, scale, page_size) where header_limit
+        and page_size are in band coordinates and scale maps page
+        coordinates to band coordinates.
+    """
+    header = image.info.get('header_band')
+    if header is None:
+        band, header_limit = header_band_array(image)
+        return band, header_limit, 1.0, image.size
+
+    header_image, scale = header
+    page_size = (header_image.size[0], round(image.size[1] * scale))
+    header_limit, _ = header_band_bounds(page_size[1])
+    if header_image.mode != "RGB":
+        header_image = header_image.convert("RGB")
+    return np.asarray(header_image), header_limit, scale, page_size
+
+
+def scale_boxes(boxes: list, factor: float) -> list:
+    """Scales (x_min, y_min, x_max, y_max) boxes, rounding outwards so redactions never shrink."""
+    if factor == 1.0:
+        return boxes
+    return [
+        (math.floor(x0 * factor), math.floor(y0 * factor), math.ceil(x1 * factor), math.ceil(y1 * factor))
+        for (x0, y0, x1, y1) in boxes
+    ]
+
+
+def detect_student_fields(results: list, img_w: int, header_limit: int, with_layout: bool = False) -> tuple:
+    """
+    Finds the name/number labels among EasyOCR results, reads the value
+    written to their right and decides which areas must be blacked out.
+
+    Returns:
+        (redaction_boxes, extracted_data_dict) where each box is
+        (x_min, y_min, x_max, y_max) in page coordinates.
+        With with_layout, a third element lists every redacted label as
+        {'type', 'label', 'value'} boxes (see layout_template).
     """
     extracted_data = {}
+    redaction_boxes = []
+    layout = []
+
+    # Keywords
+    # Refined to include "ad soyad" composite to catch cases like "Ad Soyad: ..."
+    name_keywords = ['ad soyad', 'adı soyadı', 'ogrenci adi', 'öğrenci adı', 'adi', 'adı', 'soyadi', 'soyadı', 'isim'] 
+    number_keywords = ['numara', 'no', 'ogrenci no', 'number']
     
-    if reader is None:
-        logger.warning("EasyOCR reader not available. Skipping anonymization.")
-        return image, extracted_data
-        
-    try:
-        # Convert PIL to Numpy (RGB)
-        open_cv_image = np.array(image.convert("RGB")) 
+    all_matches = [] # All text blocks found
+    found_labels = [] # Specifically label blocks
+
+    for (bbox, text, prob) in results:
+        y_min = int(bbox[0][1])
+        x_min = int(bbox[0][0])
+        x_max = int(bbox[2][0])
+        y_max = int(bbox[2][1])
         
-        img_h, img_w, _ = open_cv_image.shape
+        item = {
+            'text': text,
+            'text_lower': text.lower().strip(),
+            'x_min': x_min,
+            'x_max': x_max,
+            'y_min': y_min,
+            'y_max': y_max,
+            'y_center': (y_min + y_max) / 2
+        }
         
-        # DEFINITION: Only look at top 35% of the page to be safe (increased from 25%)
-        header_limit = int(img_h * 0.35)
+        all_matches.append(item)
         
-        # EasyOCR works with numpy array
-        results = reader.readtext(open_cv_image)
+        # Check if this block is a label header?
+        if y_min < header_limit:
+            is_name = any(k in item['text_lower'] for k in name_keywords)
+            is_num = any(k in item['text_lower'] for k in number_keywords)
+            
+            # PRIORITIZE NUMBER: 'Ogrenci No' should be num, not name.
+            if is_num:
+                item['type'] = 'num_label'
+                found_labels.append(item)
+            elif is_name:
+                item['type'] = 'name_label'
+                found_labels.append(item)
+
+    # Sort labels top-to-bottom, left-to-right
+    found_labels.sort(key=lambda item: (item['y_min'], item['x_min']))
+    
+    # Process labels to extract values to their RIGHT
+    processed_types = set()
+    
+    for label in found_labels:
+        if label['type'] in processed_types:
+            continue # Already found this type
+            
+        # Define Scan Zone
+        # Start: label's right edge + margin
+        scan_x_start = label['x_max']
+        scan_y_center = label['y_center']
+        scan_height_tolerance = (label['y_max'] - label['y_min']) * 0.8 # Allow some offset
         
-        # Convert to BGR for OpenCV drawing
-        overlay = open_cv_image[:, :, ::-1].copy()
+        # End: Identify the start of the NEXT label on the same line to act as a barrier
+        scan_x_end = img_w # Default to page edge
         
-        # Keywords
-        # Refined to include "ad soyad" composite to catch cases like "Ad Soyad: ..."
-        name_keywords = ['ad soyad', 'adı soyadı', 'ogrenci adi', 'öğrenci adı', 'adi', 'adı', 'soyadi', 'soyadı', 'isim'] 
-        number_keywords = ['numara', 'no', 'ogrenci no', 'number']
+        for other_label in found_labels:
+            if other_label == label: continue
+            # If on same line approx
+            if abs(other_label['y_center'] - scan_y_center) < scan_height_tolerance:
+                # If to the right
+                if other_label['x_min'] > scan_x_start:
+                    # If closer than current limit
+                    if other_label['x_min'] < scan_x_end:
+                        scan_x_end = other_label['x_min']
         
-        all_matches = [] # All text blocks found
-        found_labels = [] # Specifically label blocks
-
-        for (bbox, text, prob) in results:
-            y_min = int(bbox[0][1])
-            x_min = int(bbox[0][0])
-            x_max = int(bbox[2][0])
-            y_max = int(bbox[2][1])
-            
-            item = {
-                'text': text,
-                'text_lower': text.lower().strip(),
-                'bbox': bbox,
-                'x_min': x_min,
-                'x_max': x_max,
-                'y_min': y_min,
-                'y_max': y_max,
-                'y_center': (y_min + y_max) / 2
-            }
-            
-            all_matches.append(item)
+        # Now Find Values in this Zone
+        found_values = []
+        for match in all_matches:
+            if match == label: continue
+            if match in found_labels and match['type'] == label['type']: continue # Skip self-similar labels
             
-            # Check if this block is a label header?
-            if y_min < header_limit:
-                is_name = any(k in item['text_lower'] for k in name_keywords)
-                is_num = any(k in item['text_lower'] for k in number_keywords)
-                
-                # PRIORITIZE NUMBER: 'Ogrenci No' should be num, not name.
-                if is_num:
-                    item['type'] = 'num_label'
-                    found_labels.append(item)
-                elif is_name:
-                    item['type'] = 'name_label'
-                    found_labels.append(item)
-
-        # Sort labels top-to-bottom, left-to-right
-        found_labels.sort(key=lambda item: (item['y_min'], item['x_min']))
+            # Check Vertical Alignment (Same Line)
+            if abs(match['y_center'] - scan_y_center) < scan_height_tolerance:
+                # Check Horizontal Alignment
+                # Must be to the right of start
+                # Must be to the left of end
+                if match['x_min'] > scan_x_start and match['x_max'] <= scan_x_end: # lenient max check
+                    found_values.append(match)
         
-        # Process labels to extract values to their RIGHT
-        processed_types = set()
+        # Sort found values left-to-right
+        found_values.sort(key=lambda v: v['x_min'])
         
-        for label in found_labels:
-            if label['type'] in processed_types:
-                continue # Already found this type
-                
-            # Define Scan Zone
-            # Start: label's right edge + margin
-            scan_x_start = label['x_max']
-            scan_y_center = label['y_center']
-            scan_height_tolerance = (label['y_max'] - label['y_min']) * 0.8 # Allow some offset
-            
-            # End: Identify the start of the NEXT label on the same line to act as a barrier
-            scan_x_end = img_w # Default to page edge
-            
-            for other_label in found_labels:
-                if other_label == label: continue
-                # If on same line approx
-                if abs(other_label['y_center'] - scan_y_center) < scan_height_tolerance:
-                    # If to the right
-                    if other_label['x_min'] > scan_x_start:
-                        # If closer than current limit
-                        if other_label['x_min'] < scan_x_end:
-                            scan_x_end = other_label['x_min']
-            
-            # Now Find Values in this Zone
-            found_values = []
-            for match in all_matches:
-                if match == label: continue
-                if match in found_labels and match['type'] == label['type']: continue # Skip self-similar labels
-                
-                # Check Vertical Alignment (Same Line)
-                if abs(match['y_center'] - scan_y_center) < scan_height_tolerance:
-                    # Check Horizontal Alignment
-                    # Must be to the right of start
-                    # Must be to the left of end
-                    if match['x_min'] > scan_x_start and match['x_max'] <= scan_x_end: # lenient max check
-                        found_values.append(match)
-            
-            # Sort found values left-to-right
-            found_values.sort(key=lambda v: v['x_min'])
-            
-            extracted_text = " ".join([v['text'] for v in found_values]).strip()
-            
-            if extracted_text:
-                if label['type'] == 'name_label':
-                    cleaned_val = extracted_text.replace(':', '').strip()
-                    extracted_data['name'] = cleaned_val
-                    processed_types.add('name_label')
-                    logger.info(f"Detected Name: {cleaned_val}")
-                elif label['type'] == 'num_label':
-                    cleaned_val = extracted_text.replace(':', '').strip()
-                    extracted_data['number'] = cleaned_val
-                    processed_types.add('num_label')
-                    logger.info(f"Detected Number: {cleaned_val}")
-            
-            # --- REDACTION LOGIC ---
-            # Redact the label AND the value found (or the empty space where it should be)
-            # Redact label
-            redact_margin = 5
-            cv2.rectangle(overlay, 
-                         (label['x_min'] - redact_margin, label['y_min'] - redact_margin), 
-                         (label['x_max'] + redact_margin, label['y_max'] + redact_margin), 
-                         (0, 0, 0), -1)
+        extracted_text = " ".join([v['text'] for v in found_values]).strip()
+        
+        if extracted_text:
+            if label['type'] == 'name_label':
+                cleaned_val = extracted_text.replace(':', '').strip()
+                extracted_data['name'] = cleaned_val
+                processed_types.add('name_label')
+                logger.info(f"Detected Name: {cleaned_val}")
+            elif label['type'] == 'num_label':
+                cleaned_val = extracted_text.replace(':', '').strip()
+                extracted_data['number'] = cleaned_val
+                processed_types.add('num_label')
+                logger.info(f"Detected Number: {cleaned_val}")
+        
+        # --- REDACTION LOGIC ---
+        # Redact the label AND the value found (or the empty space where it should be)
+        # Redact label
+        redact_margin = 5
+        redaction_boxes.append((
+            label['x_min'] - redact_margin, label['y_min'] - redact_margin,
+            label['x_max'] + redact_margin, label['y_max'] + redact_margin
+        ))
+        
+        # Value zone for layout templates: the whole scan zone of the label
+        # line, with room for handwriting taller than the printed label
+        zone_pad = max(redact_margin, int((label['y_max'] - label['y_min']) * 0.5))
+        layout.append({
+            'type': label['type'],
+            'label': redaction_boxes[-1],
+            'value': (
+                scan_x_start,
+                min([label['y_min']] + [v['y_min'] for v in found_values]) - zone_pad,
+                scan_x_end,
+                max([label['y_max']] + [v['y_max'] for v in found_values]) + zone_pad
+            )
+        })
+
+        # Redact value zone
+        # If we found items, redact them. If not, redact a generic box to be safe.
+        if found_values:
+            # Redact from start of first value to end of last value
+            val_x_min = found_values[0]['x_min']
+            val_x_max = found_values[-1]['x_max']
+            val_y_min = min([v['y_min'] for v in found_values])
+            val_y_max = max([v['y_max'] for v in found_values])
             
-            # Redact value zone
-            # If we found items, redact them. If not, redact a generic box to be safe.
-            if found_values:
-                # Redact from start of first value to end of last value
-                val_x_min = found_values[0]['x_min']
-                val_x_max = found_values[-1]['x_max']
-                val_y_min = min([v['y_min'] for v in found_values])
-                val_y_max = max([v['y_max'] for v in found_values])
-                
-                cv2.rectangle(overlay, 
-                             (val_x_min - redact_margin, val_y_min - redact_margin), 
-                             (val_x_max + redact_margin, val_y_max + redact_margin), 
-                             (0, 0, 0), -1)
-            else:
-                # Blind redaction if value not detected but label exists
-                blind_w = 400
-                if scan_x_start + blind_w > img_w: blind_w = img_w - scan_x_start
-                cv2.rectangle(overlay, 
-                             (scan_x_start, label['y_min'] - redact_margin), 
-                             (scan_x_start + blind_w, label['y_max'] + redact_margin), 
-                             (0, 0, 0), -1)
-
-        # Convert back to RGB and PIL
-        result_image = cv2.cvtColor(overlay, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(result_image), extracted_data
+            redaction_boxes.append((
+                val_x_min - redact_margin, val_y_min - redact_margin,
+                val_x_max + redact_margin, val_y_max + redact_margin
+            ))
+        else:
+            # Blind redaction if value not detected but label exists
+            blind_w = 400
+            if scan_x_start + blind_w > img_w: blind_w = img_w - scan_x_start
+            redaction_boxes.append((
+                scan_x_start, label['y_min'] - redact_margin,
+                scan_x_start + blind_w, label['y_max'] + redact_margin
+            ))
+
+    if with_layout:
+        return redaction_boxes, extracted_data, layout
+    return redaction_boxes, extracted_data
+
+
+def recognize_value_boxes(band: np.ndarray, boxes: list) -> list:
+    """
+    Reads the text inside known boxes of the header band with EasyOCR's
+    recognizer only (no text detection). Returns one string per box.
+    """
+    if not boxes:
+        return []
+    horizontal_list = [[x0, x1, y0, y1] for (x0, y0, x1, y1) in boxes]
+    return get_reader().recognize(band, horizontal_list=horizontal_list, free_list=[], detail=0)
+
+
+def apply_redactions(image: Image.Image, redaction_boxes: list) -> Image.Image:
+    """
+    Fills the given boxes black on the page itself and returns it.
+    Only pages in a mode other than RGB/L (e.g. palette PNGs) are converted,
+    once, before drawing.
+    """
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for (x_min, y_min, x_max, y_max) in redaction_boxes:
+        draw.rectangle((x_min, y_min, x_max, y_max), fill="black")
+    return image
+
+
+def anonymize_student_data_local(image: Image.Image, header_only: bool = True) -> tuple[Image.Image, dict]:
+    """
+    Detects 'Adı', 'Soyadı', 'Numara' fields using EasyOCR,
+    extracts the text next to them (value), and then redacts that area.
+
+    With header_only (default) EasyOCR only sees the header band (optionally
+    downscaled by ANON_HEADER_SCALE); header_only=False reads the whole page
+    as before and is kept for benchmarking.
+
+    Runs in the calling process; the upload pipeline uses the worker pool in
+    anonymizer_pool instead.
+    
+    Returns:
+        (redacted_image, extracted_data_dict)
+    """
+    extracted_data = {}
+    
+    if get_reader() is None:
+        logger.warning("EasyOCR reader not available. Skipping anonymization.")
+        return image, extracted_data
+        
+    try:
+        img_w, img_h = image.size
+
+        # EasyOCR works with numpy array
+        # Labels are only accepted above header_limit, so the rest of the page
+        # does not need to be detected or recognized (or even copied) at all
+        if header_only:
+            header_band, header_limit = header_band_array(image)
+            results = read_header_band(header_band, settings.ANON_HEADER_SCALE)
+        else:
+            header_limit, _ = header_band_bounds(img_h)
+            results = reader.readtext(np.array(image.convert("RGB")))
+
+        redaction_boxes, extracted_data = detect_student_fields(results, img_w, header_limit)
+        return apply_redactions(image, redaction_boxes), extracted_data
         
     except Exception as e:
         logger.error(f"EasyOCR anonymization failed: {e}")
         return image, extracted_data
-
-
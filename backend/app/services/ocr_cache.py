@@ -0,0 +1,149 @@
+"""
+OCR Result Cache
+Content-addressed, SQLite-backed cache for vision OCR results with
+size-bounded LRU eviction.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(image_bytes: bytes, prompt: str, model: str) -> str:
+    """
+    Cache key = sha256 over the anonymized page payload, the prompt text and
+    the model name. Any change in one of them results in a new key.
+    """
+    digest = hashlib.sha256()
+    for part in (model.encode("utf-8"), prompt.encode("utf-8"), image_bytes):
+        # Length prefix keeps the parts unambiguous
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Persistent key -> OCR result store.
+
+    Entries are evicted least-recently-used first once the total stored size
+    exceeds max_bytes. Hit/miss counters are kept per process.
+    """
+
+    TABLE = "ocr_cache"
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_last_access ON {self.TABLE}(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Returns the cached result for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(f"SELECT result FROM {self.TABLE} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                f"UPDATE {self.TABLE} SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def put(self, key: str, result):
+        """Stores a result and evicts old entries if the size budget is exceeded."""
+        payload = json.dumps(result, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} (key, result, size, created_at, last_access, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, payload, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(f"SELECT key, size FROM {self.TABLE} ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute(f"DELETE FROM {self.TABLE} WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.TABLE}"
+            ).fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """Returns the process-wide OCR cache, or None when caching is disabled."""
+    global _cache
+    if not settings.OCR_CACHE_ENABLED:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = OCRCache(settings.OCR_CACHE_PATH, settings.OCR_CACHE_MAX_MB * 1024 * 1024)
+            except Exception as e:
+                logger.error(f"OCR cache could not be opened, continuing without cache: {e}")
+                return None
+    return _cache
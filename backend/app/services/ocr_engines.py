@@ -0,0 +1,131 @@
+"""
+Local OCR Engines
+Engines that transcribe printed pages on this machine, without the vision
+API. The OCR router in ocr.py tries the configured local engine first and
+only sends a page to GPT-4o when the engine's confidence is too low.
+
+An engine returns plain text (layout lines), so local engines are meant for
+printed documents - answer keys, rubrics, question text - and not for the
+structured transcription of handwritten student papers.
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EngineResult(NamedTuple):
+    text: str
+    confidence: float  # 0..1
+    engine: str
+
+
+class OCREngine(ABC):
+    """Interface of a local OCR engine."""
+
+    name = "base"
+
+    def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def transcribe(self, image: Image.Image) -> EngineResult:
+        ...
+
+
+class TesseractEngine(OCREngine):
+    """
+    Tesseract via pytesseract (TESSERACT_LANG, default tur+eng).
+
+    Confidence is the mean word confidence weighted by word length, so a
+    few misread short tokens weigh less than a garbled paragraph.
+    """
+
+    name = "tesseract"
+
+    def __init__(self, lang: str = None, cmd: str = None):
+        self.lang = lang or settings.TESSERACT_LANG
+        self.cmd = cmd or settings.TESSERACT_CMD
+        self._available = None
+
+    def _pytesseract(self):
+        import pytesseract
+        if self.cmd:
+            pytesseract.pytesseract.tesseract_cmd = self.cmd
+        return pytesseract
+
+    def is_available(self) -> bool:
+        if self._available is None:
+            try:
+                pytesseract = self._pytesseract()
+                pytesseract.get_tesseract_version()
+                missing = set(self.lang.split("+")) - set(pytesseract.get_languages(config=""))
+                if missing:
+                    raise RuntimeError(f"language data missing: {', '.join(sorted(missing))}")
+                self._available = True
+            except Exception as e:
+                logger.warning(f"Tesseract not available, pages will use vision OCR: {e}")
+                self._available = False
+        return self._available
+
+    def transcribe(self, image: Image.Image) -> EngineResult:
+        pytesseract = self._pytesseract()
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+
+        lines = {}
+        weighted, total = 0.0, 0
+        for i, word in enumerate(data["text"]):
+            word = word.strip()
+            conf = float(data["conf"][i])
+            if not word or conf < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(word)
+            weighted += conf * len(word)
+            total += len(word)
+
+        # Lines in reading order, a blank line between blocks
+        text_lines = []
+        previous_block = None
+        for (block, par, line) in sorted(lines):
+            if previous_block is not None and block != previous_block:
+                text_lines.append("")
+            text_lines.append(" ".join(lines[(block, par, line)]))
+            previous_block = block
+
+        confidence = weighted / total / 100 if total else 0.0
+        return EngineResult("\n".join(text_lines), round(confidence, 4), self.name)
+
+
+_ENGINES = {
+    TesseractEngine.name: TesseractEngine,
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_local_engine() -> Optional[OCREngine]:
+    """
+    Returns the configured local engine (OCR_LOCAL_ENGINE), or None if local
+    OCR is disabled or the engine cannot run here.
+    """
+    global _engine
+    name = settings.OCR_LOCAL_ENGINE.lower()
+    if name not in _ENGINES:
+        return None
+
+    with _engine_lock:
+        if _engine is None or _engine.name != name:
+            _engine = _ENGINES[name]()
+    return _engine if _engine.is_available() else None
@@ -0,0 +1,375 @@
+"""
+Shared OpenAI Client
+One pooled sync client and one async client for OCR and scoring, so calls
+reuse keep-alive connections instead of opening a new pool (and TLS
+handshake) per request, plus a process-wide rate limiter per model.
+
+The limiter is a token bucket for requests/min and tokens/min. Limits come
+from OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT, or are learned from the
+x-ratelimit-* response headers when those are 0. A 429 (Retry-After,
+retry-after-ms or the reset headers) pauses the whole model, so concurrent
+workers wait out the same window and then resume staggered by the bucket
+instead of all retrying at the same moment.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+from dotenv import load_dotenv
+from openai import (AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, InternalServerError,
+                    OpenAI, RateLimitError)
+
+from app.core.config import settings
+from app.services.image_encoding import payload_image_tokens
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(current_dir, '..', '..', '.env'))
+
+api_key = os.getenv("OPENAI_API_KEY")
+if not api_key:
+    logger.error("OPENAI_API_KEY not found in environment variables!")
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = {}  # event loop -> AsyncOpenAI
+
+
+def get_openai_client() -> OpenAI:
+    """Process-wide sync client (thread-safe; retries are handled by the callers)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(
+                api_key=api_key,
+                max_retries=0,
+                timeout=settings.OPENAI_TIMEOUT,
+                http_client=DefaultHttpxClient(limits=_pool_limits())
+            )
+        return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Async client of the running event loop (its connection pool is bound to the loop)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        for other in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[other]
+        client = AsyncOpenAI(
+            api_key=api_key,
+            max_retries=0,
+            timeout=settings.OPENAI_TIMEOUT,
+            http_client=DefaultAsyncHttpxClient(limits=_pool_limits())
+        )
+        _async_clients[loop] = client
+    return client
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: str):
+    """Seconds in an x-ratelimit-reset-* header ("20ms", "1.5s", "6m0s")."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers):
+    """Wait requested by a 429 response (retry-after-ms, Retry-After, reset headers)."""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    resets = [parse_reset_duration(headers.get(name)) for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+    resets = [r for r in resets if r]
+    return max(resets) if resets else None
+
+
+class _Bucket:
+    """Token bucket refilled continuously at limit/60 per second; may go negative (reservations)."""
+
+    def __init__(self, per_minute: int):
+        self.limit = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def set_limit(self, per_minute: int):
+        if per_minute != self.limit:
+            self.level = min(self.level, float(per_minute)) if self.limit else float(per_minute)
+            self.limit = per_minute
+
+    def refill(self, now: float):
+        if self.limit:
+            rate = self.limit / 60.0
+            self.level = min(float(self.limit), self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Takes amount and returns how long the caller must wait for it to be covered."""
+        if not self.limit:
+            return 0.0
+        self.level -= amount
+        return max(0.0, -self.level / (self.limit / 60.0))
+
+
+# Gap between callers resuming after a pause while the request limit is unknown
+RESUME_SPACING_S = 0.2
+
+
+class RateLimiter:
+    """Requests/min and tokens/min limits of one model, shared by every thread and event loop."""
+
+    def __init__(self, model: str, rpm: int = 0, tpm: int = 0):
+        self.model = model
+        self._lock = threading.Lock()
+        self._learn_rpm = not rpm
+        self._learn_tpm = not tpm
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+        self._paused_until = 0.0
+        self._resume_slot = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.rate_limited = 0
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            pause = self._paused_until - now
+            if pause > 0:
+                # Callers held by the same pause resume one after another
+                spacing = 60.0 / self._requests.limit if self._requests.limit else RESUME_SPACING_S
+                pause += self._resume_slot * spacing
+                self._resume_slot += 1
+            else:
+                self._resume_slot = 0
+            wait = max(pause, self._requests.reserve(1), self._tokens.reserve(tokens))
+            if wait > 0:
+                self.waits += 1
+                self.wait_seconds += wait
+            return wait
+
+    def acquire(self, tokens: int):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved: int, used: int):
+        """Returns the part of a token reservation the request did not use."""
+        with self._lock:
+            self._tokens.level += reserved - used
+            if self._tokens.limit:
+                self._tokens.level = min(self._tokens.level, float(self._tokens.limit))
+
+    def observe(self, headers):
+        """Adopts the limits and remaining budget reported by x-ratelimit-* headers."""
+        if headers is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            for bucket, learn, kind in ((self._requests, self._learn_rpm, "requests"), (self._tokens, self._learn_tpm, "tokens")):
+                limit = _int_header(headers, f"x-ratelimit-limit-{kind}")
+                if learn and limit:
+                    bucket.set_limit(limit)
+                remaining = _int_header(headers, f"x-ratelimit-remaining-{kind}")
+                if remaining is not None and bucket.limit:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, float(remaining))
+                    if remaining == 0:
+                        reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                        if reset:
+                            self._paused_until = max(self._paused_until, now + reset)
+
+    def pause(self, seconds: float):
+        """Holds every caller of this model for `seconds` (after a 429)."""
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.model,
+                "rpm_limit": self._requests.limit,
+                "tpm_limit": self._tokens.limit,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 2),
+                "rate_limited": self.rate_limited,
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2)
+            }
+
+
+def _int_header(headers, name: str):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """OpenAI rate limits are per model, so each model gets its own limiter."""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = RateLimiter(model, settings.OPENAI_RPM_LIMIT, settings.OPENAI_TPM_LIMIT)
+            _limiters[model] = limiter
+        return limiter
+
+
+def rate_limiter_stats() -> list:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
+
+
+def estimate_request_tokens(messages: list, max_tokens: int = None) -> int:
+    """What the provider counts against tokens/min: prompt estimate plus max_tokens."""
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                url = part["image_url"]["url"]
+                tokens += payload_image_tokens(url.split("base64,", 1)[-1])
+            else:
+                tokens += len(part.get("text") or "") // 3 + 1
+    return tokens + (max_tokens or 1000)
+
+
+def _used_tokens(response, reserved: int) -> int:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return reserved
+    return (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
+
+def create_chat_completion(**kwargs):
+    """chat.completions.create on the shared client, paced by the model's limiter."""
+    limiter = get_rate_limiter(kwargs["model"])
+    reserved = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens"))
+    limiter.acquire(reserved)
+    try:
+        raw = get_openai_client().chat.completions.with_raw_response.create(**kwargs)
+    except RateLimitError as e:
+        limiter.settle(reserved, 0)
+        _note_rate_limit(limiter, e)
+        raise
+    limiter.observe(raw.headers)
+    response = raw.parse()
+    # A stream keeps its full reservation (usage is not known up front)
+    if not kwargs.get("stream"):
+        limiter.settle(reserved, _used_tokens(response, reserved))
+    return response
+
+
+async def create_chat_completion_async(**kwargs):
+    """Async variant of create_chat_completion."""
+    limiter = get_rate_limiter(kwargs["model"])
+    reserved = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens"))
+    await limiter.acquire_async(reserved)
+    try:
+        raw = await get_async_openai_client().chat.completions.with_raw_response.create(**kwargs)
+    except RateLimitError as e:
+        limiter.settle(reserved, 0)
+        _note_rate_limit(limiter, e)
+        raise
+    limiter.observe(raw.headers)
+    response = raw.parse()
+    if not kwargs.get("stream"):
+        limiter.settle(reserved, _used_tokens(response, reserved))
+    return response
+
+
+def _note_rate_limit(limiter: RateLimiter, error: RateLimitError):
+    response = getattr(error, "response", None)
+    seconds = retry_after_seconds(response.headers if response is not None else None)
+    if seconds:
+        limiter.pause(seconds)
+    error.retry_after = seconds
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    if isinstance(error, RateLimitError) or getattr(error, "status_code", None) == 429:
+        return True
+    error_msg = str(error)
+    return "429" in error_msg or "rate limit" in error_msg.lower()
+
+
+def is_server_error(error: Exception) -> bool:
+    if isinstance(error, InternalServerError) or (getattr(error, "status_code", None) or 0) >= 500:
+        return True
+    error_msg = str(error)
+    return "500" in error_msg or "internal" in error_msg.lower()
+
+
+def retry_delay(error: Exception, attempt: int, max_retries: int, base_delay: float, model: str = None):
+    """
+    Seconds to wait before retrying a failed call, or None if the error is
+    not retryable or the retry budget is spent. A 429 without Retry-After
+    pauses the model's limiter for the exponential backoff, so every
+    worker backs off together; the caller then only waits for its own turn.
+    """
+    if attempt >= max_retries:
+        return None
+
+    if is_rate_limit_error(error):
+        seconds = getattr(error, "retry_after", None)
+        if not seconds:
+            seconds = base_delay * (2 ** attempt) + random.uniform(0, 1)
+            if model:
+                get_rate_limiter(model).pause(seconds)
+        logger.warning(f"Rate limit hit ({model or 'openai'}). Pausing {seconds:.2f}s... (Attempt {attempt+1}/{max_retries})")
+        # With a limiter the pause is enforced by the next acquire()
+        return 0.0 if model else seconds
+    if is_server_error(error):
+        wait_time = 20
+        logger.warning(f"Internal Server Error (500). Retrying in {wait_time}s... (Attempt {attempt+1}/{max_retries})")
+        return wait_time
+    return None
@@ -0,0 +1,106 @@
+"""
+Multi-Page Packing
+Groups consecutive anonymized pages of one paper into a single vision
+request, so the prompt, the connection and the provider-side queueing are
+paid once per group instead of once per page.
+
+A group is sent when it reaches VISION_PACK_MAX_PAGES pages, when the next
+page would push it over VISION_PACK_TOKEN_BUDGET image tokens, when it holds
+as many pages as the pipeline lets wait (max_in_flight), when every page of
+the paper has been seen, or VISION_PACK_WAIT_MS after its last page arrived.
+"""
+
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services.image_encoding import payload_image_tokens
+from app.services.ocr import process_pages_ocr_async
+
+logger = logging.getLogger(__name__)
+
+
+class PagePacker:
+    """
+    Collects the OCR-ready pages of one upload job (event loop thread only).
+
+    Every page index must reach the packer exactly once, either through
+    submit() (needs OCR) or skip() (blank, restored from a checkpoint), so
+    the last group is sent as soon as the paper is complete.
+    """
+
+    def __init__(self, page_count: int, max_in_flight: int = None):
+        if max_in_flight is None:
+            max_in_flight = settings.OCR_MAX_CONCURRENCY
+        self.page_count = page_count
+        self.max_pages = max(1, min(settings.VISION_PACK_MAX_PAGES, max_in_flight))
+        self.token_budget = settings.VISION_PACK_TOKEN_BUDGET
+        self.requests = 0
+        self.packed_pages = 0
+        self._seen = 0
+        self._group = []  # (index, payload, tokens, future)
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, index: int, base64_image: str) -> dict:
+        """Queues a page and returns its OCR result once its group was transcribed."""
+        loop = asyncio.get_running_loop()
+        tokens = payload_image_tokens(base64_image)
+        if self._group and sum(g[2] for g in self._group) + tokens > self.token_budget:
+            self._flush()
+
+        future = loop.create_future()
+        self._group.append((index, base64_image, tokens, future))
+        self._seen += 1
+        self._after_page(loop)
+        return await future
+
+    def skip(self, index: int):
+        """Marks a page that needs no OCR."""
+        self._seen += 1
+        if self._group:
+            self._after_page(asyncio.get_running_loop())
+
+    def _after_page(self, loop):
+        if len(self._group) >= self.max_pages or self._seen >= self.page_count:
+            self._flush()
+            return
+        # Safety net: never let a partial group wait on pages that do not come
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(settings.VISION_PACK_WAIT_MS / 1000, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        group, self._group = self._group, []
+        if group:
+            task = asyncio.create_task(self._send(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, group: list):
+        try:
+            results = await process_pages_ocr_async(
+                [payload for _, payload, _, _ in group],
+                [index + 1 for index, _, _, _ in group]
+            )
+        except Exception as e:
+            for _, _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.requests += 1
+        self.packed_pages += len(group)
+        for (_, _, _, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "pages": self.packed_pages,
+            "pages_per_request": round(self.packed_pages / self.requests, 2) if self.requests else 0.0
+        }
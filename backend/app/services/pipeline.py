@@ -0,0 +1,353 @@
+"""
+Upload Page Pipeline
+Renders uploaded documents one page at a time and pushes each page through
+the anonymize -> OCR stages with a bounded number of pages in flight.
+
+PDF pages are rasterized by RENDER_WORKERS pdftoppm processes in parallel,
+a few pages ahead of the consumer. Each consumer gets the resolution it
+needs: the page body at a moderate DPI (vision OCR), and optionally the
+header band alone at a higher DPI (EasyOCR anonymization), attached to the
+page image as image.info['header_band'] = (header_image, scale).
+"""
+
+import asyncio
+import inspect
+import io
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterator, List
+
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedFileError(Exception):
+    """Raised when an uploaded file is neither a PDF nor a readable image."""
+
+
+def _poppler_path():
+    poppler_path = settings.POPPLER_PATH
+    if poppler_path and os.path.exists(poppler_path):
+        return poppler_path
+    return None
+
+
+def _poppler_tool(name: str) -> str:
+    poppler_path = _poppler_path()
+    return os.path.join(poppler_path, name) if poppler_path else name
+
+
+def render_pdf_region(pdf_path: str, page_no: int, dpi: int, width: int, height: int, x: int = 0, y: int = 0) -> Image.Image:
+    """
+    Rasterizes only a region of one PDF page with pdftoppm.
+    x, y, width and height are pixels at the given DPI.
+    """
+    command = [
+        _poppler_tool("pdftoppm"), "-r", str(dpi), "-f", str(page_no), "-l", str(page_no),
+        "-x", str(x), "-y", str(y), "-W", str(width), "-H", str(height), pdf_path
+    ]
+    # Without an output root pdftoppm writes the single page to stdout as PPM
+    output = subprocess.run(command, capture_output=True, check=True, timeout=120).stdout
+    image = Image.open(io.BytesIO(output))
+    image.load()
+    return image
+
+
+def _render_pdf_page(pdf_path: str, page_no: int, dpi: int, header_dpi: int = None, header_bottom: Callable[[int], int] = None):
+    started = time.perf_counter()
+    pages = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_no,
+        last_page=page_no,
+        poppler_path=_poppler_path()
+    )
+    if not pages:
+        return None
+    image = pages[0]
+
+    if header_dpi and header_dpi != dpi:
+        # Header band only, at the higher DPI; the rest of the page is never
+        # rasterized at that resolution
+        scale = header_dpi / dpi
+        header_w = round(image.size[0] * scale)
+        header_h = header_bottom(round(image.size[1] * scale))
+        header = render_pdf_region(pdf_path, page_no, header_dpi, header_w, header_h)
+        image.info['header_band'] = (header, scale)
+
+    image.info['render_ms'] = (time.perf_counter() - started) * 1000
+    return image
+
+
+def _iter_pdf_pages(
+    pdf_path: str,
+    dpi: int,
+    page_range: tuple = None,
+    skip_pages=frozenset(),
+    header_dpi: int = None,
+    header_bottom: Callable[[int], int] = None
+) -> Iterator[Image.Image]:
+    poppler_path = _poppler_path()
+    page_count = pdfinfo_from_path(pdf_path, poppler_path=poppler_path)["Pages"]
+
+    first_page, last_page = page_range or (1, page_count)
+    page_numbers = iter(range(first_page, min(last_page, page_count) + 1))
+    workers = max(1, settings.RENDER_WORKERS)
+
+    # Render up to `workers` pages ahead, each in its own pdftoppm process,
+    # and hand them out in page order
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+    pending = deque()
+
+    def submit_next():
+        page_no = next(page_numbers, None)
+        if page_no is None:
+            return
+        if page_no - first_page in skip_pages:
+            pending.append((page_no, None))
+        else:
+            pending.append((page_no, executor.submit(_render_pdf_page, pdf_path, page_no, dpi, header_dpi, header_bottom)))
+
+    try:
+        for _ in range(workers):
+            submit_next()
+        while pending:
+            page_no, future = pending.popleft()
+            submit_next()
+            if future is None:
+                yield None
+                continue
+            image = future.result()
+            if image is None:
+                # Skipping it would shift every later page onto the wrong index
+                raise RuntimeError(f"PDF sayfası {page_no} görüntüye dönüştürülemedi.")
+            yield image
+    finally:
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+        executor.shutdown(wait=True)
+
+
+def iter_document_pages(
+    contents: bytes,
+    filename: str,
+    dpi: int = 300,
+    page_range: tuple = None,
+    pdf_path: str = None,
+    skip_pages=frozenset(),
+    header_dpi: int = None,
+    header_bottom: Callable[[int], int] = None
+) -> Iterator[Image.Image]:
+    """
+    Yields the pages of an uploaded file as PIL images, one at a time.
+
+    PDFs are rasterized page by page with poppler, so only the page the
+    caller is currently working on is held in memory. Plain images yield a
+    single page.
+
+    page_range=(first, last) limits a PDF to those (1-based, inclusive)
+    pages. If the PDF is already on disk, pass pdf_path instead of contents
+    to avoid writing another temp copy.
+
+    Pages whose (0-based) index is in skip_pages are not rendered; None is
+    yielded in their place. A PDF page poppler renders nothing for raises
+    RuntimeError instead of being dropped.
+
+    With header_dpi, each PDF page also carries a separate render of its
+    header band at that DPI in image.info['header_band'] as (image, scale),
+    where scale = header_dpi / dpi. header_bottom(page_height) gives the
+    band's height in pixels at header_dpi.
+    """
+    if not filename.lower().endswith('.pdf'):
+        if 0 in skip_pages:
+            yield None
+            return
+        try:
+            image = Image.open(io.BytesIO(contents))
+            image.load()
+        except Exception:
+            raise UnsupportedFileError("Desteklenmeyen dosya formatı. Lütfen PDF veya görsel dosyası yükleyin.")
+        yield image
+        return
+
+    if pdf_path is not None:
+        yield from _iter_pdf_pages(pdf_path, dpi, page_range, skip_pages, header_dpi, header_bottom)
+        return
+
+    # Write the PDF once; every page render reads from the same temp file
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "upload.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(contents)
+        yield from _iter_pdf_pages(pdf_path, dpi, page_range, skip_pages, header_dpi, header_bottom)
+
+
+def count_document_pages(contents: bytes, filename: str, pdf_path: str = None) -> int:
+    """
+    Returns the number of pages an upload will produce.
+    Raises UnsupportedFileError for files that are not a readable image.
+    """
+    if not filename.lower().endswith('.pdf'):
+        try:
+            Image.open(io.BytesIO(contents)).verify()
+        except Exception:
+            raise UnsupportedFileError("Desteklenmeyen dosya formatı. Lütfen PDF veya görsel dosyası yükleyin.")
+        return 1
+
+    if pdf_path is not None:
+        return pdfinfo_from_path(pdf_path, poppler_path=_poppler_path())["Pages"]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "upload.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(contents)
+        return pdfinfo_from_path(pdf_path, poppler_path=_poppler_path())["Pages"]
+
+
+def extract_pdf_text_pages(contents: bytes, filename: str) -> list:
+    """
+    Reads the text layer of a digital PDF (e.g. exported from Word) with
+    pdftotext -layout, keeping the page layout.
+
+    Returns one entry per page: the page text, or None if the page has no
+    usable text layer (scanned page) and needs vision OCR. Returns an empty
+    list for images, when the fast path is disabled, or if pdftotext fails.
+    """
+    if not filename.lower().endswith('.pdf') or not settings.PDF_TEXT_LAYER_ENABLED:
+        return []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "upload.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(contents)
+        try:
+            # "-" writes to stdout; pages are separated by form feeds
+            output = subprocess.run(
+                [_poppler_tool("pdftotext"), "-layout", "-enc", "UTF-8", pdf_path, "-"],
+                capture_output=True, check=True, timeout=60
+            ).stdout.decode("utf-8", errors="replace")
+            page_count = pdfinfo_from_path(pdf_path, poppler_path=_poppler_path())["Pages"]
+        except Exception as e:
+            logger.warning(f"Text layer extraction failed, using vision OCR: {e}")
+            return []
+
+    pages = output.split("\f")[:page_count]
+    pages += [""] * (page_count - len(pages))
+    return [
+        text.rstrip() if len("".join(text.split())) >= settings.PDF_TEXT_LAYER_MIN_CHARS else None
+        for text in pages
+    ]
+
+
+async def run_page_pipeline(
+    contents: bytes,
+    filename: str,
+    prepare_page: Callable[[int, Image.Image], object],  # may be async
+    finish_page: Callable[[int, object], Awaitable[dict]],
+    max_in_flight: int = None,
+    dpi: int = None,
+    on_render: Callable[[int, float], None] = None,
+    page_range: tuple = None,
+    pdf_path: str = None,
+    resume_page: Callable[[int], object] = None,  # may be async
+    skip_pages=frozenset(),
+    header_dpi: int = None,
+    header_bottom: Callable[[int], int] = None
+) -> List[dict]:
+    """
+    Streams a document through a two-stage page pipeline.
+
+    prepare_page(index, image) runs for each page right after it is
+    rendered (it may be a coroutine function) and must return a compact
+    payload (e.g. the encoded OCR image) without keeping a reference to the
+    full-resolution image.
+    finish_page(index, payload) runs concurrently for up to max_in_flight
+    pages. A new page is only rendered once a slot is free, so peak memory
+    is bounded by max_in_flight payloads plus one page being prepared,
+    regardless of the page count (plus up to RENDER_WORKERS pages rendered
+    ahead).
+
+    on_render(index, render_ms), if given, is called after each page has
+    been rasterized (used for progress reporting). dpi defaults to
+    RENDER_BODY_DPI; page_range, pdf_path, header_dpi and header_bottom are
+    passed on to iter_document_pages.
+
+    Pages in skip_pages (e.g. restored from a checkpoint) are neither
+    rendered nor prepared; resume_page(index) supplies their payload instead.
+
+    Returns the finish_page results in page order.
+    """
+    if max_in_flight is None:
+        max_in_flight = settings.OCR_MAX_CONCURRENCY
+    if dpi is None:
+        dpi = settings.RENDER_BODY_DPI
+
+    slots = asyncio.Semaphore(max(1, max_in_flight))
+    pages = iter_document_pages(
+        contents, filename, dpi=dpi, page_range=page_range, pdf_path=pdf_path, skip_pages=skip_pages,
+        header_dpi=header_dpi, header_bottom=header_bottom
+    )
+    end = object()
+    tasks = []
+
+    async def finish(index: int, payload):
+        try:
+            return await finish_page(index, payload)
+        finally:
+            slots.release()
+
+    try:
+        index = 0
+        while True:
+            # Backpressure: do not render the next page until a slot is free
+            await slots.acquire()
+            render_started = time.perf_counter()
+            image = await asyncio.to_thread(next, pages, end)
+            if image is end:
+                slots.release()
+                break
+
+            try:
+                if image is None:
+                    payload = resume_page(index)
+                else:
+                    if on_render is not None:
+                        # Pages rendered ahead report their own render time
+                        waited_ms = (time.perf_counter() - render_started) * 1000
+                        on_render(index, image.info.get('render_ms', waited_ms))
+                    payload = prepare_page(index, image)
+                if inspect.isawaitable(payload):
+                    payload = await payload
+            except Exception:
+                slots.release()
+                raise
+            finally:
+                if image is not None:
+                    header = image.info.get('header_band')
+                    if header is not None:
+                        header[0].close()
+                    image.close()
+                del image
+
+            tasks.append(asyncio.create_task(finish(index, payload)))
+            index += 1
+
+        return list(await asyncio.gather(*tasks))
+
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    finally:
+        pages.close()
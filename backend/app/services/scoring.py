@@ -3,71 +3,58 @@ Hybrid Scoring Module
 Combines BERTurk similarity (SBERT) with OpenAI GPT-4o-mini analysis
 """
 
+import hashlib
 import logging
 import json
-import re
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+import time
+from functools import lru_cache
 
-logger = logging.getLogger(__name__)
-
-# Load environment variables
-current_dir = os.path.dirname(os.path.abspath(__file__))
-load_dotenv(os.path.join(current_dir, '..', '..', '.env'))
-
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    logger.error("OPENAI_API_KEY not found in environment variables!")
+from app.core.config import settings
+from app.services.grading_cache import get_grading_cache, make_grading_key
+from app.services.grading_cascade import record_max_points, settle_locally
+from app.services.openai_client import create_chat_completion, is_rate_limit_error, retry_delay
 
-def get_openai_client():
-    return OpenAI(api_key=api_key)
+logger = logging.getLogger(__name__)
 
+GRADING_MODEL = "gpt-4o-mini"
 
-def analyze_with_openai(ideal_cevap: str, ogrenci_cevabi: str, soru_metni: str = "", answer_key_text: str = None, rubric_text: str = None, bert_score: float = 0.0, soru_no: int = 1) -> dict:
-    import time
-    import random
 
-    max_retries = 3
-    base_delay = 5  # seconds
-
-    for attempt in range(max_retries + 1):
-        try:
-            client = get_openai_client()
-            
-            # Determine sources
-            source_key = f"""
+def _exam_sources(answer_key_text: str = None, rubric_text: str = None, per_question_key: str = "") -> str:
+    """Answer key and rubric block of the static prompt prefix."""
+    source_key = f"""
         1) CEVAP ANAHTARI (ANSWER_KEY_TEXT):
-        {answer_key_text if answer_key_text else ideal_cevap}
+        {answer_key_text if answer_key_text else per_question_key}
         (Bu metin, değerlendirmede birincil doğruluk kaynağıdır.)"""
 
-            source_rubric = f"""
+    source_rubric = f"""
         2) RUBRİK (RUBRIC_TEXT):
         {rubric_text if rubric_text else 'Genel değerlendirme yap.'}"""
 
-            system_prompt = f"""
-    Sen, aşağıdaki "KESİN KURALLAR"a sıkı sıkıya bağlı kalarak sınav kağıdı okuyan profesyonel bir eğitimcisin.
-    Amacın öğrencinin notunu bol keseden vermek DEĞİL, rubrikte belirtilen kriterlere göre kılı kırk yaran bir değerlendirme yapmaktır.
-    """
-
-            user_prompt = f"""
-    ## BAĞLAM
-    Değerlendirilen Soru Numarası: {soru_no}
-    Soru Metni: "{soru_metni}"
-
+    return f"""
     ## KAYNAKLAR
     {source_key}
     {source_rubric}
+    """
 
-    ## ÖĞRENCİ CEVABI
-    "{ogrenci_cevabi}"
 
-    ## SBERT SEMANTİK SKORU: {bert_score:.2f}
+def build_question_prompts(ideal_cevap: str, ogrenci_cevabi: str, soru_metni: str = "", answer_key_text: str = None, rubric_text: str = None, bert_score: float = 0.0, soru_no: int = 1):
+    """
+    System and user prompt of a single-question grading call.
+
+    The system prompt holds everything that is the same for every student of
+    an exam (rules, output format, answer key, rubric) and is byte-identical
+    across calls, so the provider can serve it from its prompt cache. The
+    user prompt holds the per-question and per-student part.
+    """
+    system_prompt = f"""
+    Sen, aşağıdaki "KESİN KURALLAR"a sıkı sıkıya bağlı kalarak sınav kağıdı okuyan profesyonel bir eğitimcisin.
+    Amacın öğrencinin notunu bol keseden vermek DEĞİL, rubrikte belirtilen kriterlere göre kılı kırk yaran bir değerlendirme yapmaktır.
 
     ## KESİN KURALLAR VE GÖREVLER (MUTLAKA UYULACAK)
 
     1. **PUAN AĞIRLIĞI TESPİTİ:**
-       - Rubrik metnini incele ve SADECE "Soru {soru_no}" için belirlenmiş puan değerini (Ağırlığını) bul (Örn: "Soru {soru_no}: 30 Puan" veya "%30").
+       - Rubrik metnini incele ve SADECE "BAĞLAM" bölümündeki soru numarası için belirlenmiş puan değerini (Ağırlığını) bul (Örn: "Soru 2: 30 Puan" veya "%30").
        - Eğer rubrikte soruya özel bir ağırlık yazıyorsa (Örn: 30), BU SORUNUN "max_puan" (soru_max_puan) değeri OLMALIDIR. 
        - Eğer rubrikte açıkça bir ağırlık yoksa, varsayılan olarak 100 kabul et.
        - "toplam_puan" ASLA bu ağırlığı geçemez. (Örn: Ağırlık 30 ise, öğrenci mükemmel de yazsa max 30 alır.)
@@ -109,11 +96,36 @@ def analyze_with_openai(ideal_cevap: str, ogrenci_cevabi: str, soru_metni: str =
             }}
         ]
     }}
+    {_exam_sources(answer_key_text, rubric_text, 'Sorunun ideal cevabı "BAĞLAM" bölümünde verilmiştir.')}"""
+
+    # Per-question part first (shared by every student of the question), student last
+    ideal_block = "" if answer_key_text else f"""
+    İdeal Cevap: "{ideal_cevap}\""""
+
+    user_prompt = f"""
+    ## BAĞLAM
+    Değerlendirilen Soru Numarası: {soru_no}
+    Soru Metni: "{soru_metni}"{ideal_block}
+
+    ## ÖĞRENCİ CEVABI
+    "{ogrenci_cevabi}"
+
+    ## SBERT SEMANTİK SKORU: {bert_score:.2f}
     """
-            
+    return system_prompt, user_prompt
+
+
+def analyze_with_openai(ideal_cevap: str, ogrenci_cevabi: str, soru_metni: str = "", answer_key_text: str = None, rubric_text: str = None, bert_score: float = 0.0, soru_no: int = 1) -> dict:
+    max_retries = 3
+    base_delay = 5  # seconds
+
+    for attempt in range(max_retries + 1):
+        try:
+            system_prompt, user_prompt = build_question_prompts(ideal_cevap, ogrenci_cevabi, soru_metni, answer_key_text, rubric_text, bert_score, soru_no)
+
             # Using GPT-4o-mini for cost-effective reasoning
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
+            response, usage = _create_completion(
+                model=GRADING_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
@@ -140,29 +152,25 @@ def analyze_with_openai(ideal_cevap: str, ogrenci_cevabi: str, soru_metni: str =
             return {
                 'llm_skoru': llm_skoru,
                 'max_puan': max_puan,
-                'yorum': genel_yorum
+                'yorum': genel_yorum,
+                'kriterler': kriterler,
+                'usage': usage
             }
                 
         except Exception as e:
-
-            error_msg = str(e)
-            if "500" in error_msg or "internal" in error_msg.lower():
-                wait_time = 20
-                logger.warning(f"Internal Server Error (500). Retrying in {wait_time}s... (Attempt {attempt+1}/{max_retries})")
+            wait_time = retry_delay(e, attempt, max_retries, base_delay, model=GRADING_MODEL)
+            if wait_time is not None:
                 time.sleep(wait_time)
                 continue
-            elif "429" in error_msg or "rate limit" in error_msg.lower():
-                wait_time = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                logger.warning(f"Rate limit hit. Retrying in {wait_time:.2f}s... (Attempt {attempt+1}/{max_retries})")
-                time.sleep(wait_time)
-                continue
-            else:
-                logger.error(f"OpenAI analysis failed: {e}")
-                return {
-                    'llm_skoru': 0.0,
-                    'max_puan': 100, # Default to 100 on hard error
-                    'yorum': f"Analiz hatası (GPT-4o-mini): {str(e)}"
-                }
+
+            if is_rate_limit_error(e):
+                break
+            logger.error(f"OpenAI analysis failed: {e}")
+            return {
+                'llm_skoru': 0.0,
+                'max_puan': 100, # Default to 100 on hard error
+                'yorum': f"Analiz hatası (GPT-4o-mini): {str(e)}"
+            }
     
     # If loops ends without success
     return {
@@ -172,6 +180,397 @@ def analyze_with_openai(ideal_cevap: str, ogrenci_cevabi: str, soru_metni: str =
     }
 
 
+def _usage(response) -> dict:
+    """Token counts of a completion; cached_tokens is the part served from the provider's prompt cache."""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return {'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'prompt_tokens': usage.prompt_tokens or 0,
+        'cached_tokens': (getattr(details, 'cached_tokens', 0) or 0) if details is not None else 0,
+        'completion_tokens': usage.completion_tokens or 0
+    }
+
+
+class PromptCacheStats:
+    """
+    Process-wide token and latency totals of the grading calls, split by
+    whether the provider served part of the prompt from its cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.cached_calls = 0
+            self.prompt_tokens = 0
+            self.cached_tokens = 0
+            self.completion_tokens = 0
+            self._latency_ms = {True: 0.0, False: 0.0}
+
+    def record(self, usage: dict, latency_ms: float):
+        cached = usage['cached_tokens'] > 0
+        with self._lock:
+            self.calls += 1
+            self.cached_calls += int(cached)
+            self.prompt_tokens += usage['prompt_tokens']
+            self.cached_tokens += usage['cached_tokens']
+            self.completion_tokens += usage['completion_tokens']
+            self._latency_ms[cached] += latency_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            uncached_calls = self.calls - self.cached_calls
+            return {
+                "calls": self.calls,
+                "cached_calls": self.cached_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_tokens,
+                "uncached_prompt_tokens": self.prompt_tokens - self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_token_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+                "avg_latency_ms_cached": round(self._latency_ms[True] / self.cached_calls, 1) if self.cached_calls else None,
+                "avg_latency_ms_uncached": round(self._latency_ms[False] / uncached_calls, 1) if uncached_calls else None
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
+
+
+def _create_completion(**kwargs):
+    """Grading call on the shared client, with usage recorded in prompt_cache_stats."""
+    started = time.perf_counter()
+    response = create_chat_completion(**kwargs)
+    usage = _usage(response)
+    prompt_cache_stats.record(usage, (time.perf_counter() - started) * 1000)
+    return response, usage
+
+
+# Rough size of one question's JSON verdict (comment + criteria) in the paper call
+PAPER_OUTPUT_TOKENS_PER_QUESTION = 700
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token count of a prompt (Turkish text averages ~3 characters per token)."""
+    return len(text) // 3 + 1
+
+
+def build_paper_prompts(questions: list, answer_key_text: str = None, rubric_text: str = None):
+    """
+    System and user prompt grading every question of one paper in one call.
+    questions: dicts with soru_no, soru_metni, ogrenci_cevabi and ideal_cevap.
+    As in build_question_prompts, the system prompt is the static exam prefix.
+    """
+    question_blocks = []
+    for question in questions:
+        block = f"""
+    ### Soru {question['soru_no']}
+    Soru Metni: "{question.get('soru_metni', '')}\""""
+        if not answer_key_text:
+            block += f"""
+    İdeal Cevap: "{question.get('ideal_cevap', '')}\""""
+        block += f"""
+    Öğrenci Cevabı: "{question.get('ogrenci_cevabi', '')}\""""
+        question_blocks.append(block)
+
+    system_prompt = f"""
+    Sen, aşağıdaki "KESİN KURALLAR"a sıkı sıkıya bağlı kalarak sınav kağıdı okuyan profesyonel bir eğitimcisin.
+    Amacın öğrencinin notunu bol keseden vermek DEĞİL, rubrikte belirtilen kriterlere göre kılı kırk yaran bir değerlendirme yapmaktır.
+    Bir öğrencinin sınav kağıdındaki soruların TAMAMINI tek seferde değerlendireceksin.
+    Her soruyu DİĞERLERİNDEN BAĞIMSIZ olarak, kendi cevabı ve rubrikteki kendi maddesine göre puanla.
+
+    ## KESİN KURALLAR VE GÖREVLER (MUTLAKA UYULACAK)
+
+    1. **PUAN AĞIRLIĞI TESPİTİ:**
+       - Her soru için rubrik metninde SADECE o soruya ait puan değerini (Ağırlığını) bul (Örn: "Soru 2: 30 Puan" veya "%30").
+       - Eğer rubrikte soruya özel bir ağırlık yazıyorsa (Örn: 30), O SORUNUN "soru_max_puan" değeri OLMALIDIR.
+       - Eğer rubrikte açıkça bir ağırlık yoksa, varsayılan olarak 100 kabul et.
+       - "toplam_puan" ASLA o sorunun ağırlığını geçemez.
+
+    2. **KAVRAMSAL DOĞRULUK (HARD GATE):**
+       - Öğrencinin cevabı temel kavramı yanlış tanımlıyorsa veya konuyla alakasız bir alandan bahsediyorsa:
+         - O soru için **PUAN = 0**
+         - Dil bilgisi, açıklık, yapı vb. için ASLA kısmi puan verme. Doğrudan 0 ver.
+         - Yorumda "Kavramsal Doğruluk hatası nedeniyle puan verilmemiştir" diye belirt.
+
+    3. **PUANLAMA MANTIĞI (ÖNEMLİ):**
+       - **ANLAMSAL EŞDEĞERLİK ESASTIR:** Öğrencinin cevabı, kelime kelime Cevap Anahtarı ile aynı olmak zorunda değildir.
+       - **ANLAMSAL OLARAK (SEMANTİK) AYNI KAPIYA ÇIKIYORSA, aynı mantığı ve sonucu doğru bir şekilde veriyorsa TAM PUAN ver.**
+       - Sadece ezberlenmiş anahtar kelimeleri arama; mantıksal kurguyu ve sonucun doğruluğunu puanla.
+       - Bir sorunun cevabını başka bir sorunun puanına ASLA taşıma.
+       - Varsa rubrikteki alt kırılımlara (Grammar, Clarity, vb.) bak.
+
+    4. **DETAYLI GERİ BİLDİRİM VE ÇIKTI:**
+       - JSON formatında çıktı ver; verilen HER soru için "sorular" listesinde tam olarak bir kayıt olmalı.
+       - Her yorumda: öğrenci neyi doğru yapmış, neden puan kırdın, doğrusu ne olmalıydı açıkla.
+       - **Üslup:** Objektif, yapıcı ve açıklayıcı bir öğretmen dili kullan.
+
+    ## ÇIKTI FORMATI (JSON)
+    {{
+        "sorular": [
+            {{
+                "soru_no": (int) "Sorunun numarası",
+                "toplam_puan": (float) "Öğrencinin aldığı puan (Ağırlıklandırılmış, Örn: 15.0)",
+                "soru_max_puan": (float) "Bu sorunun sınavdaki ağırlığı/maks puanı (Örn: 30.0)",
+                "genel_yorum": "Rubrik dayanaklı geri bildirim.",
+                "eksikler": ["Eksik 1", "Eksik 2"],
+                "kriterler": [
+                    {{
+                        "kriter_tanimi": "Kriter Adı",
+                        "alinan_puan": (float),
+                        "max_puan": (float)
+                    }}
+                ]
+            }}
+        ]
+    }}
+    {_exam_sources(answer_key_text, rubric_text, 'Her sorunun ideal cevabı, sorunun altında "İdeal Cevap" olarak verilmiştir.')}"""
+
+    user_prompt = f"""
+    ## SORULAR VE ÖĞRENCİ CEVAPLARI ({len(questions)} soru)
+    {"".join(question_blocks)}
+    """
+    return system_prompt, user_prompt
+
+
+def paper_fits_budget(questions: list, answer_key_text: str = None, rubric_text: str = None) -> bool:
+    """Whether one call can hold the whole paper (prompt + expected verdicts)."""
+    system_prompt, user_prompt = build_paper_prompts(questions, answer_key_text, rubric_text)
+    output_tokens = PAPER_OUTPUT_TOKENS_PER_QUESTION * len(questions)
+    prompt_tokens = estimate_text_tokens(system_prompt + user_prompt)
+    return (output_tokens <= settings.PAPER_GRADING_MAX_OUTPUT_TOKENS
+            and prompt_tokens + output_tokens <= settings.PAPER_GRADING_TOKEN_BUDGET)
+
+
+def analyze_paper_with_openai(questions: list, answer_key_text: str = None, rubric_text: str = None):
+    """
+    Grades all questions in one structured JSON call.
+    Returns ({soru_no: analyze_with_openai-style result}, usage), or (None, usage)
+    when the call failed so the caller can grade per question.
+    """
+    max_retries = 3
+    base_delay = 5  # seconds
+    usage = {'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+    system_prompt, user_prompt = build_paper_prompts(questions, answer_key_text, rubric_text)
+
+    for attempt in range(max_retries + 1):
+        try:
+            response, usage = _create_completion(
+                model=GRADING_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=settings.PAPER_GRADING_MAX_OUTPUT_TOKENS,
+                temperature=0.0
+            )
+            result = json.loads(response.choices[0].message.content)
+
+            analyses = {}
+            for entry in result.get('sorular', []):
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    soru_no = int(entry.get('soru_no'))
+                except (TypeError, ValueError):
+                    continue
+                max_puan = float(entry.get('soru_max_puan', 0) or 0)
+                analyses[soru_no] = {
+                    'llm_skoru': float(entry.get('toplam_puan', 0) or 0),
+                    'max_puan': max_puan if max_puan else 100,
+                    'yorum': entry.get('genel_yorum', ''),
+                    'kriterler': entry.get('kriterler', [])
+                }
+            logger.info(f"GPT-4o-mini paper analysis complete: {len(analyses)}/{len(questions)} questions")
+            return analyses, usage
+
+        except Exception as e:
+            wait_time = retry_delay(e, attempt, max_retries, base_delay, model=GRADING_MODEL)
+            if wait_time is None:
+                logger.error(f"OpenAI paper analysis failed: {e}")
+                return None, usage
+            time.sleep(wait_time)
+
+    return None, usage
+
+
+@lru_cache(maxsize=None)
+def grading_prompt_version(kind: str = "question") -> str:
+    """
+    Fingerprint of the prompt template ("question" or "paper"), part of the
+    grading cache key: editing the prompt text invalidates cached grades.
+    Built from the prompts for placeholder inputs, with and without an
+    answer key.
+    """
+    if kind == "paper":
+        question = [{'soru_no': 0, 'soru_metni': "\x00", 'ideal_cevap': "\x01", 'ogrenci_cevabi': "\x02"}]
+        variants = [build_paper_prompts(question, key, "\x04") for key in (None, "\x03")]
+    else:
+        variants = [build_question_prompts("\x01", "\x02", "\x00", key, "\x04", 0.0, 0) for key in (None, "\x03")]
+    text = "\x1e".join(part for prompts in variants for part in prompts)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _grading_cache_key(kind: str, question: dict, answer_key_text: str = None, rubric_text: str = None) -> str:
+    return make_grading_key(
+        GRADING_MODEL, grading_prompt_version(kind), question.get('soru_no', 1), question.get('soru_metni', ''),
+        question.get('ideal_cevap', ''), question.get('anahtar_kelimeler', ''), answer_key_text, rubric_text,
+        question.get('ogrenci_cevabi', '')
+    )
+
+
+def _cached_grade(cache, key: str):
+    """Cached evaluate_answer result for key (marked 'cached'), or None."""
+    if cache is None:
+        return None
+    try:
+        result = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Grading cache lookup failed: {e}")
+        return None
+    if result is None:
+        return None
+    return {**result, 'cached': True}
+
+
+def _store_grade(cache, key: str, result: dict):
+    if cache is None:
+        return
+    try:
+        cache.put(key, {k: v for k, v in result.items() if k not in ('usage', 'cached')})
+    except Exception as e:
+        logger.warning(f"Grading cache write failed: {e}")
+
+
+def _note_max_points(question: dict, result: dict, answer_key_text: str = None, rubric_text: str = None):
+    """Tells the cascade a question's max_puan once an LLM grade has shown it."""
+    if settings.GRADING_CASCADE_ENABLED:
+        record_max_points(question, result['max_puan'], answer_key_text, rubric_text)
+
+
+def evaluate_paper(questions: list, answer_key_text: str = None, rubric_text: str = None) -> dict:
+    """
+    Grades all questions of one student's paper in a single call.
+
+    questions: dicts with soru_no, ogrenci_cevabi and optionally soru_metni,
+    ideal_cevap, anahtar_kelimeler. Papers over the token budget, a failed
+    call and questions missing from the answer are graded per question with
+    evaluate_answer. Questions found in the grading cache or settled by the
+    grading cascade are left out of the call (stats['cache_hits'],
+    stats['local_graded']). Returns {'mode', 'results', 'stats'}; results carry the
+    evaluate_answer fields plus soru_no, in question order.
+    """
+    started = time.perf_counter()
+    cache = get_grading_cache()
+    cached = {}
+    cache_keys = {}
+    if cache is not None:
+        for q in questions:
+            cache_keys[q['soru_no']] = _grading_cache_key("paper", q, answer_key_text, rubric_text)
+            hit = _cached_grade(cache, cache_keys[q['soru_no']])
+            if hit is not None:
+                _note_max_points(q, hit, answer_key_text, rubric_text)
+                cached[q['soru_no']] = hit
+    local = {}
+    if settings.GRADING_CASCADE_ENABLED:
+        for q in questions:
+            if q['soru_no'] not in cached:
+                grade = settle_locally(q, answer_key_text, rubric_text)
+                if grade is not None:
+                    local[q['soru_no']] = grade
+    pending = [q for q in questions if q['soru_no'] not in cached and q['soru_no'] not in local]
+
+    # What the per-question prompts would cost (same estimator as the paper prompt)
+    question_estimates = {
+        q['soru_no']: estimate_text_tokens("".join(build_question_prompts(
+            q.get('ideal_cevap', ''), q.get('ogrenci_cevabi', ''), q.get('soru_metni', ''),
+            answer_key_text, rubric_text, 0.0, q['soru_no'])))
+        for q in pending
+    }
+    stats = {
+        'questions': len(questions),
+        'cache_hits': len(cached),
+        'local_graded': len(local),
+        'calls': 0,
+        'prompt_tokens': 0,
+        'cached_tokens': 0,
+        'completion_tokens': 0,
+        'estimated_question_prompt_tokens': sum(question_estimates.values()),
+        'estimated_paper_prompt_tokens': estimate_text_tokens("".join(build_paper_prompts(pending, answer_key_text, rubric_text))) if pending else 0
+    }
+
+    analyses = None
+    mode = "question"
+    if len(pending) > 1 and paper_fits_budget(pending, answer_key_text, rubric_text):
+        analyses, usage = analyze_paper_with_openai(pending, answer_key_text, rubric_text)
+        stats['calls'] += 1
+        stats['prompt_tokens'] += usage['prompt_tokens']
+        stats['cached_tokens'] += usage['cached_tokens']
+        stats['completion_tokens'] += usage['completion_tokens']
+        if analyses is not None:
+            mode = "paper"
+    elif len(pending) > 1:
+        logger.info(f"Paper with {len(pending)} questions exceeds the grading token budget, grading per question")
+
+    results = []
+    fallbacks = 0
+    fallback_estimate = 0
+    for question in questions:
+        soru_no = question['soru_no']
+        if soru_no in cached:
+            result = cached[soru_no]
+        elif soru_no in local:
+            result = local[soru_no]
+        elif analyses is not None and soru_no in analyses:
+            result = _final_result(analyses[soru_no], 0.0, question.get('ogrenci_cevabi', ''), question.get('anahtar_kelimeler', ''))
+            result['kriterler'] = analyses[soru_no]['kriterler']
+            _note_max_points(question, result, answer_key_text, rubric_text)
+            _store_grade(cache, cache_keys.get(soru_no), result)
+            if settings.GRADING_CASCADE_ENABLED:
+                result['kademe'] = "llm"
+        else:
+            result = evaluate_answer(
+                ideal_cevap=question.get('ideal_cevap', ''),
+                ogrenci_cevabi=question.get('ogrenci_cevabi', ''),
+                soru_metni=question.get('soru_metni', ''),
+                anahtar_kelimeler=question.get('anahtar_kelimeler', ''),
+                answer_key_text=answer_key_text,
+                rubric_text=rubric_text,
+                soru_no=soru_no
+            )
+            usage = result.pop('usage', None) or {}
+            if result.get('cached'):
+                stats['cache_hits'] += 1
+            elif result.get('kademe') == "yerel":
+                stats['local_graded'] += 1
+            else:
+                stats['calls'] += 1
+            # evaluate_answer caches the grade under its own prompt version;
+            # the paper keys only ever hold analyze_paper_with_openai grades
+            stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            stats['cached_tokens'] += usage.get('cached_tokens', 0)
+            stats['completion_tokens'] += usage.get('completion_tokens', 0)
+            fallbacks += 1
+            fallback_estimate += question_estimates[soru_no]
+        results.append({'soru_no': soru_no, **result})
+
+    stats['fallback_questions'] = fallbacks if mode == "paper" else 0
+    stats['estimated_saved_prompt_tokens'] = max(
+        0, stats['estimated_question_prompt_tokens'] - stats['estimated_paper_prompt_tokens'] - fallback_estimate
+    ) if mode == "paper" else 0
+    stats['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        f"Paper graded ({mode}): {len(questions)} questions, {stats['calls']} calls, "
+        f"{stats['prompt_tokens']} prompt tokens, ~{stats['estimated_saved_prompt_tokens']} saved, {stats['latency_ms']} ms"
+    )
+    return {'mode': mode, 'results': results, 'stats': stats}
+
+
 def calculate_final_score(bert_skoru: float, llm_skoru: float, max_puan: float = 100.0) -> float:
     """
     Returns the LLM calculated score, respecting the max_puan limit.
@@ -192,8 +591,31 @@ def evaluate_answer(
 ) -> dict:
     """
     Complete evaluation pipeline: SBERT Similarity + OpenAI Analysis
+    Results are served from / stored in the grading cache; a cached result
+    has 'cached': True and no usage. Failed calls are never cached.
+    With GRADING_CASCADE_ENABLED, clear-cut answers are graded locally
+    (grading_cascade, 'kademe': 'yerel' with a 'guven' confidence) and only
+    the rest by the LLM ('kademe': 'llm').
     """
-    from app.services.similarity import calculate_bert_score, calculate_keyword_score
+    question = {
+        'soru_no': soru_no, 'soru_metni': soru_metni, 'ideal_cevap': ideal_cevap,
+        'anahtar_kelimeler': anahtar_kelimeler, 'ogrenci_cevabi': ogrenci_cevabi
+    }
+    cache = get_grading_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = _grading_cache_key("question", question, answer_key_text, rubric_text)
+        cached = _cached_grade(cache, cache_key)
+        if cached is not None:
+            _note_max_points(question, cached, answer_key_text, rubric_text)
+            cached['usage'] = None
+            return cached
+
+    if settings.GRADING_CASCADE_ENABLED:
+        local = settle_locally(question, answer_key_text, rubric_text)
+        if local is not None:
+            local['usage'] = None
+            return local
     
     # Step 1: Calculate BERT similarity
     # SBERT DISABLED TEMPORARILY AS PER USER REQUEST
@@ -205,16 +627,31 @@ def evaluate_answer(
     
     # Step 2: Get OpenAI analysis
     openai_result = analyze_with_openai(ideal_cevap, ogrenci_cevabi, soru_metni, answer_key_text, rubric_text, bert_score=bert_percentage, soru_no=soru_no)
+
+    # Step 3: Calculate final
+    result = _final_result(openai_result, bert_skoru, ogrenci_cevabi, anahtar_kelimeler)
+    if openai_result.get('usage') is not None:
+        _note_max_points(question, result, answer_key_text, rubric_text)
+        _store_grade(cache, cache_key, result)
+    if settings.GRADING_CASCADE_ENABLED:
+        result['kademe'] = "llm"
+    result['usage'] = openai_result.get('usage')
+    return result
+
+
+def _final_result(openai_result: dict, bert_skoru: float, ogrenci_cevabi: str, anahtar_kelimeler: str = "") -> dict:
+    """Clamps the LLM score to the question's max and adds the keyword note."""
+    from app.services.similarity import calculate_keyword_score
+
     llm_skoru = openai_result['llm_skoru']
     max_puan = openai_result.get('max_puan', 100)
     yorum = openai_result['yorum']
-    
-    # Step 3: Calculate final
+
     # Ensure max_puan is valid
     if max_puan <= 0:
         max_puan = 100.0
         
-    final_puan = calculate_final_score(bert_percentage, llm_skoru, max_puan)
+    final_puan = calculate_final_score(bert_skoru * 100, llm_skoru, max_puan)
     
     # SAFETY CHECK REMOVED AS PER USER REQUEST
     # The user wants to rely on semantic evaluation by the LLM, not strict vector similarity.
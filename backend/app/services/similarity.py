@@ -46,6 +46,17 @@ def get_embeddings(text: str) -> np.ndarray:
     return model.encode(text, convert_to_numpy=True)
 
 
+def get_batch_embeddings(texts: list, batch_size: int = 64) -> np.ndarray:
+    """
+    Generate embeddings for many texts in a single encode call.
+
+    Rows are L2-normalized, so the cosine similarity of two texts is the dot
+    product of their rows.
+    """
+    model = get_model()
+    return model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+
+
 def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
     """
     Calculate cosine similarity between two vectors.
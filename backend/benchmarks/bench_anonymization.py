@@ -0,0 +1,143 @@
+"""
+Anonymization Benchmark
+Per-page CPU timings of anonymize_student_data_local with EasyOCR reading
+the whole page (old behaviour) vs. only the header band, at one or more
+header scales. With --template, the pages are then run through the upload
+pipeline's anonymize_page with layout templates enabled (pages of the same
+exam form after the first ANON_TEMPLATE_MIN_PAGES skip text detection).
+
+Run from the backend/ directory (forces EasyOCR onto the CPU):
+    python -m benchmarks.bench_anonymization samples/ --scales 1.0 0.5
+    python -m benchmarks.bench_anonymization samples/ --template
+
+`samples/` holds page images (png/jpg) or PDFs (every page is used).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_pages(sample_dir: str):
+    from app.services.pipeline import iter_document_pages
+
+    pages = []
+    for name in sorted(os.listdir(sample_dir)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".pdf")):
+            continue
+        with open(os.path.join(sample_dir, name), "rb") as f:
+            contents = f.read()
+        for i, page in enumerate(iter_document_pages(contents, name)):
+            pages.append((f"{name}#{i + 1}", page.convert("RGB")))
+    return pages
+
+
+def time_page(anonymize, image, **kwargs):
+    started = time.perf_counter()
+    _, data = anonymize(image, **kwargs)
+    return (time.perf_counter() - started) * 1000, data
+
+
+def run_template_pass(pages, reference: dict):
+    """Per-page timings of anonymize_page with layout templates, in page order."""
+    import asyncio
+    from app.core.config import settings
+    from app.services import anonymizer_pool
+    from app.services.layout_template import get_layout_templates
+
+    settings.ANON_POOL_SIZE = 0
+    settings.ANON_LAYOUT_TEMPLATES = True
+    store = get_layout_templates()
+
+    async def run(need_values: bool):
+        rows = []
+        for name, image in pages:
+            hits_before = store.hits
+            started = time.perf_counter()
+            _, data = await anonymizer_pool.anonymize_page(image.copy(), need_values=need_values)
+            ms = (time.perf_counter() - started) * 1000
+            hit = store.hits > hits_before
+            rows.append((name, ms, hit, not need_values or data == reference[name]))
+        return rows
+
+    with_values = asyncio.run(run(True))
+    # Second pass: the name/number is already known, as on a student's later pages
+    redact_only = asyncio.run(run(False))
+
+    print()
+    print(f"{'page':<28}{'mode':>12}{'with values':>14}{'redact only':>14}   fields match")
+    for (name, ms, hit, match), (_, ms_only, hit_only, _) in zip(with_values, redact_only):
+        mode = "template" if hit else "detection"
+        print(f"{name[:28]:<28}{mode:>12}{ms:>12.0f}ms{ms_only:>12.0f}ms   {'y' if match else 'n'}")
+
+    detection = [ms for _, ms, hit, _ in with_values if not hit]
+    template = [ms for _, ms, hit, _ in with_values if hit]
+    template_only = [ms for _, ms, hit, _ in redact_only if hit]
+    print()
+    print(f"template store: {store.stats()}")
+    if detection and template:
+        base = statistics.mean(detection)
+        print(f"{'detection':<16} mean {base:>8.0f} ms/page")
+        print(f"{'template+values':<16} mean {statistics.mean(template):>8.0f} ms/page   ({base / statistics.mean(template):.1f}x)")
+    if detection and template_only:
+        print(f"{'template only':<16} mean {statistics.mean(template_only):>8.0f} ms/page   ({statistics.mean(detection) / statistics.mean(template_only):.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="Directory with sample pages")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5])
+    parser.add_argument("--template", action="store_true", help="Also measure layout-template reuse")
+    args = parser.parse_args()
+
+    # Load EasyOCR on the CPU before app.services.ocr creates its reader
+    import easyocr
+    from app.services import ocr
+    ocr.reader = easyocr.Reader(['tr', 'en'], gpu=False)
+
+    pages = load_pages(args.samples)
+    if not pages:
+        print("No samples found.")
+        return
+
+    # Warm-up so model initialisation is not counted against the first page
+    ocr.anonymize_student_data_local(pages[0][1])
+
+    columns = ["full page"] + [f"header x{scale:g}" for scale in args.scales]
+    print(f"{'page':<28}" + "".join(f"{c:>16}" for c in columns) + "   fields match")
+    print("-" * (28 + 16 * len(columns) + 15))
+
+    timings = {c: [] for c in columns}
+    reference = {}
+    for name, image in pages:
+        full_ms, full_data = time_page(ocr.anonymize_student_data_local, image, header_only=False)
+        timings["full page"].append(full_ms)
+        row = f"{name[:28]:<28}{full_ms:>14.0f}ms"
+        matches = []
+        for scale, column in zip(args.scales, columns[1:]):
+            ocr.settings.ANON_HEADER_SCALE = scale
+            ms, data = time_page(ocr.anonymize_student_data_local, image, header_only=True)
+            timings[column].append(ms)
+            row += f"{ms:>14.0f}ms"
+            matches.append("y" if data == full_data else "n")
+            if scale == args.scales[0]:
+                reference[name] = data
+        print(row + "   " + " ".join(matches))
+
+    print()
+    base = statistics.mean(timings["full page"])
+    for column in columns:
+        mean = statistics.mean(timings[column])
+        print(f"{column:<16} mean {mean:>8.0f} ms/page   ({base / mean:.1f}x vs full page)")
+
+    if args.template:
+        ocr.settings.ANON_HEADER_SCALE = args.scales[0]
+        run_template_pass(pages, reference)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Semantic Answer Clustering Benchmark
+How many grading calls answer clustering saves on a class file, for one or
+more cosine thresholds. Without --grade only the answers are embedded and
+clustered (sentence-transformer model, no API calls). With --grade the
+class is graded through batch_grading.grade_class with clustering and
+--spot-checks members per cluster graded on their own, and the drift
+between propagated and individually graded scores is reported. Uses the
+real OpenAI API in that case; the grading cache is disabled so every call
+is counted. Results are not saved.
+
+The class file has the bench_batch_grading format:
+    {"answer_key_text": "...", "rubric_text": "...",
+     "ogrenciler": [{"ogrenci_id": "1", "cevaplar": [{"soru_no": 1, "ogrenci_cevabi": "..."}]}]}
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_answer_clustering class.json --thresholds 0.85 0.9 0.95 --grade
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def answers_by_question(data: dict) -> dict:
+    by_question = {}
+    for student in data["ogrenciler"]:
+        for cevap in student["cevaplar"]:
+            by_question.setdefault(cevap["soru_no"], []).append(cevap.get("ogrenci_cevabi") or "")
+    return by_question
+
+
+async def grade(data: dict):
+    from app.services.batch_grading import grade_class
+    from app.services.live_grading import GradingContext
+
+    context = GradingContext(answer_key_text=data.get("answer_key_text"), rubric_text=data.get("rubric_text"))
+    async for event in grade_class(context, data["ogrenciler"], save=False, cluster=True):
+        if event["type"] == "summary":
+            return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("class_file", help="Class JSON file")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.85, 0.9, 0.95])
+    parser.add_argument("--spot-checks", type=int, default=2, help="Members per cluster graded on their own")
+    parser.add_argument("--grade", action="store_true", help="Grade the class with the real API")
+    args = parser.parse_args()
+
+    with open(args.class_file, encoding="utf-8") as f:
+        data = json.load(f)
+
+    from app.core.config import settings
+    from app.services.answer_clustering import cluster_answers
+
+    by_question = answers_by_question(data)
+    answers = sum(len(texts) for texts in by_question.values())
+    print(f"{'threshold':>10}{'answers':>9}{'clusters':>10}{'calls saved':>13}{'cluster s':>11}")
+    for threshold in args.thresholds:
+        started = time.perf_counter()
+        clusters = sum(len(cluster_answers(texts, threshold)) for texts in by_question.values())
+        elapsed = time.perf_counter() - started
+        print(f"{threshold:>10.2f}{answers:>9}{clusters:>10}{answers - clusters:>13}{elapsed:>11.2f}")
+
+    if not args.grade:
+        return
+
+    settings.GRADING_CACHE_ENABLED = False
+    settings.ANSWER_CLUSTERING_SPOT_CHECKS = args.spot_checks
+    print(f"\n{'threshold':>10}{'calls':>7}{'saved':>7}{'checked':>9}{'mean drift':>12}{'max drift':>11}{'drift %':>9}{'total s':>9}")
+    for threshold in args.thresholds:
+        settings.ANSWER_CLUSTERING_THRESHOLD = threshold
+        summary = asyncio.run(grade(data))
+        report = summary["clustering"]
+        ratio = report["mean_drift_ratio"]
+        print(f"{threshold:>10.2f}{report['llm_calls']:>7}{report['calls_saved']:>7}{report['spot_checked']:>9}"
+              f"{report['mean_abs_drift'] if report['mean_abs_drift'] is not None else '-':>12}"
+              f"{report['max_abs_drift'] if report['max_abs_drift'] is not None else '-':>11}"
+              f"{f'{ratio:.1%}' if ratio is not None else '-':>9}{summary['elapsed_s']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
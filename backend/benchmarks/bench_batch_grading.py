@@ -0,0 +1,64 @@
+"""
+Class-Level Batch Grading Benchmark
+Grades a class with batch_grading.grade_class (what /api/puanla-toplu
+streams) and reports time to first result, total time and answers/minute
+for one or more in-flight limits. --concurrency 1 approximates the old
+one-answer-per-request flow. Results are not saved. Uses the real OpenAI
+API (one grading call per answer per run).
+
+The class file is JSON:
+    {"answer_key_text": "...", "rubric_text": "...",
+     "ogrenciler": [{"ogrenci_id": "1", "cevaplar": [{"soru_no": 1, "ogrenci_cevabi": "..."}]}]}
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_batch_grading class.json --concurrency 1 8 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def run(data: dict, concurrency: int):
+    from app.core.config import settings
+    from app.services import batch_grading
+    from app.services.live_grading import GradingContext
+
+    settings.BATCH_GRADING_CONCURRENCY = concurrency
+    batch_grading._executor = None  # rebuilt with the new pool size
+
+    context = GradingContext(answer_key_text=data.get("answer_key_text"), rubric_text=data.get("rubric_text"))
+    started = time.perf_counter()
+    first = None
+    summary = None
+    async for event in batch_grading.grade_class(context, data["ogrenciler"], save=False):
+        if event["type"] == "result" and first is None:
+            first = time.perf_counter() - started
+        if event["type"] == "summary":
+            summary = event
+    return first, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("class_file", help="Class JSON file")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    args = parser.parse_args()
+
+    with open(args.class_file, encoding="utf-8") as f:
+        data = json.load(f)
+
+    print(f"{'in flight':>10}{'answers':>9}{'errors':>8}{'first s':>9}{'total s':>9}{'answers/min':>13}")
+    for concurrency in args.concurrency:
+        first, summary = asyncio.run(run(data, concurrency))
+        print(f"{concurrency:>10}{summary['answers']:>9}{summary['errors']:>8}{(first or 0):>9.2f}"
+              f"{summary['elapsed_s']:>9.2f}{summary['answers_per_minute'] or 0:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
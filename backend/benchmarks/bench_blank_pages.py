@@ -0,0 +1,93 @@
+"""
+Blank Page Detection Benchmark
+Measures the blank-page pre-filter on a labelled sample set:
+
+    samples/blank/     pages that may be skipped (blank backs, empty continuation pages)
+    samples/content/   pages that must be processed (anything with an answer)
+
+Reports the false-skip rate (content pages that would be skipped - these
+lose answers), the share of blank pages caught, and the check's cost per
+page, for the current BLANK_* settings and a sweep of BLANK_MAX_INK_RATIO.
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_blank_pages samples/ --ratios 0.0002 0.0005 0.001
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_pages(directory: str, dpi: int):
+    from app.services.pipeline import iter_document_pages
+
+    pages = []
+    if not os.path.isdir(directory):
+        return pages
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".pdf")):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            contents = f.read()
+        for i, page in enumerate(iter_document_pages(contents, name, dpi=dpi)):
+            pages.append((f"{name}#{i + 1}", page))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="Directory with blank/ and content/ subdirectories")
+    parser.add_argument("--dpi", type=int, default=None, help="Render DPI for PDFs (default RENDER_BODY_DPI)")
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0.0002, 0.0005, 0.001])
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.services.blank_pages import blank_page_reason
+
+    dpi = args.dpi or settings.RENDER_BODY_DPI
+    labelled = [(True, p) for p in load_pages(os.path.join(args.samples, "blank"), dpi)]
+    labelled += [(False, p) for p in load_pages(os.path.join(args.samples, "content"), dpi)]
+    blank_total = sum(1 for is_blank, _ in labelled if is_blank)
+    content_total = len(labelled) - blank_total
+    if not labelled:
+        print("No samples found.")
+        return
+
+    def evaluate(ratio: float, verbose: bool = False):
+        settings.BLANK_MAX_INK_RATIO = ratio
+        false_skips, caught, timings = [], 0, []
+        for is_blank, (name, page) in labelled:
+            started = time.perf_counter()
+            reason = blank_page_reason(page)
+            timings.append((time.perf_counter() - started) * 1000)
+            if reason and is_blank:
+                caught += 1
+            elif reason:
+                false_skips.append((name, reason))
+        if verbose:
+            for name, reason in false_skips:
+                print(f"  false skip: {name} ({reason['reason']}, ink {reason['ink_ratio']}, largest mark {reason['largest_mark']}px)")
+        return false_skips, caught, statistics.mean(timings)
+
+    print(f"{blank_total} blank / {content_total} content page(s) at {dpi} DPI, "
+          f"BLANK_MAX_COMPONENT_PX={settings.BLANK_MAX_COMPONENT_PX}")
+    print(f"{'max ink ratio':<15}{'false skips':>13}{'false-skip %':>14}{'blanks caught':>15}{'ms/page':>9}")
+
+    configured = settings.BLANK_MAX_INK_RATIO
+    for ratio in sorted(set(args.ratios) | {configured}):
+        false_skips, caught, ms = evaluate(ratio)
+        rate = len(false_skips) / content_total * 100 if content_total else 0.0
+        recall = f"{caught}/{blank_total}"
+        marker = " *" if ratio == configured else ""
+        print(f"{ratio:<15g}{len(false_skips):>13}{rate:>13.2f}%{recall:>15}{ms:>9.1f}{marker}")
+
+    print("\n* current setting")
+    evaluate(configured, verbose=True)
+
+
+if __name__ == "__main__":
+    main()
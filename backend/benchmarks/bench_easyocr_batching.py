@@ -0,0 +1,102 @@
+"""
+EasyOCR Batching Benchmark
+Header-band detection throughput (pages/sec on the CPU) with one
+readtext call per page vs. readtext_batched over batches of pages, as the
+anonymizer pool does with ANON_BATCH_SIZE.
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_easyocr_batching samples/ --batch-sizes 2 4 8
+
+`samples/` holds page images (png/jpg) or PDFs (every page is used); the
+pages are cycled until --pages pages are available.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_bands(sample_dir: str, count: int):
+    from app.services.ocr import header_band_array
+    from app.services.pipeline import iter_document_pages
+
+    bands = []
+    for name in sorted(os.listdir(sample_dir)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".pdf")):
+            continue
+        with open(os.path.join(sample_dir, name), "rb") as f:
+            contents = f.read()
+        for page in iter_document_pages(contents, name):
+            band, header_limit = header_band_array(page)
+            bands.append((band, page.size[0], header_limit))
+    if not bands:
+        return []
+    return [bands[i % len(bands)] for i in range(count)]
+
+
+def run_unbatched(bands, scale: float):
+    from app.services import ocr
+
+    return [
+        ocr.detect_student_fields(ocr.read_header_band(band, scale), img_w, header_limit)
+        for band, img_w, header_limit in bands
+    ]
+
+
+def run_batched(bands, scale: float, batch_size: int):
+    from app.services import ocr
+
+    results = []
+    for start in range(0, len(bands), batch_size):
+        group = bands[start:start + batch_size]
+        stacked = ocr.stack_header_bands([band for band, _, _ in group])
+        for found, (_, img_w, header_limit) in zip(ocr.read_header_bands(stacked, scale), group):
+            results.append(ocr.detect_student_fields(found, img_w, header_limit))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="Directory with sample pages")
+    parser.add_argument("--pages", type=int, default=16, help="Pages per run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--scale", type=float, default=1.0, help="ANON_HEADER_SCALE")
+    args = parser.parse_args()
+
+    # Load EasyOCR on the CPU before app.services.ocr creates its reader
+    import easyocr
+    import torch
+    from app.services import ocr
+    ocr.reader = easyocr.Reader(['tr', 'en'], gpu=False)
+
+    bands = load_bands(args.samples, args.pages)
+    if not bands:
+        print("No samples found.")
+        return
+
+    # Warm-up so model initialisation is not counted
+    run_unbatched(bands[:1], args.scale)
+
+    print(f"{len(bands)} pages, header band {bands[0][0].shape[1]}x{bands[0][0].shape[0]}, "
+          f"torch threads={torch.get_num_threads()}")
+    print(f"{'mode':<14}{'seconds':>10}{'pages/sec':>12}{'speedup':>10}   fields match")
+
+    started = time.perf_counter()
+    reference = run_unbatched(bands, args.scale)
+    base = time.perf_counter() - started
+    print(f"{'unbatched':<14}{base:>10.2f}{len(bands) / base:>12.2f}{1.0:>9.1f}x")
+
+    for batch_size in args.batch_sizes:
+        started = time.perf_counter()
+        results = run_batched(bands, args.scale, batch_size)
+        elapsed = time.perf_counter() - started
+        same = sum(1 for a, b in zip(results, reference) if a[1] == b[1])
+        print(f"{f'batch {batch_size}':<14}{elapsed:>10.2f}{len(bands) / elapsed:>12.2f}"
+              f"{base / elapsed:>9.1f}x   {same}/{len(bands)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Grading Cache Benchmark
+Hit rate of the grading result cache on a class file. Without --grade it
+only fingerprints the answers (no API calls): how many grading calls an
+exact-text cache and the normalized-answer cache of
+app.services.grading_cache would leave. With --grade the class is graded
+twice through batch_grading.grade_class against a fresh cache file and the
+real OpenAI API; the second pass should be served entirely from the cache.
+
+The class file has the bench_batch_grading format:
+    {"answer_key_text": "...", "rubric_text": "...",
+     "ogrenciler": [{"ogrenci_id": "1", "cevaplar": [{"soru_no": 1, "ogrenci_cevabi": "..."}]}]}
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_grading_cache class.json --grade
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fingerprint(data: dict):
+    from app.services.grading_cache import make_grading_key
+    from app.services.scoring import GRADING_MODEL, grading_prompt_version
+
+    version = grading_prompt_version("question")
+    answers = 0
+    exact = set()
+    normalized = set()
+    for student in data["ogrenciler"]:
+        for cevap in student["cevaplar"]:
+            answers += 1
+            exact.add((cevap["soru_no"], cevap.get("ogrenci_cevabi", "")))
+            normalized.add(make_grading_key(
+                GRADING_MODEL, version, cevap["soru_no"], cevap.get("soru_metni", ""), "", "",
+                data.get("answer_key_text"), data.get("rubric_text"), cevap.get("ogrenci_cevabi", "")
+            ))
+    return answers, len(exact), len(normalized)
+
+
+async def grade(data: dict):
+    from app.services.batch_grading import grade_class
+    from app.services.live_grading import GradingContext
+
+    context = GradingContext(answer_key_text=data.get("answer_key_text"), rubric_text=data.get("rubric_text"))
+    async for event in grade_class(context, data["ogrenciler"], save=False):
+        if event["type"] == "summary":
+            return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("class_file", help="Class JSON file")
+    parser.add_argument("--grade", action="store_true", help="Grade the class twice with the real API")
+    args = parser.parse_args()
+
+    with open(args.class_file, encoding="utf-8") as f:
+        data = json.load(f)
+
+    from app.core.config import settings
+
+    answers, exact, normalized = fingerprint(data)
+    print(f"{'answers':>8}{'exact keys':>12}{'normalized keys':>17}{'calls saved':>13}")
+    print(f"{answers:>8}{exact:>12}{normalized:>17}{answers - normalized:>13} ({(answers - normalized) / max(answers, 1):.0%})")
+
+    if not args.grade:
+        return
+
+    settings.GRADING_CACHE_ENABLED = True
+    settings.GRADING_CACHE_PATH = os.path.join(tempfile.mkdtemp(), "grading_cache.db")
+    from app.services.grading_cache import get_grading_cache
+
+    print(f"\n{'pass':>5}{'answers':>9}{'cache hits':>12}{'errors':>8}{'total s':>9}")
+    for run in (1, 2):
+        summary = asyncio.run(grade(data))
+        print(f"{run:>5}{summary['answers']:>9}{summary['cache_hits']:>12}{summary['errors']:>8}{summary['elapsed_s']:>9.2f}")
+    print(get_grading_cache().stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Grading Cascade Threshold Tuning
+Tunes the local tier of app.services.grading_cascade on a labelled set of
+answers graded by a teacher (or by the LLM). The local signals (empty answer,
+SBERT similarity to the ideal answer, keyword coverage) are computed once per
+answer, then a grid of thresholds is swept. For each combination it reports
+the share of answers settled locally (the reduction in LLM calls) and how
+often the local grade agrees with the label: within --tolerance of max_puan.
+The best combination is the one that settles the most answers while
+agreeing on at least --min-agreement of them. Needs the sentence-transformer
+model only; no API calls.
+
+The labelled file is a JSON list:
+    [{"ideal_cevap": "...", "ogrenci_cevabi": "...", "anahtar_kelimeler": "a, b",
+      "puan": 7, "max_puan": 10}]
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_grading_cascade labelled.json --min-agreement 0.95
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def frange(start: float, stop: float, step: float) -> list:
+    count = int(round((stop - start) / step)) + 1
+    return [round(start + i * step, 4) for i in range(count)]
+
+
+def evaluate(samples: list, thresholds: dict, tolerance: float) -> dict:
+    from app.services.grading_cascade import local_decision
+
+    settled = agreed = 0
+    for sample in samples:
+        ratio, _ = local_decision(sample["signals"], thresholds)
+        if ratio is None:
+            continue
+        settled += 1
+        max_puan = sample.get("max_puan") or 100
+        if abs(ratio * max_puan - sample["puan"]) <= tolerance * max_puan:
+            agreed += 1
+    return {
+        "settled": settled,
+        "reduction": settled / len(samples) if samples else 0.0,
+        "agreement": agreed / settled if settled else 1.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("labelled_file", help="Labelled answers JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed difference as a share of max_puan")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    parser.add_argument("--top", type=int, default=10, help="Rows of the sweep to print")
+    args = parser.parse_args()
+
+    with open(args.labelled_file, encoding="utf-8") as f:
+        samples = json.load(f)
+
+    from app.services.grading_cascade import default_thresholds, local_decision, local_signals
+
+    for sample in samples:
+        sample["signals"] = local_signals(sample.get("ideal_cevap", ""), sample.get("ogrenci_cevabi", ""), sample.get("anahtar_kelimeler", ""))
+
+    grid = [
+        {"low_similarity": low, "low_keywords": low_kw, "high_similarity": high, "high_keywords": high_kw}
+        for low, low_kw, high, high_kw in itertools.product(
+            frange(0.05, 0.45, 0.05), [0.0, 0.25], frange(0.80, 0.98, 0.02), [0.5, 0.75, 1.0]
+        )
+    ]
+    rows = [(thresholds, evaluate(samples, thresholds, args.tolerance)) for thresholds in grid]
+    eligible = [row for row in rows if row[1]["agreement"] >= args.min_agreement]
+    # Ties go to the most conservative thresholds
+    eligible.sort(key=lambda row: (
+        -row[1]["reduction"], -row[1]["agreement"], row[0]["low_similarity"], row[0]["low_keywords"],
+        -row[0]["high_similarity"], -row[0]["high_keywords"]
+    ))
+
+    current = evaluate(samples, default_thresholds(), args.tolerance)
+    print(f"{len(samples)} labelled answers, tolerance {args.tolerance:.0%} of max_puan\n")
+    print(f"{'low sim':>8}{'low kw':>8}{'high sim':>10}{'high kw':>9}{'settled':>9}{'LLM calls -':>13}{'agreement':>11}")
+    print(f"{'current settings':<35}{current['settled']:>9}{current['reduction']:>13.1%}{current['agreement']:>11.1%}")
+    for thresholds, result in eligible[:args.top]:
+        print(f"{thresholds['low_similarity']:>8.2f}{thresholds['low_keywords']:>8.2f}{thresholds['high_similarity']:>10.2f}"
+              f"{thresholds['high_keywords']:>9.2f}{result['settled']:>9}{result['reduction']:>13.1%}{result['agreement']:>11.1%}")
+
+    if not eligible:
+        print(f"\nNo thresholds reach {args.min_agreement:.0%} agreement; keep the cascade disabled.")
+        return
+
+    best = eligible[0][0]
+    decisions = {"empty": 0, "zero": 0, "full": 0, "llm": 0}
+    for sample in samples:
+        ratio, _ = local_decision(sample["signals"], best)
+        key = "llm" if ratio is None else "empty" if sample["signals"]["bos"] else "zero" if ratio == 0 else "full"
+        decisions[key] += 1
+    print(f"\nBest: {decisions}")
+    print(f"GRADING_CASCADE_LOW_SIMILARITY={best['low_similarity']}")
+    print(f"GRADING_CASCADE_LOW_KEYWORDS={best['low_keywords']}")
+    print(f"GRADING_CASCADE_HIGH_SIMILARITY={best['high_similarity']}")
+    print(f"GRADING_CASCADE_HIGH_KEYWORDS={best['high_keywords']}")
+
+
+if __name__ == "__main__":
+    main()
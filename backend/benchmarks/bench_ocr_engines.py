@@ -0,0 +1,87 @@
+"""
+Local OCR Engine Benchmark
+Runs the local OCR engine (OCR_LOCAL_ENGINE, Tesseract tur+eng) over
+printed sample pages and shows how many of them the confidence router would
+keep locally at different OCR_LOCAL_MIN_CONFIDENCE thresholds.
+
+With --vision every page is also transcribed by GPT-4o (costs API calls) and
+the character similarity of the two transcriptions is reported per page,
+which is what the threshold should be tuned against.
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_ocr_engines samples/ --thresholds 0.7 0.8 0.9
+"""
+
+import argparse
+import difflib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_pages(sample_dir: str):
+    from app.services.pipeline import iter_document_pages
+
+    pages = []
+    for name in sorted(os.listdir(sample_dir)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".pdf")):
+            continue
+        with open(os.path.join(sample_dir, name), "rb") as f:
+            contents = f.read()
+        for i, page in enumerate(iter_document_pages(contents, name, dpi=200)):
+            pages.append((f"{name}#{i + 1}", page))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="Directory with printed sample pages (png/jpg/pdf)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.7, 0.8, 0.9])
+    parser.add_argument("--vision", action="store_true", help="Compare with GPT-4o transcriptions")
+    args = parser.parse_args()
+
+    from app.services.ocr import encode_image_to_base64, extract_text_from_image
+    from app.services.ocr_engines import get_local_engine
+
+    engine = get_local_engine()
+    if engine is None:
+        print("No local OCR engine available (check OCR_LOCAL_ENGINE / tesseract install).")
+        return
+
+    pages = load_pages(args.samples)
+    if not pages:
+        print("No samples found.")
+        return
+
+    generic_prompt = "Bu belgedeki tüm metni olduğu gibi, satır satır dışarı aktar. Başlıkları ve yapıyı korumaya çalış. JSON formatı kullanma, sadece saf metin ver."
+
+    rows = []
+    print(f"{'page':<30}{'ms':>8}{'conf':>7}{'chars':>7}" + (f"{'vision sim':>12}" if args.vision else ""))
+    for name, page in pages:
+        started = time.perf_counter()
+        result = engine.transcribe(page)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        similarity = None
+        if args.vision:
+            vision_text = extract_text_from_image(encode_image_to_base64(page), prompt=generic_prompt)
+            similarity = difflib.SequenceMatcher(None, " ".join(result.text.split()), " ".join(str(vision_text).split())).ratio()
+
+        rows.append((elapsed, result.confidence, similarity))
+        print(f"{name:<30}{elapsed:>8.0f}{result.confidence:>7.2f}{len(result.text):>7}"
+              + (f"{similarity:>12.2f}" if similarity is not None else ""))
+
+    print(f"\n{len(rows)} page(s), {statistics.mean(r[0] for r in rows):.0f} ms/page locally")
+    for threshold in args.thresholds:
+        kept = [r for r in rows if r[1] >= threshold]
+        line = f"threshold {threshold:.2f}: {len(kept)}/{len(rows)} pages local, {len(rows) - len(kept)} vision call(s)"
+        if args.vision and kept:
+            line += f", mean similarity of local pages {statistics.mean(r[2] for r in kept):.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
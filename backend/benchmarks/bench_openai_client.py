@@ -0,0 +1,67 @@
+"""
+Shared OpenAI Client Benchmark
+Latency of small gpt-4o-mini calls with a fresh OpenAI client per call (new
+connection pool and TLS handshake every time, the old behaviour) versus the
+shared pooled client of app.services.openai_client, sequentially and with
+--concurrency threads. Also prints the rate limiter state after the run.
+Uses the real OpenAI API (2 x --calls tiny requests).
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_openai_client --calls 20 --concurrency 4
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODEL = "gpt-4o-mini"
+MESSAGES = [{"role": "user", "content": "Sadece 'tamam' yaz."}]
+
+
+def call_fresh_client():
+    from openai import OpenAI
+    from app.services.openai_client import api_key
+
+    started = time.perf_counter()
+    OpenAI(api_key=api_key).chat.completions.create(model=MODEL, messages=MESSAGES, max_tokens=5)
+    return (time.perf_counter() - started) * 1000
+
+
+def call_shared_client():
+    from app.services.openai_client import create_chat_completion
+
+    started = time.perf_counter()
+    create_chat_completion(model=MODEL, messages=MESSAGES, max_tokens=5)
+    return (time.perf_counter() - started) * 1000
+
+
+def run(label, fn, calls, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda _: fn(), range(calls)))
+    wall = time.perf_counter() - started
+    print(f"{label:<8}{statistics.median(latencies):>12.0f}{max(latencies):>10.0f}{wall:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    from app.services.openai_client import rate_limiter_stats
+
+    print(f"{'client':<8}{'median ms':>12}{'max ms':>10}{'wall s':>10}")
+    run("fresh", call_fresh_client, args.calls, args.concurrency)
+    run("shared", call_shared_client, args.calls, args.concurrency)
+    for stats in rate_limiter_stats():
+        print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Page Copy Benchmark
+Per-page image allocations and timings of the upload path after
+rasterization: header band for EasyOCR -> redaction -> backup PNG ->
+vision JPEG/base64. The previous path (full-page RGB array, redaction on a
+numpy copy, RGB trim before grayscale) is compared with the current one.
+
+EasyOCR is not run; every page gets the same fixed redaction boxes, so only
+the image handling is measured.
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_page_copies            # synthetic A4 pages
+    python -m benchmarks.bench_page_copies samples/   # real pages (png/jpg/pdf)
+
+"PIL buffers" counts every PIL image allocation of at least a quarter of
+the page's pixels; "py/numpy peak" is the tracemalloc peak (numpy arrays,
+bytes objects, encoded payloads) during the page.
+"""
+
+import argparse
+import base64
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def synthetic_pages(count: int):
+    pages = []
+    for n in range(count):
+        page = Image.new("RGB", (2480, 3508), "white")  # A4 at 300 DPI
+        draw = ImageDraw.Draw(page)
+        for y in range(300, 3300, 90):
+            draw.line((200, y, 2280 - (y * 7 + n * 131) % 900, y), fill=(20, 20, 60), width=5)
+        pages.append((f"synthetic#{n + 1}", page))
+    return pages
+
+
+def load_pages(sample_dir: str):
+    from app.services.pipeline import iter_document_pages
+
+    pages = []
+    for name in sorted(os.listdir(sample_dir)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".pdf")):
+            continue
+        with open(os.path.join(sample_dir, name), "rb") as f:
+            contents = f.read()
+        for i, page in enumerate(iter_document_pages(contents, name)):
+            pages.append((f"{name}#{i + 1}", page))
+    return pages
+
+
+# ---------------------------------------------------------------------------
+# Previous path
+# ---------------------------------------------------------------------------
+
+def legacy_trim_margins(image, threshold=240, padding=24):
+    gray = image.convert("L")
+    small = gray.reduce(4)
+    bbox = small.point(lambda p: 255 if p < threshold else 0).getbbox()
+    if bbox is None:
+        return image
+    width, height = image.size
+    return image.crop((
+        max(0, bbox[0] * 4 - padding), max(0, bbox[1] * 4 - padding),
+        min(width, bbox[2] * 4 + padding), min(height, bbox[3] * 4 + padding)
+    ))
+
+
+def legacy_page(image, boxes):
+    from app.core.config import settings
+    from app.services.image_encoding import fit_to_pixel_budget
+    from app.services.ocr import header_band_bounds
+
+    # Header band for EasyOCR, cut from a full-page RGB array
+    page_array = np.array(image.convert("RGB"))
+    _, band_bottom = header_band_bounds(page_array.shape[0])
+    band = page_array[:band_bottom]
+    del band, page_array
+
+    # Redaction on a numpy copy, turned back into a new PIL image
+    open_cv_image = np.array(image.convert("RGB"))
+    for (x0, y0, x1, y1) in boxes:
+        open_cv_image[y0:y1 + 1, x0:x1 + 1] = 0
+    redacted = Image.fromarray(open_cv_image)
+    del open_cv_image
+
+    png = io.BytesIO()
+    redacted.save(png, "PNG")
+
+    # trim (RGB) -> grayscale -> budget -> JPEG
+    vision = legacy_trim_margins(redacted).convert("L")
+    vision = fit_to_pixel_budget(vision, settings.VISION_MAX_PIXELS)
+    jpeg = io.BytesIO()
+    vision.save(jpeg, format="JPEG", quality=settings.VISION_JPEG_QUALITY, optimize=True)
+    return base64.b64encode(jpeg.getvalue()).decode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Current path
+# ---------------------------------------------------------------------------
+
+def current_page(image, boxes):
+    from app.services.ocr import apply_redactions, encode_image_to_base64, header_band_array
+
+    band, _ = header_band_array(image)
+    del band
+
+    redacted = apply_redactions(image, boxes)
+
+    png = io.BytesIO()
+    redacted.save(png, "PNG")
+    return encode_image_to_base64(redacted)
+
+
+def measure(run, page: Image.Image, boxes):
+    """Returns (ms, pil_buffer_count, pil_buffer_mb, py_numpy_peak_mb)."""
+    # Timed on its own, tracemalloc slows allocation-heavy code down
+    started = time.perf_counter()
+    run(page.copy(), boxes)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    page_pixels = page.size[0] * page.size[1]
+    allocations = []
+    original_new = Image.Image._new
+
+    def counting_new(self, im):
+        new_image = original_new(self, im)
+        if im.size[0] * im.size[1] >= page_pixels // 4:
+            allocations.append(im.size[0] * im.size[1] * len(new_image.getbands()))
+        return new_image
+
+    Image.Image._new = counting_new
+    tracemalloc.start()
+    try:
+        run(page, boxes)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        Image.Image._new = original_new
+
+    return elapsed, len(allocations), sum(allocations) / 1e6, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", nargs="?", help="Directory with sample pages (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=3, help="Synthetic page count")
+    args = parser.parse_args()
+
+    pages = load_pages(args.samples) if args.samples else synthetic_pages(args.pages)
+    if not pages:
+        print("No samples found.")
+        return
+
+    # Warm-up so imports and encoder initialisation are not counted
+    legacy_page(pages[0][1].copy(), [])
+    current_page(pages[0][1].copy(), [])
+
+    rows = {"before": [], "after": []}
+    for name, page in pages:
+        w, h = page.size
+        boxes = [(0, 0, min(400, w - 1), int(h * 0.08)), (int(w * 0.3), int(h * 0.05), int(w * 0.7), int(h * 0.09))]
+        # Every run gets its own copy, since the current path redacts in place
+        rows["before"].append(measure(legacy_page, page.copy(), boxes))
+        rows["after"].append(measure(current_page, page.copy(), boxes))
+
+    print(f"{len(pages)} page(s), {pages[0][1].size[0]}x{pages[0][1].size[1]}")
+    print(f"{'path':<8} {'ms/page':>9} {'PIL buffers':>12} {'PIL MB':>8} {'py/numpy peak MB':>17}")
+    for label, results in rows.items():
+        print(
+            f"{label:<8} {statistics.mean(r[0] for r in results):>9.1f} "
+            f"{statistics.mean(r[1] for r in results):>12.1f} "
+            f"{statistics.mean(r[2] for r in results):>8.1f} "
+            f"{statistics.mean(r[3] for r in results):>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
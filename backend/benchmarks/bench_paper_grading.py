@@ -0,0 +1,122 @@
+"""
+Whole-Paper Grading Benchmark
+Grades one student's paper twice and compares input tokens, output tokens,
+latency and scores:
+
+  question  one evaluate_answer call per question (answer key, rubric and
+            rules re-sent every time)
+  paper     scoring.evaluate_paper: all questions in one structured call
+
+The paper file is JSON:
+    {"answer_key_text": "...", "rubric_text": "...",
+     "questions": [{"soru_no": 1, "soru_metni": "...", "ideal_cevap": "...",
+                    "ogrenci_cevabi": "..."}, ...]}
+
+--estimate-only prints the estimated prompt tokens without calling the API.
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_paper_grading paper.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def grade_per_question(questions, answer_key_text, rubric_text):
+    from app.services.scoring import evaluate_answer
+
+    started = time.perf_counter()
+    prompt_tokens = completion_tokens = 0
+    scores = {}
+    for question in questions:
+        result = evaluate_answer(
+            ideal_cevap=question.get('ideal_cevap', ''),
+            ogrenci_cevabi=question.get('ogrenci_cevabi', ''),
+            soru_metni=question.get('soru_metni', ''),
+            anahtar_kelimeler=question.get('anahtar_kelimeler', ''),
+            answer_key_text=answer_key_text,
+            rubric_text=rubric_text,
+            soru_no=question['soru_no']
+        )
+        usage = result.get('usage') or {}
+        prompt_tokens += usage.get('prompt_tokens', 0)
+        completion_tokens += usage.get('completion_tokens', 0)
+        scores[question['soru_no']] = result['final_puan']
+    return {
+        'calls': len(questions),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'latency_ms': (time.perf_counter() - started) * 1000,
+        'scores': scores
+    }
+
+
+def grade_paper(questions, answer_key_text, rubric_text):
+    from app.services.scoring import evaluate_paper
+
+    paper = evaluate_paper(questions, answer_key_text=answer_key_text, rubric_text=rubric_text)
+    stats = paper['stats']
+    return {
+        'mode': paper['mode'],
+        'calls': stats['calls'],
+        'prompt_tokens': stats['prompt_tokens'],
+        'completion_tokens': stats['completion_tokens'],
+        'latency_ms': stats['latency_ms'],
+        'scores': {r['soru_no']: r['final_puan'] for r in paper['results']}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paper", help="Paper JSON file")
+    parser.add_argument("--estimate-only", action="store_true", help="Only print estimated prompt tokens")
+    args = parser.parse_args()
+
+    from app.services.scoring import build_paper_prompts, build_question_prompts, estimate_text_tokens, paper_fits_budget
+
+    with open(args.paper, encoding="utf-8") as f:
+        data = json.load(f)
+    questions = data["questions"]
+    for index, question in enumerate(questions):
+        question.setdefault('soru_no', index + 1)
+    answer_key_text = data.get("answer_key_text")
+    rubric_text = data.get("rubric_text")
+
+    question_estimate = sum(
+        estimate_text_tokens("".join(build_question_prompts(
+            q.get('ideal_cevap', ''), q.get('ogrenci_cevabi', ''), q.get('soru_metni', ''),
+            answer_key_text, rubric_text, 0.0, q['soru_no'])))
+        for q in questions
+    )
+    paper_estimate = estimate_text_tokens("".join(build_paper_prompts(questions, answer_key_text, rubric_text)))
+    print(f"questions: {len(questions)}, fits paper budget: {paper_fits_budget(questions, answer_key_text, rubric_text)}")
+    print(f"estimated prompt tokens: per-question {question_estimate}, paper {paper_estimate} "
+          f"({100 * (1 - paper_estimate / question_estimate):.0f}% less)")
+    if args.estimate_only:
+        return
+
+    baseline = grade_per_question(questions, answer_key_text, rubric_text)
+    paper = grade_paper(questions, answer_key_text, rubric_text)
+
+    print(f"\n{'mode':<10}{'calls':>7}{'prompt tok':>12}{'output tok':>12}{'latency s':>11}{'total':>9}")
+    for label, run in (("question", baseline), ("paper", paper)):
+        total = sum(run['scores'].values())
+        print(f"{label:<10}{run['calls']:>7}{run['prompt_tokens']:>12}{run['completion_tokens']:>12}"
+              f"{run['latency_ms'] / 1000:>11.2f}{total:>9.1f}")
+    if paper['mode'] != "paper":
+        print("(paper call fell back to per-question grading)")
+
+    if baseline['prompt_tokens']:
+        print(f"\nprompt tokens saved: {100 * (1 - paper['prompt_tokens'] / baseline['prompt_tokens']):.0f}%")
+    diffs = [abs(paper['scores'][n] - baseline['scores'][n]) for n in baseline['scores'] if n in paper['scores']]
+    if diffs:
+        print(f"score difference per question: mean {sum(diffs) / len(diffs):.2f}, max {max(diffs):.2f}")
+
+
+if __name__ == "__main__":
+    main()
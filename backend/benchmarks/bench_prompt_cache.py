@@ -0,0 +1,68 @@
+"""
+Grading Prompt Cache Benchmark
+Grades a class worth of answers to one question and reports, per call, the
+prompt tokens the provider served from its prompt cache and the latency,
+followed by the cached / uncached totals (scoring.prompt_cache_stats).
+
+The provider caches prompt prefixes of 1024+ tokens, so the first call of an
+exam pays the full prompt and the following students should mostly hit the
+cache. --prefix-only checks that the static prefix is byte-identical across
+the students without calling the API.
+
+The class file is JSON:
+    {"answer_key_text": "...", "rubric_text": "...", "soru_no": 1,
+     "soru_metni": "...", "ideal_cevap": "...", "answers": ["...", "..."]}
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_prompt_cache class.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("class_file", help="Class JSON file")
+    parser.add_argument("--prefix-only", action="store_true", help="Only check the static prompt prefix")
+    args = parser.parse_args()
+
+    from app.services.scoring import build_question_prompts, estimate_text_tokens, evaluate_answer, prompt_cache_stats
+
+    with open(args.class_file, encoding="utf-8") as f:
+        data = json.load(f)
+    question = {
+        "ideal_cevap": data.get("ideal_cevap", ""),
+        "soru_metni": data.get("soru_metni", ""),
+        "answer_key_text": data.get("answer_key_text"),
+        "rubric_text": data.get("rubric_text"),
+        "soru_no": data.get("soru_no", 1)
+    }
+    answers = data["answers"]
+
+    prefixes = {build_question_prompts(ogrenci_cevabi=answer, **question)[0] for answer in answers}
+    prefix_tokens = estimate_text_tokens(next(iter(prefixes)))
+    print(f"students: {len(answers)}, distinct prefixes: {len(prefixes)}, ~{prefix_tokens} prefix tokens"
+          + ("" if prefix_tokens >= 1024 else " (below the 1024-token caching minimum)"))
+    if args.prefix_only:
+        return
+
+    prompt_cache_stats.reset()
+    print(f"\n{'#':>3}{'prompt':>9}{'cached':>9}")
+    for i, answer in enumerate(answers, start=1):
+        result = evaluate_answer(ogrenci_cevabi=answer, **question)
+        usage = result.get('usage') or {}
+        print(f"{i:>3}{usage.get('prompt_tokens', 0):>9}{usage.get('cached_tokens', 0):>9}")
+
+    stats = prompt_cache_stats.stats()
+    print(f"\ncached prompt tokens: {stats['cached_prompt_tokens']}/{stats['prompt_tokens']} "
+          f"({100 * stats['cached_token_ratio']:.0f}%), calls with cache hit: {stats['cached_calls']}/{stats['calls']}")
+    print(f"avg latency: cached {stats['avg_latency_ms_cached']} ms, uncached {stats['avg_latency_ms_uncached']} ms")
+
+
+if __name__ == "__main__":
+    main()
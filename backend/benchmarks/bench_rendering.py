@@ -0,0 +1,89 @@
+"""
+PDF Rendering Benchmark
+Rasterization cost of the upload path for a PDF: one full page at 300 DPI
+per page, sequentially (previous path), vs. RENDER_WORKERS parallel
+pdftoppm processes rendering the body at RENDER_BODY_DPI plus only the
+header band at RENDER_HEADER_DPI (current path).
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_rendering class.pdf --workers 1 2 4
+
+Reports pages/sec, per-page render time and megapixels rasterized per page.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_sequential(pdf_path: str, dpi: int):
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    from app.services.pipeline import _poppler_path
+
+    page_count = pdfinfo_from_path(pdf_path, poppler_path=_poppler_path())["Pages"]
+    timings, megapixels = [], []
+    for page_no in range(1, page_count + 1):
+        started = time.perf_counter()
+        page = convert_from_path(pdf_path, dpi=dpi, first_page=page_no, last_page=page_no, poppler_path=_poppler_path())[0]
+        timings.append((time.perf_counter() - started) * 1000)
+        megapixels.append(page.size[0] * page.size[1] / 1e6)
+        page.close()
+    return timings, megapixels
+
+
+def run_regions(pdf_path: str, body_dpi: int, header_dpi: int, workers: int):
+    from app.core.config import settings
+    from app.services.ocr import header_band_bounds
+    from app.services.pipeline import _iter_pdf_pages
+
+    settings.RENDER_WORKERS = workers
+    timings, megapixels = [], []
+    pages = _iter_pdf_pages(
+        pdf_path, body_dpi, header_dpi=header_dpi, header_bottom=lambda height: header_band_bounds(height)[1]
+    )
+    for page in pages:
+        timings.append(page.info['render_ms'])
+        pixels = page.size[0] * page.size[1]
+        header = page.info.get('header_band')
+        if header is not None:
+            pixels += header[0].size[0] * header[0].size[1]
+            header[0].close()
+        megapixels.append(pixels / 1e6)
+        page.close()
+    return timings, megapixels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="Multi-page PDF (e.g. a scanned class set)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--full-dpi", type=int, default=300, help="DPI of the previous full-page path")
+    parser.add_argument("--body-dpi", type=int, default=200)
+    parser.add_argument("--header-dpi", type=int, default=300)
+    args = parser.parse_args()
+
+    # Warm-up so the page cache holds the PDF
+    run_sequential(args.pdf, 72)
+
+    print(f"{'mode':<22}{'seconds':>9}{'pages/sec':>11}{'ms/page':>9}{'MP/page':>9}")
+
+    def report(label, elapsed, timings, megapixels):
+        print(f"{label:<22}{elapsed:>9.2f}{len(timings) / elapsed:>11.2f}"
+              f"{statistics.mean(timings):>9.0f}{statistics.mean(megapixels):>9.1f}")
+
+    started = time.perf_counter()
+    timings, megapixels = run_sequential(args.pdf, args.full_dpi)
+    report(f"full {args.full_dpi}dpi seq", time.perf_counter() - started, timings, megapixels)
+
+    for workers in args.workers:
+        started = time.perf_counter()
+        timings, megapixels = run_regions(args.pdf, args.body_dpi, args.header_dpi, workers)
+        report(f"regions x{workers}", time.perf_counter() - started, timings, megapixels)
+
+
+if __name__ == "__main__":
+    main()
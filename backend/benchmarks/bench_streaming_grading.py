@@ -0,0 +1,84 @@
+"""
+Streaming OCR -> Grading Benchmark
+Time to first graded question and total time for one student page:
+
+  sequential  transcribe the whole page, parse it, then grade the questions
+  streaming   stream the transcription and grade each question as soon as
+              its JSON object is complete (what the upload pipeline does
+              when an upload carries grading options)
+
+Both modes grade with GRADING_MAX_CONCURRENCY calls in flight. Uses the
+real OpenAI API (vision + grading calls for every run).
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_streaming_grading page.png --answer-key key.txt
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def run_sequential(payload: str, context):
+    from app.services.live_grading import PageGrader
+    from app.services.ocr import extract_text_from_image_async
+
+    started = time.perf_counter()
+    first = []
+    grader = PageGrader(context, on_graded=lambda g: first or first.append(time.perf_counter()))
+    items = await extract_text_from_image_async(payload)
+    ocr_done = time.perf_counter()
+    grades = await grader.finish(items if isinstance(items, list) else [])
+    return started, ocr_done, first[0] if first else None, time.perf_counter(), len(grades)
+
+
+async def run_streaming(payload: str, context):
+    from app.services.live_grading import PageGrader
+    from app.services.ocr import extract_text_from_image_async
+
+    started = time.perf_counter()
+    first = []
+    grader = PageGrader(context, on_graded=lambda g: first or first.append(time.perf_counter()))
+    items = await extract_text_from_image_async(payload, on_item=grader.on_item)
+    ocr_done = time.perf_counter()
+    grades = await grader.finish(items if isinstance(items, list) else [])
+    return started, ocr_done, first[0] if first else None, time.perf_counter(), len(grades)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("page", help="Anonymized student page image")
+    parser.add_argument("--answer-key", required=True, help="Answer key text file")
+    parser.add_argument("--rubric", help="Rubric text file")
+    parser.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args()
+
+    from PIL import Image
+    from app.services.live_grading import GradingContext
+    from app.services.ocr import encode_image_to_base64
+
+    with open(args.answer_key, encoding="utf-8") as f:
+        answer_key = f.read()
+    rubric = None
+    if args.rubric:
+        with open(args.rubric, encoding="utf-8") as f:
+            rubric = f.read()
+    context = GradingContext(answer_key_text=answer_key, rubric_text=rubric)
+
+    with Image.open(args.page) as image:
+        payload = encode_image_to_base64(image)
+
+    print(f"{'mode':<12}{'OCR s':>8}{'first graded s':>16}{'total s':>9}{'questions':>11}")
+    for run in range(args.runs):
+        for label, mode in (("sequential", run_sequential), ("streaming", run_streaming)):
+            started, ocr_done, first, finished, count = asyncio.run(mode(payload, context))
+            first_text = f"{first - started:>16.2f}" if first else f"{'-':>16}"
+            print(f"{label:<12}{ocr_done - started:>8.2f}{first_text}{finished - started:>9.2f}{count:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Upload Memory Benchmark
+Reports peak RSS against page count for the old "render every page up front"
+upload path and the streaming page pipeline.
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_upload_memory --pages 1 5 10 20
+
+Vision OCR is simulated with a fixed delay so no API calls are made.
+Pass --anonymize to include the real EasyOCR anonymization stage.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+A4_300DPI = (2480, 3508)
+
+
+def make_sample_pdf(path: str, page_count: int):
+    """Writes a synthetic scanned-looking PDF with the given number of pages."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    pages = []
+    for _ in range(page_count):
+        noise = rng.integers(200, 256, size=(A4_300DPI[1] // 4, A4_300DPI[0] // 4), dtype=np.uint8)
+        page = Image.fromarray(noise, mode="L").resize(A4_300DPI).convert("RGB")
+        pages.append(page)
+    pages[0].save(path, "PDF", resolution=300, save_all=True, append_images=pages[1:])
+
+
+class PeakRSS:
+    """Samples the RSS of the current process in a background thread."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _current(self) -> int:
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss
+        except ImportError:
+            import resource
+            # ru_maxrss is already a peak value (KB on Linux)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+
+def _anonymizer(enabled: bool):
+    if enabled:
+        from app.services.ocr import anonymize_student_data_local
+        return anonymize_student_data_local
+    return lambda image: (image.copy(), {})
+
+
+def run_legacy(pdf_path: str, anonymize: bool, ocr_delay: float):
+    """Old path: all pages rendered and anonymized before OCR starts."""
+    from pdf2image import convert_from_bytes
+    from app.services.ocr import encode_image_to_base64
+
+    anonymizer = _anonymizer(anonymize)
+    with open(pdf_path, "rb") as f:
+        contents = f.read()
+
+    images = convert_from_bytes(contents, dpi=300)
+    for i, image in enumerate(images):
+        images[i], _ = anonymizer(image)
+    for image in images:
+        encode_image_to_base64(image)
+        time.sleep(ocr_delay)
+
+
+def run_streaming(pdf_path: str, anonymize: bool, ocr_delay: float):
+    """New path: page-at-a-time pipeline with bounded in-flight pages."""
+    from app.services.ocr import encode_image_to_base64
+    from app.services.pipeline import run_page_pipeline
+
+    anonymizer = _anonymizer(anonymize)
+    with open(pdf_path, "rb") as f:
+        contents = f.read()
+
+    def prepare_page(i, image):
+        redacted, _ = anonymizer(image)
+        payload = encode_image_to_base64(redacted)
+        redacted.close()
+        return payload
+
+    async def finish_page(i, payload):
+        await asyncio.sleep(ocr_delay)
+        return {"page": i + 1}
+
+    asyncio.run(run_page_pipeline(contents, "sample.pdf", prepare_page, finish_page))
+
+
+def _measure(mode: str, pdf_path: str, anonymize: bool, ocr_delay: float, queue):
+    runner = run_legacy if mode == "legacy" else run_streaming
+    started = time.perf_counter()
+    with PeakRSS() as rss:
+        runner(pdf_path, anonymize, ocr_delay)
+    queue.put((rss.peak, time.perf_counter() - started))
+
+
+def measure(mode: str, pdf_path: str, anonymize: bool, ocr_delay: float):
+    """Runs one configuration in a fresh process so peaks do not leak across runs."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(mode, pdf_path, anonymize, ocr_delay, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--ocr-delay", type=float, default=0.2, help="Simulated OCR latency per page (s)")
+    parser.add_argument("--anonymize", action="store_true", help="Run the real EasyOCR anonymization")
+    args = parser.parse_args()
+
+    print(f"{'pages':>5} | {'legacy peak MB':>14} | {'stream peak MB':>14} | {'legacy s':>8} | {'stream s':>8}")
+    print("-" * 63)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for page_count in args.pages:
+            pdf_path = os.path.join(tmp_dir, f"sample_{page_count}.pdf")
+            make_sample_pdf(pdf_path, page_count)
+            legacy_peak, legacy_s = measure("legacy", pdf_path, args.anonymize, args.ocr_delay)
+            stream_peak, stream_s = measure("streaming", pdf_path, args.anonymize, args.ocr_delay)
+            print(f"{page_count:>5} | {legacy_peak / 2**20:>14.1f} | {stream_peak / 2**20:>14.1f} | {legacy_s:>8.2f} | {stream_s:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Vision Encoding Benchmark
+Compares the legacy full-resolution JPEG payload with the adaptive
+encoding stage: payload bytes, encode time, upload time and (optionally)
+OCR agreement between the two transcripts.
+
+Run from the backend/ directory:
+    python -m benchmarks.bench_vision_encoding samples/ --max-pixels 1000000 2000000 4000000
+    python -m benchmarks.bench_vision_encoding samples/ --ocr   # calls GPT-4o
+
+`samples/` holds page images (png/jpg) or PDFs (first page is used).
+Without --ocr the upload time is estimated from --uplink-mbps; with --ocr
+the measured request round trip is reported as well.
+"""
+
+import argparse
+import base64
+import difflib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+
+def load_samples(sample_dir: str):
+    from app.services.pipeline import iter_document_pages
+
+    samples = []
+    for name in sorted(os.listdir(sample_dir)):
+        path = os.path.join(sample_dir, name)
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".pdf")):
+            continue
+        with open(path, "rb") as f:
+            contents = f.read()
+        pages = iter_document_pages(contents, name)
+        samples.append((name, next(pages).convert("RGB")))
+        pages.close()
+    return samples
+
+
+def legacy_payload(image: Image.Image) -> bytes:
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+    return buffered.getvalue()
+
+
+def transcript_text(result) -> str:
+    """Flattens an OCR result (question list or raw text) for comparison."""
+    if isinstance(result, list):
+        parts = []
+        for item in result:
+            if isinstance(item, dict):
+                parts.append(str(item.get("soru_metni", "")))
+                parts.append(str(item.get("ogrenci_cevabi", "")))
+        return " ".join(" ".join(parts).split())
+    return " ".join(str(result).split())
+
+
+def run_ocr(payload: bytes):
+    from app.services.ocr import extract_text_from_image
+
+    started = time.perf_counter()
+    result = extract_text_from_image(base64.b64encode(payload).decode("utf-8"))
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="Directory with sample pages")
+    parser.add_argument("--max-pixels", type=int, nargs="+", default=[1000000, 2000000, 4000000])
+    parser.add_argument("--max-bytes", type=int, default=None, help="Byte budget (default: VISION_MAX_BYTES)")
+    parser.add_argument("--color", action="store_true", help="Keep colour instead of grayscale")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="Uplink used for the upload time estimate")
+    parser.add_argument("--ocr", action="store_true", help="Run GPT-4o on both payloads and report agreement")
+    args = parser.parse_args()
+
+    from app.services.image_encoding import encode_for_vision
+
+    samples = load_samples(args.samples)
+    if not samples:
+        print("No samples found.")
+        return
+
+    def upload_s(payload: bytes) -> float:
+        # base64 inflates the payload by 4/3 on the wire
+        return (len(payload) * 4 / 3 * 8) / (args.uplink_mbps * 1_000_000)
+
+    header = f"{'sample':<24} {'config':<14} {'KB (b64)':>9} {'encode ms':>9} {'upload s':>8}"
+    if args.ocr:
+        header += f" {'ocr s':>6} {'agree':>6}"
+    print(header)
+    print("-" * len(header))
+
+    totals = {}
+    for name, image in samples:
+        started = time.perf_counter()
+        baseline = legacy_payload(image)
+        encode_ms = (time.perf_counter() - started) * 1000
+        baseline_text = None
+        row = f"{name[:24]:<24} {'legacy':<14} {len(baseline) * 4 / 3 / 1024:>9.0f} {encode_ms:>9.0f} {upload_s(baseline):>8.2f}"
+        if args.ocr:
+            result, ocr_s = run_ocr(baseline)
+            baseline_text = transcript_text(result)
+            row += f" {ocr_s:>6.1f} {1.0:>6.2f}"
+        print(row)
+        totals.setdefault("legacy", []).append(len(baseline))
+
+        for max_pixels in args.max_pixels:
+            config = f"{max_pixels / 1e6:.1f}MP"
+            started = time.perf_counter()
+            payload = encode_for_vision(image, max_pixels=max_pixels, max_bytes=args.max_bytes, grayscale=not args.color)
+            encode_ms = (time.perf_counter() - started) * 1000
+            row = f"{'':<24} {config:<14} {len(payload) * 4 / 3 / 1024:>9.0f} {encode_ms:>9.0f} {upload_s(payload):>8.2f}"
+            if args.ocr:
+                result, ocr_s = run_ocr(payload)
+                agreement = difflib.SequenceMatcher(None, baseline_text, transcript_text(result)).ratio()
+                totals.setdefault(f"{config} agree", []).append(agreement)
+                row += f" {ocr_s:>6.1f} {agreement:>6.2f}"
+            print(row)
+            totals.setdefault(config, []).append(len(payload))
+
+    print()
+    legacy_avg = sum(totals["legacy"]) / len(totals["legacy"])
+    for max_pixels in args.max_pixels:
+        config = f"{max_pixels / 1e6:.1f}MP"
+        avg = sum(totals[config]) / len(totals[config])
+        line = f"{config:<8} avg payload {avg * 4 / 3 / 1024:.0f} KB ({avg / legacy_avg * 100:.0f}% of legacy)"
+        if args.ocr:
+            agreements = totals[f"{config} agree"]
+            line += f", mean agreement {sum(agreements) / len(agreements):.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
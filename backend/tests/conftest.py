@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import create_engine
+
+from app.core import database
+from app.core.config import settings
+
+
+@pytest.fixture
+def queue_db(tmp_path, monkeypatch):
+    """Fresh SQLite database and BASE_DIR for the durable upload queue."""
+    original = database.engine
+    engine = create_engine(f"sqlite:///{tmp_path / 'exam_system.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "engine", engine)
+    database.SessionLocal.configure(bind=engine)
+    monkeypatch.setattr(settings, "BASE_DIR", str(tmp_path))
+    database.init_db()
+    yield tmp_path
+    database.SessionLocal.configure(bind=original)
+    engine.dispose()
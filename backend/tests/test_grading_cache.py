@@ -0,0 +1,61 @@
+"""Grading cache keys: what makes two grades share a cache entry."""
+
+from app.services.grading_cache import GradingCache, make_grading_key, normalize_answer
+from app.services.scoring import _grading_cache_key, grading_prompt_version
+
+
+def key(**overrides):
+    inputs = {
+        "model": "gpt-4o-mini", "prompt_version": "v1", "soru_no": 1, "soru_metni": "Fotosentez nedir?",
+        "ideal_cevap": "Işık enerjisiyle besin üretimi", "anahtar_kelimeler": "ışık, klorofil",
+        "answer_key_text": "1) Işık enerjisi", "rubric_text": "Tam puan: 10", "ogrenci_cevabi": "Bitkiler ışıkla besin üretir"
+    }
+    inputs.update(overrides)
+    return make_grading_key(**inputs)
+
+
+def test_normalize_answer():
+    assert normalize_answer("  Bilmiyorum. ") == "bilmiyorum"
+    assert normalize_answer("Bitkiler\n  ışıkla   besin üretir!") == "bitkiler ışıkla besin üretir"
+    # Turkish casing: I -> ı, İ -> i
+    assert normalize_answer("IŞIK İLE") == "ışık ile"
+    assert normalize_answer(None) == ""
+
+
+def test_equivalent_answers_share_a_key():
+    assert key(ogrenci_cevabi="Bilmiyorum.") == key(ogrenci_cevabi="  bilmiyorum")
+    assert key(ogrenci_cevabi="BİTKİLER IŞIKLA BESİN ÜRETİR") == key()
+
+
+def test_every_grading_input_is_part_of_the_key():
+    changes = {
+        "model": "gpt-4o", "prompt_version": "v2", "soru_no": 2, "soru_metni": "Solunum nedir?",
+        "ideal_cevap": "Besinlerin yakılması", "anahtar_kelimeler": "oksijen",
+        "answer_key_text": "1) Klorofil", "rubric_text": "Tam puan: 20", "ogrenci_cevabi": "Bilmiyorum"
+    }
+    base = key()
+    for name, value in changes.items():
+        assert key(**{name: value}) != base, name
+
+
+def test_inputs_are_length_prefixed():
+    assert key(soru_metni="ab", ideal_cevap="c") != key(soru_metni="a", ideal_cevap="bc")
+    assert key(answer_key_text=None) == key(answer_key_text="")
+
+
+def test_question_and_paper_grades_use_separate_keys():
+    question = {"soru_no": 1, "soru_metni": "Fotosentez nedir?", "ideal_cevap": "Işık", "ogrenci_cevabi": "Işık"}
+
+    assert grading_prompt_version("question") != grading_prompt_version("paper")
+    assert _grading_cache_key("question", question) != _grading_cache_key("paper", question)
+    assert _grading_cache_key("question", question, rubric_text="A") != _grading_cache_key("question", question, rubric_text="B")
+
+
+def test_cache_round_trip(tmp_path):
+    cache = GradingCache(str(tmp_path / "grading_cache.db"), 1024 * 1024)
+    grade = {"final_puan": 7.5, "max_puan": 10, "yorum": "Kısmen doğru"}
+
+    cache.put(key(), grade)
+
+    assert cache.get(key(ogrenci_cevabi="bitkiler ışıkla besin üretir.")) == grade
+    assert cache.get(key(rubric_text="Tam puan: 20")) is None
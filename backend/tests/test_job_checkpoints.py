@@ -0,0 +1,92 @@
+"""Durable upload queue: page checkpoints and resuming a failed job."""
+
+import asyncio
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.services import job_queue, jobs, pipeline
+
+
+def test_checkpoints_are_stored_per_page_and_stage(queue_db):
+    job_queue.save_checkpoint("job", 0, job_queue.STAGE_OCR, {"text": "ilk"})
+    job_queue.save_checkpoint("job", 0, job_queue.STAGE_OCR, {"text": "son"})
+    job_queue.save_checkpoint("job", 2, job_queue.STAGE_ANONYMIZE, {"path": "p.png", "student_data": {}})
+
+    assert job_queue.load_checkpoints("job") == {
+        job_queue.STAGE_OCR: {0: {"text": "son"}},
+        job_queue.STAGE_ANONYMIZE: {2: {"path": "p.png", "student_data": {}}}
+    }
+    assert job_queue.load_checkpoints("other") == {}
+
+
+@pytest.fixture
+def upload(queue_db, monkeypatch):
+    """A 3-page upload whose pipeline dependencies are replaced by fakes."""
+    monkeypatch.setattr(settings, "BLANK_PAGE_SKIP", False)
+    monkeypatch.setattr(settings, "VISION_PACK_PAGES", False)
+    monkeypatch.setattr(settings, "UPLOAD_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(jobs, "JOB_RETRY_DELAY", 0)
+
+    rendered = []
+
+    def iter_document_pages(contents, filename, skip_pages=frozenset(), **kwargs):
+        for i in range(3):
+            if i in skip_pages:
+                yield None
+            else:
+                rendered.append(i)
+                yield Image.new("RGB", (60, 80), (i * 40, 0, 0))
+
+    async def anonymize_page(image, need_values=True):
+        return image, {}
+
+    monkeypatch.setattr(pipeline, "iter_document_pages", iter_document_pages)
+    monkeypatch.setattr(jobs, "anonymize_page", anonymize_page)
+
+    job, _ = jobs.job_store.create("sinif.pdf", f"{queue_db}".encode())
+    job.page_count = 3
+    job_queue.enqueue_job(job, b"%PDF")
+    return job, rendered
+
+
+def test_failed_page_is_redone_from_checkpoints(upload, monkeypatch):
+    job, rendered = upload
+    ocr_calls = []
+
+    async def process_image_ocr_async(base64_image, on_item=None):
+        ocr_calls.append(base64_image)
+        if len(ocr_calls) == 2:
+            raise RuntimeError("API zaman aşımı")
+        return {"normalized_text": f"metin {len(ocr_calls)}", "raw_text": "", "structured_data": []}
+
+    monkeypatch.setattr(jobs, "process_image_ocr_async", process_image_ocr_async)
+
+    asyncio.run(jobs.run_student_upload(job, b""))
+
+    assert job.status == "completed"
+    # Second attempt: no page rendered again, only the failed page re-OCR'd
+    assert rendered == [0, 1, 2]
+    assert len(ocr_calls) == 4
+    assert ocr_calls[3] == ocr_calls[1]
+    assert [page["text"] for page in job.result["pages"]] == ["metin 1", "metin 4", "metin 3"]
+    assert job_queue.job_states([job.id]) == {job.id: "completed"}
+    assert job_queue.load_checkpoints(job.id) == {}
+
+
+def test_job_is_dead_lettered_after_max_attempts(upload, monkeypatch):
+    job, _ = upload
+
+    async def process_image_ocr_async(base64_image, on_item=None):
+        raise RuntimeError("API kapalı")
+
+    monkeypatch.setattr(jobs, "process_image_ocr_async", process_image_ocr_async)
+
+    asyncio.run(jobs.run_student_upload(job, b""))
+
+    assert job.status == "failed"
+    assert "3 sayfa işlenemedi" in job.error
+    assert job_queue.job_states([job.id]) == {job.id: "dead"}
+    # Anonymized pages stay checkpointed for a manual retry
+    assert set(job_queue.load_checkpoints(job.id)[job_queue.STAGE_ANONYMIZE]) == {0, 1, 2}
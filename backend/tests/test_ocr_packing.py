@@ -0,0 +1,37 @@
+"""Packed vision requests: splitting the question list back per page."""
+
+from app.services.ocr import _split_packed_output
+
+
+def test_questions_go_to_their_page():
+    output = [
+        {"soru_no": 1, "sayfa": 1, "ogrenci_cevabi": "a"},
+        {"soru_no": 2, "sayfa": "2", "ogrenci_cevabi": "b"},
+        {"soru_no": 3, "sayfa": 2, "ogrenci_cevabi": "c"}
+    ]
+
+    pages = _split_packed_output(output, 3)
+
+    assert [[q["soru_no"] for q in page] for page in pages] == [[1], [2, 3], []]
+    assert all("sayfa" not in q for page in pages for q in page)
+    # The model output itself is not modified
+    assert output[0]["sayfa"] == 1
+
+
+def test_continuation_pages_are_validated():
+    output = [{"soru_no": 1, "sayfa": 2, "devam_sayfalari": [4, "3", 3, 1, 2, 9, "x"]}]
+
+    pages = _split_packed_output(output, 4)
+
+    # Only later pages within the request, sorted and without duplicates
+    assert pages[1][0]["devam_sayfalari"] == [3, 4]
+    assert _split_packed_output([{"soru_no": 1, "sayfa": 1}], 2)[0][0]["devam_sayfalari"] == []
+
+
+def test_unattributable_output_is_rejected():
+    assert _split_packed_output({"soru_no": 1, "sayfa": 1}, 2) is None
+    assert _split_packed_output(["metin"], 2) is None
+    assert _split_packed_output([{"soru_no": 1}], 2) is None
+    assert _split_packed_output([{"soru_no": 1, "sayfa": "iki"}], 2) is None
+    assert _split_packed_output([{"soru_no": 1, "sayfa": 3}], 2) is None
+    assert _split_packed_output([{"soru_no": 1, "sayfa": 0}], 2) is None
@@ -0,0 +1,26 @@
+"""Streamed transcription: questions reach on_item with their list index."""
+
+from app.services.json_stream import JSONArrayStream
+from app.services.ocr import _StreamedItems
+
+
+def test_chunk_closing_several_objects_keeps_indices():
+    calls = []
+    streamed = _StreamedItems(lambda index, item: calls.append((index, item["soru_no"])))
+    parser = JSONArrayStream()
+
+    streamed.feed(parser, '[{"soru_no":1},{"soru_no":2}')
+    streamed.feed(parser, ',{"soru_no":3}]')
+
+    assert calls == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_retry_does_not_forward_questions_again():
+    calls = []
+    streamed = _StreamedItems(lambda index, item: calls.append((index, item["soru_no"])))
+
+    streamed.feed(JSONArrayStream(), '[{"soru_no":1},{"soru_no":2}')
+    # A retried request starts a new parser and repeats the questions
+    streamed.feed(JSONArrayStream(), '[{"soru_no":1},{"soru_no":2},{"soru_no":3}]')
+
+    assert calls == [(0, 1), (1, 2), (2, 3)]
@@ -140,7 +140,27 @@ function App() {
         throw new Error(errorData.detail || "Dosya işlenemedi.");
       }
 
-      const data = await response.json();
+      // Upload is processed in the background; poll the job until it finishes.
+      // A re-upload may return a job that is already 'completed', so the
+      // status endpoint is always read at least once
+      const job = await response.json();
+      let data = job;
+      do {
+        if (data.status !== 'completed') {
+          await new Promise((resolve) => setTimeout(resolve, 1500));
+        }
+        const statusResponse = await fetch(`${API_URL}/upload/jobs/${job.id}`);
+        if (!statusResponse.ok) {
+          const errorData = await statusResponse.json();
+          throw new Error(errorData.detail || "İş durumu alınamadı.");
+        }
+        data = await statusResponse.json();
+        // 'retrying' jobs keep being polled; only a dead-lettered job is 'failed'
+        if (data.status === 'failed') {
+          throw new Error(data.error || "Dosya işlenemedi.");
+        }
+      } while (data.status !== 'completed');
+
       setResult(data);
       if (data.id) setRequestId(data.id); // Save ID
       console.log("OCR Response Data:", data);
@@ -150,6 +170,10 @@ function App() {
       // Process each page
       if (data.pages && data.pages.length > 0) {
         for (const page of data.pages) {
+          // Blank pages and pages that only continue an answer from the
+          // previous page (packed OCR) carry no questions of their own
+          if (page.skipped || page.continuation_of) continue;
+
           // Check if we have structured data (multiple questions detected)
           if (page.structured_data && Array.isArray(page.structured_data) && page.structured_data.length > 0) {
             for (const item of page.structured_data) {